@@ -0,0 +1,156 @@
+import numpy as np
+
+MAX_GOALS = 10  # goals are clipped to MAX_GOALS - 1 when scorelines are counted
+_N_SCORELINES = MAX_GOALS * MAX_GOALS
+_INVALID = -1
+
+
+def _parse_scores(texts: list[str | None]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Parses scores or bets like '2-1' or '2:1' in a single vectorized pass.
+    :return: Arrays of home and away goals, _INVALID where a text is not a valid score.
+    """
+    if not texts:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    arr = np.char.replace(np.char.replace(np.array(texts, dtype=str), ' ', ''), ':', '-')
+    parts = np.char.partition(arr, '-')
+    home, away = parts[:, 0], parts[:, 2]
+    valid = np.char.isdigit(home) & np.char.isdigit(away)
+    home = np.where(valid, np.where(valid, home, '0').astype(np.int64), _INVALID)
+    away = np.where(valid, np.where(valid, away, '0').astype(np.int64), _INVALID)
+    return home, away
+
+
+def _scoreline_codes(home: np.ndarray, away: np.ndarray) -> np.ndarray:
+    codes = np.minimum(home, MAX_GOALS - 1) * MAX_GOALS + np.minimum(away, MAX_GOALS - 1)
+    return np.where(home == _INVALID, _INVALID, codes)
+
+
+def _scoreline(code: int) -> str:
+    return f'{code // MAX_GOALS}-{code % MAX_GOALS}'
+
+
+def _run_lengths(hits: np.ndarray) -> np.ndarray:
+    """For a 2D bool array returns the length of the run of True values ending at every cell of every row."""
+    counts = np.cumsum(hits, axis=1)
+    resets = np.maximum.accumulate(np.where(hits, 0, counts), axis=1)
+    return counts - resets
+
+
+class ContestAnalytics:
+    """
+    Betting statistics of a bet contest computed from its scored bets held in NumPy arrays.
+
+    The rows are loaded into arrays once, when the contest's views are refreshed. Every statistic is then a vectorized
+    pass over them: hit rates and favourite scorelines per user, streaks of right outcomes over a user x match matrix,
+    and the distribution of bets and the crowd's consensus per match.
+    """
+
+    def __init__(self, rows: list[dict]):
+        """:param rows: Scored bets as returned by Database.get_contest_scored_bets() ordered by round and kickoff."""
+        self.n_bets = len(rows)
+        self.user_ids, user_idx = np.unique(np.array([r['telegram_id'] for r in rows], dtype=np.int64),
+                                            return_inverse=True)
+        # matches keep the order of the rows, i.e. of kickoffs, which streaks depend on
+        match_ids = np.array([r['match_id'] for r in rows], dtype=np.int64)
+        unique_match_ids, first_row, match_idx = np.unique(match_ids, return_index=True, return_inverse=True)
+        kickoff_order = np.argsort(first_row)
+        self.match_ids = unique_match_ids[kickoff_order]
+        match_idx = np.argsort(kickoff_order)[match_idx]
+        self._match_rows = [rows[i] for i in first_row[kickoff_order]]
+        self._user_names = {r['telegram_id']: (r['first_name'], r['last_name']) for r in rows}
+
+        bet_home, bet_away = _parse_scores([r['bet'] for r in rows])
+        score_home, score_away = _parse_scores([r['score'] for r in rows])
+        valid = (bet_home != _INVALID) & (score_home != _INVALID)
+        exact = valid & (bet_home == score_home) & (bet_away == score_away)
+        outcome = valid & (np.sign(bet_home - bet_away) == np.sign(score_home - score_away))
+
+        n_users, n_matches = len(self.user_ids), len(self.match_ids)
+        self.bets = np.bincount(user_idx, minlength=n_users)
+        self.exact = np.bincount(user_idx, weights=exact, minlength=n_users).astype(np.int64)
+        self.hits = np.bincount(user_idx, weights=outcome, minlength=n_users).astype(np.int64)
+
+        hit_matrix = np.zeros((n_users, n_matches), dtype=bool)
+        hit_matrix[user_idx, match_idx] = outcome
+        runs = _run_lengths(hit_matrix)
+        self.longest_streak = runs.max(axis=1, initial=0)
+        self.current_streak = runs[:, -1] if n_matches else np.zeros(n_users, dtype=np.int64)
+
+        bet_codes = _scoreline_codes(bet_home, bet_away)
+        counted = bet_codes != _INVALID
+        self.user_scorelines = np.bincount(user_idx[counted] * _N_SCORELINES + bet_codes[counted],
+                                           minlength=n_users * _N_SCORELINES).reshape(n_users, _N_SCORELINES)
+        self.match_scorelines = np.bincount(match_idx[counted] * _N_SCORELINES + bet_codes[counted],
+                                            minlength=n_matches * _N_SCORELINES).reshape(n_matches, _N_SCORELINES)
+        self.consensus = self.match_scorelines.argmax(axis=1)
+        self.actual = np.full(n_matches, _INVALID, dtype=np.int64)
+        self.actual[match_idx] = _scoreline_codes(score_home, score_away)
+
+    def user_stats(self, telegram_id: int) -> dict | None:
+        """
+        Returns the user's statistics or None if the user has no scored bets: the number of bets, right outcomes and
+        exact scores, hit rate, current and longest streaks of right outcomes and the most frequent bet.
+        """
+        i = np.searchsorted(self.user_ids, telegram_id)
+        if i == len(self.user_ids) or self.user_ids[i] != telegram_id:
+            return None
+        scorelines = self.user_scorelines[i]
+        return {
+            'telegram_id': telegram_id,
+            'first_name': self._user_names[telegram_id][0],
+            'last_name': self._user_names[telegram_id][1],
+            'bets': int(self.bets[i]),
+            'hits': int(self.hits[i]),
+            'exact': int(self.exact[i]),
+            'hit_rate': float(self.hits[i] / self.bets[i]),
+            'current_streak': int(self.current_streak[i]),
+            'longest_streak': int(self.longest_streak[i]),
+            'favourite_score': _scoreline(int(scorelines.argmax())) if scorelines.any() else None,
+        }
+
+    def all_user_stats(self) -> list[dict]:
+        return [self.user_stats(int(telegram_id)) for telegram_id in self.user_ids]
+
+    def leaders(self, by: str, n: int = 5, min_bets: int = 1) -> list[dict]:
+        """
+        Returns stats of the top users.
+        :param by: 'hit_rate' or 'longest_streak'.
+        :param n: Number of users.
+        :param min_bets: Users with fewer bets are not ranked by hit rate.
+        """
+        if by == 'hit_rate':
+            values = np.where(self.bets >= min_bets, self.hits / np.maximum(self.bets, 1), -1)
+        else:
+            values = self.longest_streak
+        top = np.argsort(-values, kind='stable')[:n]
+        return [self.user_stats(int(self.user_ids[i])) for i in top if values[i] >= 0]
+
+    def match_consensus(self) -> list[dict]:
+        """
+        Returns the crowd's consensus on every match in kickoff order: the most frequent bet, its share among the
+        match's bets and whether it matched the final score.
+        """
+        bet_counts = self.match_scorelines.sum(axis=1)
+        shares = self.match_scorelines.max(axis=1) / np.maximum(bet_counts, 1)
+        hit = self.consensus == self.actual
+        return [{'row': row, 'bets': int(bet_counts[i]), 'consensus': _scoreline(int(self.consensus[i])),
+                 'share': float(shares[i]), 'hit': bool(hit[i])}
+                for i, row in enumerate(self._match_rows) if bet_counts[i]]
+
+    def consensus_accuracy(self) -> float | None:
+        """Share of matches whose most frequent bet was the exact final score."""
+        has_bets = self.match_scorelines.any(axis=1)
+        if not has_bets.any():
+            return None
+        return float((self.consensus == self.actual)[has_bets].mean())
+
+    def score_distribution(self, match_id: int) -> list[tuple[str, int]]:
+        """Returns (scoreline, number of bets) pairs of the match from the most to the least frequent."""
+        i = np.flatnonzero(self.match_ids == match_id)
+        if not len(i):
+            return []
+        counts = self.match_scorelines[i[0]]
+        codes = np.flatnonzero(counts)
+        codes = codes[np.argsort(-counts[codes], kind='stable')]
+        return [(_scoreline(int(c)), int(counts[c])) for c in codes]
@@ -1,8 +1,13 @@
 from db import Database
+import metrics
+from settings import get_settings
+from utils import init_logging
 from bot import BetBot
 from scheduler import BotScheduler
 from stats_api import StatsAPIHandler
 from controller import Controller
+from round_deadlines import RoundDeadlineService
+from workers import WorkerPool
 
 
 class App:
@@ -12,11 +17,28 @@ class App:
 
 
 if __name__ == '__main__':
+    init_logging()
     db = Database()
     bot = BetBot(db)
     stats_api_handler = StatsAPIHandler(db)
-    scheduler = BotScheduler()
+    scheduler = BotScheduler(db)
     scheduler.schedule_bon_appetit(job=bot.send_bon_appetit)
     scheduler.schedule_work_over(job=bot.send_work_over)
-    controller = Controller(telegram_bot=bot, database=db, scheduler=scheduler, stats_api_handler=stats_api_handler)
-    app = App(controller)
+    round_deadlines = RoundDeadlineService(bot=bot, db=db, scheduler=scheduler)
+    round_deadlines.sync()
+    scheduler.schedule_deadlines_sync(job=round_deadlines.sync)
+
+    settings = get_settings()
+    if settings.metrics_port:
+        metrics.start_http_server(settings.metrics_port)
+    if settings.metrics_file:
+        scheduler.schedule_metrics_dump(job=lambda: metrics.write_to_file(settings.metrics_file))
+    worker_pool = WorkerPool(settings.worker_processes)
+    controller = Controller(telegram_bot=bot, database=db, scheduler=scheduler, stats_api_handler=stats_api_handler,
+                            worker_pool=worker_pool)
+    scheduler.schedule_season_archival(job=controller.archive_finished_seasons)
+    scheduler.schedule_results_sync(job=controller.sync_match_results)
+    try:
+        app = App(controller)
+    finally:
+        worker_pool.shutdown()
@@ -0,0 +1,240 @@
+"""
+Micro-benchmarks of the bot's hot paths.
+
+Usage:
+    python benchmark.py                    # run and compare against the stored baseline
+    python benchmark.py --save-baseline    # run and store the results as the new baseline
+    python benchmark.py -k db_             # run only benchmarks whose names contain 'db_'
+    python benchmark.py -k startup_        # measure cold start: imports in a fresh interpreter
+
+Exits with code 1 if any benchmark got slower than its baseline by more than the threshold.
+"""
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import timeit
+from os import path
+from types import SimpleNamespace
+
+from utils import init_logging
+
+REPO_DIR = path.dirname(path.abspath(__file__))
+BASELINE_PATH = path.join(REPO_DIR, 'benchmark_baseline.json')
+DEFAULT_THRESHOLD = 0.2  # 20% slower than the baseline is a regression
+REPEAT = 5
+
+_benchmarks: dict[str, callable] = {}
+
+
+def benchmark(func: callable) -> callable:
+    """Registers a benchmark. The function receives the shared benchmark context and returns a callable to time."""
+    _benchmarks[func.__name__] = func
+    return func
+
+
+def create_context() -> SimpleNamespace:
+    """Creates data shared by benchmarks, including an embedded db filled with demo data."""
+    from embedded_db import EmbeddedDatabase, seed_demo_data
+
+    db = EmbeddedDatabase()
+    seed_demo_data(db, n_users=100, n_rounds=10, matches_per_round=8)
+    return SimpleNamespace(db=db, season_id=1, contest_id=1, telegram_id=1000)
+
+
+@benchmark
+def bot_correct_bet(ctx):
+    from bot import BetBot
+    messages = [SimpleNamespace(content_type='text', text=t) for t in ('2-1', ' 0 : 0 ', '10-2', '2-1-1', 'abc', '3')]
+
+    def run():
+        for m in messages:
+            BetBot._correct_bet(m)
+    return run
+
+
+@benchmark
+def bet_input_session_walk(ctx):
+    from bet_input_sessions import BetInputSession
+    matches = tuple(f'Team {i} - Team {i + 1}' for i in range(0, 16, 2))
+
+    def run():
+        session = BetInputSession(telegram_id=1, matches=matches)
+        while session.next_match():
+            pass
+    return run
+
+
+@benchmark
+def user_to_dict(ctx):
+    user = ctx.db.get_user(ctx.telegram_id)
+    return user.to_dict
+
+
+@benchmark
+def user_from_dict(ctx):
+    from users import User
+    d = ctx.db.get_user(ctx.telegram_id).to_dict()
+    return lambda: User.from_dict(d)
+
+
+@benchmark
+def user_from_row(ctx):
+    from users import User, USER_COLUMNS
+    row = tuple(ctx.db.get_user(ctx.telegram_id).to_dict().values())
+    return lambda: User.from_row(USER_COLUMNS, row)
+
+
+@benchmark
+def db_gen_insert_query(ctx):
+    from db import Database
+    data = {'telegram_id': 1, 'first_name': 'a', 'last_name': 'b', 'is_admin': 0}
+    return lambda: Database._gen_insert_query('users', data)
+
+
+@benchmark
+def db_extract_mysql_queries(ctx):
+    from db import Database
+    filepath = path.join('database', 'create_matches.sql')
+    return lambda: Database._extract_mysql_queries(filepath)
+
+
+@benchmark
+def db_get_users(ctx):
+    return ctx.db.get_users
+
+
+@benchmark
+def db_get_user(ctx):
+    return lambda: ctx.db.get_user(ctx.telegram_id)
+
+
+@benchmark
+def membership_contest_ids(ctx):
+    from contest_membership import ContestMembershipIndex
+    membership = ContestMembershipIndex(ctx.db)
+    membership.reload()
+    return lambda: membership.contest_ids(ctx.telegram_id)
+
+
+@benchmark
+def db_get_admin(ctx):
+    return ctx.db.get_admin
+
+
+@benchmark
+def db_get_users_without_bets(ctx):
+    return lambda: ctx.db.get_users_without_bets(ctx.season_id, 10)
+
+
+@benchmark
+def db_get_round_bets(ctx):
+    return lambda: ctx.db.get_round_bets(ctx.season_id, 3)
+
+
+@benchmark
+def db_get_contest_scored_bets(ctx):
+    return lambda: ctx.db.get_contest_scored_bets(ctx.contest_id)
+
+
+@benchmark
+def analytics_build(ctx):
+    from analytics import ContestAnalytics
+    rows = ctx.db.get_contest_scored_bets(ctx.contest_id)
+    return lambda: ContestAnalytics(rows)
+
+
+def _run_python(code: str) -> None:
+    """Runs code in a fresh interpreter, i.e. with nothing imported yet."""
+    subprocess.run([sys.executable, '-c', code], cwd=REPO_DIR, check=True)
+
+
+@benchmark
+def startup_interpreter(ctx):
+    return lambda: _run_python('pass')
+
+
+@benchmark
+def startup_import_db(ctx):
+    return lambda: _run_python('import db')
+
+
+@benchmark
+def startup_import_controller(ctx):
+    return lambda: _run_python('import controller')
+
+
+@benchmark
+def startup_import_app(ctx):
+    return lambda: _run_python('import app')
+
+
+def measure(func: callable) -> float:
+    """Returns the best time of a single call of func in seconds."""
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=REPEAT, number=number)) / number
+
+
+def run(name_filter: str = '') -> dict[str, float]:
+    ctx = create_context()
+    results = {}
+    try:
+        for name, factory in _benchmarks.items():
+            if name_filter in name:
+                results[name] = measure(factory(ctx))
+    finally:
+        ctx.db.drop()
+    return results
+
+
+def compare(results: dict[str, float], baseline: dict[str, float], threshold: float) -> list[str]:
+    """Prints results next to the baseline and returns names of benchmarks that regressed."""
+    regressions = []
+    print(f"{'benchmark':<32}{'time, us':>12}{'baseline':>12}{'change':>10}")
+    for name, seconds in results.items():
+        base = baseline.get(name)
+        change = ''
+        if base:
+            ratio = seconds / base - 1
+            change = f'{ratio:+.0%}'
+            if ratio > threshold:
+                regressions.append(name)
+                change += ' !'
+        print(f"{name:<32}{seconds * 1e6:>12.2f}{base * 1e6 if base else float('nan'):>12.2f}{change:>10}")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Micro-benchmarks of the bot hot paths.')
+    parser.add_argument('--save-baseline', action='store_true', help='store results as the new baseline')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='baseline file path')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='relative slowdown considered a regression, e.g. 0.2 for 20%%')
+    parser.add_argument('-k', dest='name_filter', default='', help='run only benchmarks containing this string')
+    args = parser.parse_args()
+    init_logging(log_dir=tempfile.gettempdir())  # keeps the runtime log out of the repo
+
+    results = run(args.name_filter)
+
+    baseline = {}
+    if path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    regressions = compare(results, baseline, args.threshold)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({**baseline, **results}, f, indent=2, sort_keys=True)
+        print(f"Baseline saved to {args.baseline}.")
+        return 0
+
+    if regressions:
+        print(f"Regressions over {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
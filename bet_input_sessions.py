@@ -1,8 +1,36 @@
+from datetime import datetime
+
+
 class BetInputSession:
-    def __init__(self, telegram_id: int, matches: tuple[str, ...]):
+    def __init__(self, telegram_id: int, matches: tuple[str, ...], match_ids: tuple[int, ...] = None,
+                 league_api_id: int = None, round: int = None, deadline: datetime = None):
+        """
+        :param telegram_id: Telegram ID of the user placing bets.
+        :param matches: Titles of the round's matches to place bets on, in order.
+        :param match_ids: API IDs of the matches, in the same order.
+        :param league_api_id: API ID of the league the round belongs to.
+        :param round: Round number.
+        :param deadline: Kickoff of the round's first match, bets aren't accepted after it.
+        """
         self.user_id = telegram_id
         self.matches: tuple[str, ...] = matches
         self.match = None
+        self.league_api_id = league_api_id
+        self.round = round
+        self.deadline = deadline
+        self.match_ids = match_ids
+        self.request_message_id: int | None = None  # the last bet request, it carries score buttons
+
+    @property
+    def match_id(self) -> int | None:
+        """API ID of the match a bet is being placed on."""
+        if not self.match or not self.match_ids:
+            return None
+        return self.match_ids[self.matches.index(self.match)]
+
+    def expired(self, now: datetime) -> bool:
+        """Determines if the round's deadline has passed."""
+        return self.deadline is not None and now >= self.deadline
 
     def next_match(self):
         if not self.match:
@@ -1,42 +1,198 @@
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import string
 
 import telebot
 import utils
 import config
+from settings import get_settings
 from users import User
 from bet_input_sessions import BetInputSession
-
-TELEGRAM_TOKEN: str = utils.get_from_env("TELEGRAM_TOKEN")
-ADMIN_ID: str = utils.get_from_env("ADMIN_ID")
-
-utils.init_logging()
+from webhook import WebhookServer
+from dispatcher import UpdateDispatcher
+from request_context import RequestContext
+from contest_membership import ContestMembershipIndex
+from update_dedup import UpdateDeduplicator
+from callback_router import CallbackRouter, encode_callback_data
+from flood_control import FloodLimiter
+from notifications import AdminNotifier
+import metrics
+import query_profiler
+import views
+
+TELEGRAM_TOKEN: str = get_settings().telegram_token
+ADMIN_ID: int = get_settings().admin_id
+UPDATE_MODE: str = get_settings().bot_update_mode  # 'polling' or 'webhook'
+WEBHOOK_URL: str = get_settings().webhook_url
+WEBHOOK_LISTEN_HOST: str = get_settings().webhook_listen_host
+WEBHOOK_LISTEN_PORT: int = get_settings().webhook_listen_port
+WEBHOOK_SECRET: str = get_settings().webhook_secret
 
 
 class BetBot(telebot.TeleBot):
 
     def __init__(self, db):
-        super().__init__(token=TELEGRAM_TOKEN, parse_mode='HTML')
+        # Handlers are run by self._dispatcher, telebot's own worker pool doesn't keep the order of updates in a chat.
+        super().__init__(token=TELEGRAM_TOKEN, parse_mode='HTML', threaded=False)
         self.db = db
-        self._active_sessions: dict[int: BetInputSession] | None = None
+        self._active_sessions: dict[int, BetInputSession] = {}
         self._controller_command_handler = None
+        self._dispatcher = UpdateDispatcher(handler=self._process_update, workers=config.DISPATCHER_WORKERS,
+                                            max_pending=config.DISPATCHER_MAX_PENDING)
+        self._admin_notifier = AdminNotifier(send=self._send_admin_message)
+        self.membership = ContestMembershipIndex(db)
+        self._dedup = UpdateDeduplicator(db)
+        self.callbacks = CallbackRouter()
+        self._flood_limiter = FloodLimiter()
+        # flood warnings are sent in the background, so polling and webhook threads never wait for telegram
+        self._flood_warnings = ThreadPoolExecutor(max_workers=1, thread_name_prefix='FloodWarnings')
 
         self.register_message_handler(callback=self._handle_bet, func=self._filter_bet)
         self.register_message_handler(callback=self._handle_message, func=self._filter_message)
+        # every callback query goes through self.callbacks, which times handlers on its own
+        super().register_callback_query_handler(callback=self._route_callback_query, func=None)
+        self.callbacks.register('start_bets', self._start_bets_callback)
+        self.callbacks.register('bet', self._bet_button_callback, int, int, int)
 
     def start(self) -> None:
         logging.info("Bot started.")
-        self.notify_admin("<b>БОТ ЗАПУЩЕН</b>")
+        self.notify_admin("<b>БОТ ЗАПУЩЕН</b>", critical=True)
+        # telegram won't redeliver updates up to the watermark to polling
+        self.last_update_id = max(self.last_update_id, self._dedup.load())
         try:
-            self.polling(non_stop=True)
+            if UPDATE_MODE == 'webhook':
+                self._serve_webhook()
+            else:
+                self.remove_webhook()
+                self.polling(non_stop=True)
         except Exception as e:
             logging.info("Bot stopped. Unexpected error occurred.")
             logging.exception(repr(e))
-            self.notify_admin(f"<b>БОТ ОСТАНОВЛЕН</b>\n\nНеожиданная ошибка: {e}")
+            self.notify_admin(f"<b>БОТ ОСТАНОВЛЕН</b>\n\nНеожиданная ошибка: {e}", critical=True)
         finally:
             logging.info("Bot stopped. Probably due to manual stoppage from IDE.")
-            self.notify_admin("<b>БОТ ОСТАНОВЛЕН</b>\n\nВозможная причина: принудительное завершение из IDE.")
+            self.notify_admin("<b>БОТ ОСТАНОВЛЕН</b>\n\nВозможная причина: принудительное завершение из IDE.",
+                              critical=True)
+            self._dispatcher.stop()
+            self._dedup.save()
+            self._flood_warnings.shutdown()
+            self._admin_notifier.stop()
+
+    def process_new_updates(self, updates: list[telebot.types.Update]) -> None:
+        """
+        Hands received updates over to the dispatcher. Updates of the same chat are processed one by one in the order
+        they were received, updates of different chats are processed concurrently. Updates delivered again and updates
+        of users sending too many of them are skipped.
+        :param updates: A list of updates received either by polling or via webhook.
+        """
+        for update in updates:
+            # telebot polls for updates with offset=self.last_update_id + 1, so it has to be advanced right away
+            if update.update_id > self.last_update_id:
+                self.last_update_id = update.update_id
+            if not self._dedup.accept(update):
+                metrics.UPDATES_SKIPPED.inc(reason='duplicate')
+                logging.info(f"Update {update.update_id} skipped: it has already been received.")
+                continue
+            if not self._allowed_by_flood_limiter(update):
+                self._dedup.done(update.update_id)  # a dropped update is done, or the watermark would get stuck
+                continue
+            self._dispatcher.submit(BetBot._update_chat_key(update), update)
+
+    def _allowed_by_flood_limiter(self, update: telebot.types.Update) -> bool:
+        """
+        Determines if the update's sender hasn't exceeded the allowed update rate. Warns the sender in the background
+        at most once per config.FLOOD_WARNING_COOLDOWN seconds while their updates are dropped. The admin is never
+        throttled.
+        :param update: An update received from telegram.
+        :return: True if the update may be processed, False if it must be dropped.
+        """
+        sender = update.message or update.callback_query or update.edited_message
+        if not sender or not sender.from_user or sender.from_user.id == ADMIN_ID:
+            return True
+        telegram_id = sender.from_user.id
+        allowed, warn = self._flood_limiter.allow(telegram_id)
+        if allowed:
+            return True
+        metrics.UPDATES_SKIPPED.inc(reason='flood')
+        if warn:
+            logging.warning(f"User {telegram_id} is sending too many updates. Their updates are being dropped.")
+            self._flood_warnings.submit(self._send_flood_warning, telegram_id)
+        return False
+
+    def _send_flood_warning(self, telegram_id: int) -> None:
+        try:
+            # a throttled user is writing to the bot, so there is no need to mark them unblocked in the db
+            self.send_message(telegram_id, "<b>Слишком много сообщений!</b>\n\n"
+                                           "Подождите немного: пока что новые сообщения не будут обработаны.",
+                              mark_unblocked=False)
+        except Exception as e:
+            logging.error(f"Failed to warn user {telegram_id} about flood control: {repr(e)}")
+
+    def _process_update(self, update: telebot.types.Update) -> None:
+        """Runs filters and handlers for a single update. Called from the dispatcher's worker threads."""
+        try:
+            for obj in (update.message, update.callback_query):
+                if obj:
+                    obj.context = self._create_context(obj.from_user.id)
+            with query_profiler.update_scope(f'update {update.update_id}'):
+                super().process_new_updates([update])
+        finally:
+            self._dedup.done(update.update_id)
+
+    def _create_context(self, telegram_id: int) -> RequestContext:
+        """Creates a context shared by filters and handlers of an update sent by the user."""
+        return RequestContext(telegram_id=telegram_id, db=self.db, session=self._active_sessions.get(telegram_id),
+                              membership=self.membership)
+
+    def get_context(self, obj: telebot.types.Message | telebot.types.CallbackQuery) -> RequestContext:
+        """
+        Returns the context of the update a message or a callback query belongs to.
+        :param obj: A message or a callback query received from a user.
+        """
+        context = getattr(obj, 'context', None)
+        if context is None:  # obj didn't come through self.process_new_updates
+            context = obj.context = self._create_context(obj.from_user.id)
+        return context
+
+    @staticmethod
+    def _update_chat_key(update: telebot.types.Update) -> int | tuple[str, int]:
+        """Returns the id of the chat (or the user) the update belongs to. Updates of a chat are processed in order."""
+        if update.message:
+            return update.message.chat.id
+        if update.callback_query:
+            return update.callback_query.from_user.id
+        if update.my_chat_member:
+            return update.my_chat_member.chat.id
+        return 'update', update.update_id  # no chat to keep the order in
+
+    def _serve_webhook(self) -> None:
+        """Registers the webhook with telegram and receives updates via an embedded HTTP server."""
+        server = WebhookServer(bot=self, host=WEBHOOK_LISTEN_HOST, port=WEBHOOK_LISTEN_PORT,
+                               secret_token=WEBHOOK_SECRET)
+        if WEBHOOK_URL:
+            self.set_webhook(url=WEBHOOK_URL, secret_token=WEBHOOK_SECRET)
+            logging.info(f"Webhook set: {WEBHOOK_URL}.")
+        else:
+            logging.warning("WEBHOOK_URL is not set. Webhook server only accepts locally POSTed updates.")
+        server.serve_forever()
+
+    def register_message_handler(self, callback, *args, **kwargs) -> None:
+        super().register_message_handler(BetBot._timed_handler(callback), *args, **kwargs)
+
+    def register_callback_query_handler(self, callback, *args, **kwargs) -> None:
+        super().register_callback_query_handler(BetBot._timed_handler(callback), *args, **kwargs)
+
+    def _route_callback_query(self, query: telebot.types.CallbackQuery) -> None:
+        """Routes the callback query to its handler by the action in its callback_data."""
+        if not self.callbacks.route(query):
+            # ends the query, otherwise the pressed button stays in progress
+            self.answer_callback_query(query.id)
+
+    @staticmethod
+    def _timed_handler(callback: callable) -> callable:
+        """Wraps a handler to observe its latency in metrics.HANDLER_LATENCY."""
+        return metrics.timed(metrics.HANDLER_LATENCY, handler=callback.__name__)(callback)
 
     def set_command_handler(self, handler):
         """Attach the controller as the command handler."""
@@ -49,26 +205,40 @@ class BetBot(telebot.TeleBot):
         else:
             self.reply_to(message, text=f"К сожалению, команда {message.text} пока не поддерживается 😪")
 
-    def send_message(self, *args, **kwargs):
+    def send_message(self, *args, mark_unblocked: bool = True, **kwargs):
+        """
+        Sends a message and keeps the user's 'blocked_bot' flag in the db up to date.
+        :param mark_unblocked: If False, a delivered message doesn't clear the flag, which saves a db write.
+        :return: The sent message, None if the user has blocked the bot.
+        """
         chat_id = kwargs.get('chat_id', args[0] if args else None)
         try:
-            super().send_message(*args, **kwargs)
-            self._mark_bot_unblocked(chat_id)
+            sent = super().send_message(*args, **kwargs)
+            metrics.TELEGRAM_SENDS.inc(result='ok')
+            if mark_unblocked:
+                self._mark_bot_unblocked(chat_id)
+            return sent
         except telebot.apihelper.ApiTelegramException as e:
+            metrics.TELEGRAM_SENDS.inc(result=str(e.error_code))
             if e.error_code == 403:  # 'error_code': 403, 'description': 'Forbidden: bot was blocked by the user'
                 self._mark_bot_blocked(chat_id)
-                logging.exception(repr(e))
-                return
+                logging.info(f"Message to {chat_id} not sent, the bot is blocked by the user.")
+                return None
             else:
-                logging.exception(repr(e))
+                logging.error(f"Failed to send a message to {chat_id}: {repr(e)}")
                 raise e  # Re-raise the exception if it is a different error
 
-    def notify_admin(self, text: str) -> None:
-        prefix = datetime.now().strftime(config.PREFERRED_DATETIME_FORMAT) + "\n"
-        try:
-            self.send_message(chat_id=ADMIN_ID, text=prefix + text, parse_mode='HTML')
-        except Exception as e:
-            logging.exception(repr(e))
+    def notify_admin(self, text: str, critical: bool = False) -> None:
+        """
+        Queues a notification for the admin without waiting for it to be sent.
+        :param text: HTML-formatted notification text.
+        :param critical: If True, the notification is sent right away. Otherwise, it is deduplicated and sent as a part
+        of a periodic digest.
+        """
+        self._admin_notifier.notify(text, critical=critical)
+
+    def _send_admin_message(self, text: str) -> None:
+        self.send_message(chat_id=ADMIN_ID, text=text, parse_mode='HTML')
 
     def _handle_message(self, message: telebot.types.Message) -> None:
         """
@@ -118,7 +288,7 @@ class BetBot(telebot.TeleBot):
         :param message: The incoming message object from a user.
         :return: True if message is from allowed user, False otherwise.
         """
-        user_allowed = self._user_allowed(message.from_user.id)
+        user_allowed = self._user_allowed(self.get_context(message))
         if not user_allowed:
             return False, f"<b>Доступ запрещен!</b>\n\n" \
                           f"К сожалению, это закрытое соревнование, и Вы не являетесь его участником. 😢"
@@ -143,18 +313,17 @@ class BetBot(telebot.TeleBot):
         :param message: The incoming message object from a user.
         :return: True if a message is a bet, False otherwise.
         """
-        if not self._bet_session_active(message.from_user.id):
-            return False
-        return True
+        return self.get_context(message).session is not None
 
-    def _user_allowed(self, telegram_id: int) -> bool:
+    @staticmethod
+    def _user_allowed(context: RequestContext) -> bool:
         """
         Determines if the user is allowed to participate in the competition.
-        Checks if the user’s telegram ID is stored in the db.
-        :param telegram_id: User's telegram ID.
+        Checks if the user is the admin or participates in any bet contest, both without querying the db.
+        :param context: Context of the update sent by the user.
         :return: True if the user is allowed, False otherwise.
         """
-        return self.db.get_user(telegram_id) is not None
+        return context.telegram_id == ADMIN_ID or bool(context.contest_ids)
 
     def _mark_bot_blocked(self, telegram_id: int) -> None:
         """Marks the user as having blocked the bot in the db.
@@ -183,20 +352,28 @@ class BetBot(telebot.TeleBot):
         # progress forever.
         self.answer_callback_query(query.id)
 
-        matches = ('Зенит - Спартак', 'Краснодар - Динамо', 'Локомотив - Крылья Советов')
+        contest_ids = self.get_context(query).contest_ids
+        matches = self.db.get_next_round_matches(max(contest_ids), after=datetime.now()) if contest_ids else []
+        if not matches:
+            self.send_message(chat_id=chat_id, text='Сейчас нет тура, открытого для ставок.')
+            return
         session = self._create_bet_input_session(chat_id, matches)
 
         self.send_message(chat_id=chat_id, text='Начинаем!')
         self._request_bet(session)
 
-    def _create_bet_input_session(self, telegram_id: int, matches: tuple[str, ...]) -> BetInputSession:
+    def _create_bet_input_session(self, telegram_id: int, matches: list[dict]) -> BetInputSession:
         """
         Creates a bet input session for a user and adds it to bot's list of sessions.
         :param telegram_id: telegram_id of a user who started bet input session.
-        :param matches: A list of this round's matches for user to place bets on.
+        :param matches: This round's matches for user to place bets on as returned by
+        Database.get_next_round_matches().
         :return: Newly created BetInputSession instance.
         """
-        session = BetInputSession(telegram_id=telegram_id, matches=matches)
+        session = BetInputSession(telegram_id=telegram_id, matches=tuple(views.match_title(m) for m in matches),
+                                  match_ids=tuple(m['api_id'] for m in matches),
+                                  league_api_id=matches[0]['league_api_id'], round=matches[0]['round'],
+                                  deadline=min(m['start_datetime'] for m in matches))
         self._add_bet_input_session(telegram_id, session)
         return session
 
@@ -212,6 +389,7 @@ class BetBot(telebot.TeleBot):
         bet for the current match.
         """
         user_id = session.user_id
+        self._clear_score_keyboard(session)
 
         if not repeated_bet:
             match = session.next_match()
@@ -220,8 +398,51 @@ class BetBot(telebot.TeleBot):
                 return
 
         match_num = session.matches.index(session.match) + 1
-        text = f"Матч {match_num}:\n<b>{session.match}</b>\n\nВаша ставка?"
-        self.send_message(user_id, text=text)
+        text = f"Матч {match_num}:\n<b>{session.match}</b>\n\nВаша ставка? Пришлите счет или выберите его ниже."
+        sent = self.send_message(user_id, text=text, reply_markup=BetBot._score_keyboard(session.match_id))
+        session.request_message_id = sent.message_id if sent else None
+
+    def _clear_score_keyboard(self, session: BetInputSession) -> None:
+        """Removes score buttons from the session's last bet request, so they can't be pressed once it's answered."""
+        if session.request_message_id is None:
+            return
+        message_id, session.request_message_id = session.request_message_id, None
+        try:
+            self.edit_message_reply_markup(chat_id=session.user_id, message_id=message_id)
+        except telebot.apihelper.ApiTelegramException as e:
+            logging.warning(f"Failed to remove score buttons from message {message_id} to {session.user_id}: {repr(e)}")
+
+    @staticmethod
+    def _score_keyboard(match_id: int) -> telebot.types.InlineKeyboardMarkup:
+        """Returns inline buttons placing the most common bets on the match with the given API ID."""
+        goals = range(config.BET_BUTTON_MAX_GOALS + 1)
+        keyboard = telebot.types.InlineKeyboardMarkup(row_width=len(goals))
+        buttons = [telebot.types.InlineKeyboardButton(f'{home}-{away}',
+                                                      callback_data=encode_callback_data('bet', match_id, home, away))
+                   for home in goals for away in goals]
+        keyboard.add(*buttons)
+        return keyboard
+
+    def _bet_button_callback(self, query: telebot.types.CallbackQuery, match_id: int, home: int, away: int) -> None:
+        """
+        A callback func for the score buttons sent with a bet request. Places the bet like a typed one would.
+        :param query: Callback query instance received after the user pressed a score button.
+        :param match_id: API ID of the match the button was sent for.
+        :param home: Goals of the home team.
+        :param away: Goals of the away team.
+        """
+        session = self._active_sessions.get(query.from_user.id)
+        if not session or not session.match or session.match_id != match_id:
+            self.answer_callback_query(query.id, text='Эта ставка уже неактуальна.')
+            return
+        if self.round_locked(session):
+            self._delete_bet_input_session(session.user_id)
+            self.answer_callback_query(query.id)
+            self.send_message(session.user_id, BetBot._round_locked_text())
+            return
+
+        self.answer_callback_query(query.id, text=f'Ставка {home}-{away} принята!')
+        self._request_bet(session)
 
     def _finish_bet_session(self, telegram_id: int) -> None:
         """
@@ -243,8 +464,11 @@ class BetBot(telebot.TeleBot):
 
         :param message: The incoming message object from a user.
         """
-        user_id = message.from_user.id
-        session = self._active_sessions[user_id]
+        session = self.get_context(message).session
+        if self.round_locked(session):
+            self._delete_bet_input_session(session.user_id)
+            self.reply_to(message, BetBot._round_locked_text())
+            return
 
         input_valid = BetBot._correct_bet(message)
         if not input_valid:
@@ -255,7 +479,6 @@ class BetBot(telebot.TeleBot):
             return
 
         self.reply_to(message, f"Ставка принята!")
-        session = self._active_sessions[message.from_user.id]
         self._request_bet(session)
 
     @staticmethod
@@ -294,21 +517,20 @@ class BetBot(telebot.TeleBot):
 
     def _add_bet_input_session(self, telegram_id: int, session: BetInputSession) -> None:
         """
-        Adds the new BetInputSession to the list of self._active_sessions.
+        Adds the new BetInputSession to self._active_sessions.
         :param telegram_id: User's telegram ID whose session is to be added.
         :param session: New BetInputSession instance.
         """
-        if not self._active_sessions:
-            self._active_sessions = {telegram_id: session}
-        else:
-            self._active_sessions.update({telegram_id: session})
+        self._active_sessions[telegram_id] = session
+        metrics.ACTIVE_SESSIONS.set(len(self._active_sessions))
 
     def _delete_bet_input_session(self, telegram_id: int) -> None:
         """
         Deletes BetInputSession from the list of self._active_sessions.
         :param telegram_id: User's telegram ID whose session is to be deleted.
         """
-        self._active_sessions.pop(telegram_id)
+        self._active_sessions.pop(telegram_id, None)
+        metrics.ACTIVE_SESSIONS.set(len(self._active_sessions))
 
     def _bet_session_active(self, telegram_id: int) -> bool:
         """
@@ -316,12 +538,53 @@ class BetBot(telebot.TeleBot):
         :param telegram_id: User's telegram ID whose session is to be checked.
         :return: True if bot session is on, False otherwise.
         """
-        if not self._active_sessions:
-            return False
         if not self._active_sessions.get(telegram_id, None):
             return False
         return True
 
+    def lock_round(self, league_api_id: int, round: int) -> None:
+        """
+        Finishes active bet input sessions for the round once its deadline has come. Bets on the round are refused
+        by self.round_locked() from then on anyway, this only lets users know right away.
+        :param league_api_id: API ID of the league the round belongs to.
+        :param round: Round number.
+        """
+        for telegram_id, session in list(self._active_sessions.items()):
+            if (session.league_api_id, session.round) == (league_api_id, round):
+                self._delete_bet_input_session(telegram_id)
+                self.send_message(telegram_id, text=BetBot._round_locked_text())
+        logging.info(f"Betting on league {league_api_id}, round {round} locked.")
+
+    @staticmethod
+    def round_locked(session: BetInputSession) -> bool:
+        """
+        Determines if bets on the session's round are not accepted anymore. The deadline comes from the round's
+        fixtures, so the lock holds across restarts.
+        """
+        return session.expired(datetime.now())
+
+    def broadcast(self, telegram_ids: list[int], texts: list[str]) -> None:
+        """
+        Sends the same pre-rendered messages to every user. A failure to deliver to one user doesn't stop the broadcast.
+        Recipients who got the messages are marked as not blocking the bot with a single db update after all sends, the
+        ones who have blocked it keep their flag.
+        :param telegram_ids: Telegram IDs of recipients.
+        :param texts: Message texts to send to every recipient, in order.
+        """
+        delivered = []
+        for telegram_id in telegram_ids:
+            try:
+                if all(self.send_message(telegram_id, text=text, mark_unblocked=False) for text in texts):
+                    delivered.append(telegram_id)
+            except Exception as e:
+                logging.exception(f"Failed to deliver a broadcast to {telegram_id}: {repr(e)}")
+        if delivered:
+            self.db.mark_bot_unblock_many(delivered)
+
+    @staticmethod
+    def _round_locked_text() -> str:
+        return '<b>Приём ставок закрыт!</b>\n\nТур уже начался, ставки на его матчи больше не принимаются.'
+
     def send_bon_appetit(self):
         self.notify_admin(f"{datetime.now().strftime(config.PREFERRED_TIME_FORMAT)}: "
                           f"<b>Время обеда!<b>\nПриятного аппетита!")
@@ -335,14 +598,16 @@ class BetBot(telebot.TeleBot):
 
     def send_options(self):
         keyboard = telebot.types.InlineKeyboardMarkup()
-        keyboard.add(telebot.types.InlineKeyboardButton("Bon Appétit", callback_data='bon_appetit'))
-        keyboard.add(telebot.types.InlineKeyboardButton("Work Over", callback_data='work_over'))
+        keyboard.add(telebot.types.InlineKeyboardButton("Bon Appétit",
+                                                        callback_data=encode_callback_data('bon_appetit')))
+        keyboard.add(telebot.types.InlineKeyboardButton("Work Over", callback_data=encode_callback_data('work_over')))
         self.send_message(ADMIN_ID, text='Выберете опцию:', reply_markup=keyboard)
 
 
 if __name__ == "__main__":
     from db import Database
 
+    utils.init_logging()
     db = Database()
     bot = BetBot(db)
     bot.start()
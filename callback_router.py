@@ -0,0 +1,77 @@
+import logging
+from typing import Callable
+
+import metrics
+
+CALLBACK_DATA_MAX_BYTES = 64  # telegram's limit on the size of an inline button's callback_data
+SEPARATOR = ':'
+
+
+def encode_callback_data(action: str, *args: int | str) -> str:
+    """
+    Builds an inline button's callback_data, e.g. encode_callback_data('bet', 2, 1, 0) == 'bet:2:1:0'.
+    :param action: Action prefix the router dispatches the callback query by.
+    :param args: Arguments passed to the action's handler, e.g. ids.
+    :return: callback_data of at most CALLBACK_DATA_MAX_BYTES bytes.
+    """
+    parts = (action, *map(str, args))
+    if any(SEPARATOR in part for part in parts):
+        raise ValueError(f"Callback data parts must not contain '{SEPARATOR}': {parts}")
+    data = SEPARATOR.join(parts)
+    if len(data.encode('UTF-8')) > CALLBACK_DATA_MAX_BYTES:
+        raise ValueError(f"Callback data exceeds {CALLBACK_DATA_MAX_BYTES} bytes: '{data}'")
+    return data
+
+
+def decode_callback_data(data: str) -> tuple[str, list[str]]:
+    """Splits callback_data made by encode_callback_data() into the action and its arguments."""
+    action, _, payload = data.partition(SEPARATOR)
+    return action, payload.split(SEPARATOR) if payload else []
+
+
+class CallbackRouter:
+    """
+    Dispatches callback queries to handlers by the action prefix of their callback_data.
+
+    telebot tests callback query handlers' filters one by one. Instead, a single handler routes every callback query:
+    the action is looked up in a dict and the arguments following it are converted to the types the action was
+    registered with, so the cost doesn't depend on the number of actions.
+    """
+
+    def __init__(self):
+        self._routes: dict[str, tuple[Callable, tuple[type, ...]]] = {}  # action: (handler, argument types)
+
+    def register(self, action: str, handler: Callable, *arg_types: type) -> None:
+        """
+        Routes callback queries with the action to the handler.
+        :param action: Action prefix of callback_data.
+        :param handler: A callable taking the callback query followed by the converted arguments.
+        :param arg_types: Types of the arguments following the action in callback_data, e.g. int.
+        """
+        if SEPARATOR in action:
+            raise ValueError(f"Callback action must not contain '{SEPARATOR}': '{action}'")
+        timed_handler = metrics.timed(metrics.HANDLER_LATENCY, handler=handler.__name__)(handler)
+        self._routes[action] = (timed_handler, arg_types)
+
+    def route(self, query) -> bool:
+        """
+        Calls the handler registered for the callback query's action.
+        :param query: A callback query received from a user.
+        :return: False if there is no handler for the action or its arguments are malformed.
+        """
+        action, args = decode_callback_data(query.data or '')
+        route = self._routes.get(action)
+        if not route:
+            logging.warning(f"No handler for callback data '{query.data}'.")
+            return False
+        handler, arg_types = route
+        if len(args) != len(arg_types):
+            logging.warning(f"Malformed callback data '{query.data}': {len(arg_types)} arguments expected.")
+            return False
+        try:
+            args = [arg_type(arg) for arg_type, arg in zip(arg_types, args)]
+        except ValueError:
+            logging.warning(f"Malformed callback data '{query.data}'.")
+            return False
+        handler(query, *args)
+        return True
@@ -2,3 +2,45 @@ PREFERRED_TIME_FORMAT = "%H:%M:%S"
 PREFERRED_DATE_FORMAT = "%d.%m.%Y"
 PREFERRED_DATETIME_FORMAT = f"{PREFERRED_DATE_FORMAT} {PREFERRED_TIME_FORMAT}"
 PREFERRED_TIMEZONE = 'Europe/Moscow'
+
+# Webhook mode settings
+WEBHOOK_WORKERS = 4
+WEBHOOK_QUEUE_SIZE = 1000
+WEBHOOK_ENQUEUE_TIMEOUT = 1  # seconds to wait for a free slot in a full queue before answering 503
+
+# Update dispatcher settings
+DISPATCHER_WORKERS = 8
+DISPATCHER_MAX_PENDING = 1000  # polling and webhook workers block while this many updates are waiting
+
+# Admin notification settings
+ADMIN_NOTIFY_DIGEST_INTERVAL = 60  # seconds between digests of regular notifications
+ADMIN_NOTIFY_DEDUP_WINDOW = 600  # seconds during which an identical notification is not sent again
+
+# Round deadline settings
+BET_REMINDER_LEAD_HOURS = 3  # how long before a round's first kickoff users without bets are reminded
+
+# Scheduler settings
+SCHEDULER_MISFIRE_GRACE_TIME = 60 * 60  # seconds a job missed e.g. during a restart may still be run late
+RESULTS_SYNC_INTERVAL_MINUTES = 15  # how often final scores of kicked off matches are fetched from the stats API
+RESULTS_SYNC_LOOKBACK_HOURS = 12  # matches that kicked off longer ago without a score aren't looked for anymore
+RESULTS_SYNC_MIN_QUOTA = 20  # stats API requests left for today the results sync doesn't touch
+FINISHED_MATCH_STATUSES = ('FT', 'AET', 'PEN')  # stats API statuses of matches with a final score
+UNPLAYED_MATCH_STATUSES = ('PST', 'CANC', 'ABD', 'AWD', 'WO')  # statuses of matches that won't get a score as planned
+
+# Logging settings
+LOG_FILE = "MyRPLBetBot.log"
+LOG_MAX_BYTES = 10 * 1024 * 1024  # the log file is rotated once it grows this big
+LOG_BACKUP_COUNT = 10  # rotated (gzipped) log files kept
+
+# Update deduplication settings
+UPDATE_DEDUP_SIZE = 10000  # recently accepted update and callback query ids remembered to skip their replays
+UPDATE_WATERMARK_SAVE_INTERVAL = 5  # min seconds between saves of the processed update id watermark to the db
+UPDATE_WATERMARK_TTL_DAYS = 7  # telegram may restart update ids after a week without updates
+
+# Bet input settings
+BET_BUTTON_MAX_GOALS = 3  # bet request buttons offer scores from 0-0 up to this number of goals per team
+
+# Flood control settings
+FLOOD_BURST = 20  # updates a user can send at once before being throttled
+FLOOD_REFILL_RATE = 1.  # updates per second a user can keep sending
+FLOOD_WARNING_COOLDOWN = 60  # min seconds between two warnings to a throttled user
@@ -0,0 +1,97 @@
+import logging
+import threading
+
+
+class ContestMembershipIndex:
+    """
+    Keeps participants of all bet contests in memory to authorize users without querying the db.
+
+    The index is loaded from the 'bet_contest_users' table once, on the first lookup, and then kept up to date by
+    self.join() and self.leave(), which change the table and the index together. Lookups are O(1) set and dict
+    operations and never touch the db.
+    """
+
+    def __init__(self, db):
+        """:param db: Database instance."""
+        self.db = db
+        self._members: dict[int, set[int]] = {}  # bet contest ID: telegram IDs of participants
+        self._contests: dict[int, frozenset[int]] = {}  # telegram ID: IDs of bet contests the user participates in
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._loaded = False
+
+    def is_member(self, contest_id: int, telegram_id: int) -> bool:
+        """Determines if the user participates in the bet contest."""
+        self._ensure_loaded()
+        return telegram_id in self._members.get(contest_id, ())
+
+    def contest_ids(self, telegram_id: int) -> frozenset[int]:
+        """Returns IDs of bet contests the user participates in."""
+        self._ensure_loaded()
+        return self._contests.get(telegram_id, frozenset())
+
+    def members(self, contest_id: int) -> frozenset[int]:
+        """Returns telegram IDs of the bet contest's participants."""
+        self._ensure_loaded()
+        with self._lock:
+            return frozenset(self._members.get(contest_id, ()))
+
+    def join(self, contest_id: int, telegram_id: int) -> bool:
+        """
+        Adds the user to the bet contest's participants.
+        :param contest_id: Bet contest ID.
+        :param telegram_id: Telegram ID of a user stored in the db.
+        :return: True if the user has joined, False if the user already participates or isn't stored in the db.
+        """
+        self._ensure_loaded()
+        with self._lock:
+            if telegram_id in self._members.get(contest_id, ()):
+                return False
+            if not self.db.add_bet_contest_user(contest_id, telegram_id):
+                return False
+            self._add(contest_id, telegram_id)
+        logging.info(f"User {telegram_id} joined bet contest {contest_id}.")
+        return True
+
+    def leave(self, contest_id: int, telegram_id: int) -> bool:
+        """
+        Removes the user from the bet contest's participants.
+        :param contest_id: Bet contest ID.
+        :param telegram_id: User's telegram ID.
+        :return: True if the user has left, False if the user didn't participate.
+        """
+        self._ensure_loaded()
+        with self._lock:
+            if telegram_id not in self._members.get(contest_id, ()):
+                return False
+            self.db.remove_bet_contest_user(contest_id, telegram_id)
+            self._members[contest_id].discard(telegram_id)
+            self._contests[telegram_id] = self._contests[telegram_id] - {contest_id}
+        logging.info(f"User {telegram_id} left bet contest {contest_id}.")
+        return True
+
+    def reload(self) -> None:
+        """Rebuilds the index from the db, e.g. after the table was changed by hand."""
+        memberships = self.db.get_contest_memberships()
+        members, contests = {}, {}
+        for contest_id, telegram_id in memberships:
+            members.setdefault(contest_id, set()).add(telegram_id)
+            contests.setdefault(telegram_id, set()).add(contest_id)
+        with self._lock:
+            self._members = members
+            self._contests = {telegram_id: frozenset(ids) for telegram_id, ids in contests.items()}
+            self._loaded = True
+        logging.info(f"Contest membership index loaded: {len(memberships)} memberships in "
+                     f"{len(self._members)} contests.")
+
+    def _add(self, contest_id: int, telegram_id: int) -> None:
+        # readers look the sets up without the lock, so a user's contest IDs are replaced, not changed in place
+        self._members.setdefault(contest_id, set()).add(telegram_id)
+        self._contests[telegram_id] = self._contests.get(telegram_id, frozenset()) | {contest_id}
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        with self._load_lock:
+            if not self._loaded:
+                self.reload()
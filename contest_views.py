@@ -0,0 +1,117 @@
+import dataclasses
+import itertools
+import logging
+import threading
+from dataclasses import dataclass, field
+
+import scoring
+import views
+from workers import WorkerPool
+
+
+@dataclass(frozen=True)
+class ContestSnapshot:
+    """Pre-rendered views of a bet contest built from a single version of its scored bets."""
+    version: int
+    table: list[str]
+    results: dict[int, list[str]] = field(default_factory=dict)  # round: rendered results
+    analytics: list[str] = field(default_factory=list)
+    user_stats: dict[int, str] = field(default_factory=dict)  # telegram ID: rendered stats
+
+    @property
+    def last_round(self) -> int | None:
+        return max(self.results) if self.results else None
+
+
+def render_contest(rows: list[dict]) -> ContestSnapshot:
+    """
+    Scores a bet contest and renders its views. Runs in a worker process, so takes and returns plain data only.
+    :param rows: Scored bets as returned by Database.get_contest_scored_bets().
+    :return: A snapshot of the rendered views, not versioned yet.
+    """
+    from analytics import ContestAnalytics  # numpy is only loaded where the views are rendered
+
+    rounds = {}
+    for row in rows:
+        rounds.setdefault(row['round'], []).append(row)
+    stats = ContestAnalytics(rows)
+    return ContestSnapshot(
+        version=0,
+        table=views.render_table(scoring.build_standings(rows)),
+        results={r: views.render_round_results(r, round_rows) for r, round_rows in rounds.items()},
+        analytics=views.render_analytics(stats.leaders('hit_rate'), stats.leaders('longest_streak'),
+                                         stats.match_consensus(), stats.consensus_accuracy()),
+        user_stats={s['telegram_id']: views.render_user_stats(s) for s in stats.all_user_stats()}
+    )
+
+
+class ContestViews:
+    """
+    Serves leaderboards and round results of bet contests from pre-rendered HTML.
+
+    All views of a contest are rendered at once from a single query and kept until self.refresh() is called for the
+    contest, i.e. until match scores affecting it change. Requests in between cost no db work at all.
+    """
+
+    def __init__(self, db, pool: WorkerPool | None = None):
+        """
+        :param db: Database instance.
+        :param pool: Worker pool rendering the views. Views are rendered in the calling thread if not given.
+        """
+        self.db = db
+        self.pool = pool or WorkerPool()
+        self._snapshots: dict[int, ContestSnapshot] = {}
+        self._versions = itertools.count(1)
+        self._locks: dict[int, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    def table(self, contest_id: int) -> list[str]:
+        """Returns rendered leaderboard of the contest."""
+        return self._snapshot(contest_id).table
+
+    def results(self, contest_id: int, round: int | None = None) -> list[str] | None:
+        """
+        Returns rendered results of a round of the contest.
+        :param contest_id: Bet contest ID.
+        :param round: Round number. The last round with results if not given.
+        :return: Message texts or None if the round has no results yet.
+        """
+        snapshot = self._snapshot(contest_id)
+        if round is None:
+            round = snapshot.last_round
+        return snapshot.results.get(round)
+
+    def analytics(self, contest_id: int) -> list[str]:
+        """Returns rendered betting analytics of the contest."""
+        return self._snapshot(contest_id).analytics
+
+    def user_stats(self, contest_id: int, telegram_id: int) -> str:
+        """Returns rendered betting statistics of the user in the contest."""
+        stats = self._snapshot(contest_id).user_stats.get(telegram_id)
+        return stats or views.render_user_stats(None)
+
+    def refresh(self, contest_id: int) -> None:
+        """Re-renders all views of the contest. Has to be called whenever scores of the contest's matches change."""
+        with self._lock(contest_id):
+            self._snapshots[contest_id] = self._render(contest_id)
+
+    def _snapshot(self, contest_id: int) -> ContestSnapshot:
+        snapshot = self._snapshots.get(contest_id)
+        if snapshot:
+            return snapshot
+        with self._lock(contest_id):
+            # a burst of identical requests renders the views once, the rest wait and reuse the result
+            snapshot = self._snapshots.get(contest_id)
+            if not snapshot:
+                snapshot = self._snapshots[contest_id] = self._render(contest_id)
+        return snapshot
+
+    def _lock(self, contest_id: int) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(contest_id, threading.Lock())
+
+    def _render(self, contest_id: int) -> ContestSnapshot:
+        snapshot = self.pool.run(render_contest, self.db.get_contest_scored_bets(contest_id))
+        snapshot = dataclasses.replace(snapshot, version=next(self._versions))
+        logging.info(f"Views of bet contest {contest_id} rendered, version {snapshot.version}.")
+        return snapshot
@@ -1,21 +1,32 @@
+from __future__ import annotations
+
 from pprint import pprint
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
 import inspect
+import hashlib
+import json
+from typing import TYPE_CHECKING
 
-from telebot.types import Message, BotCommand, BotCommandScopeDefault, BotCommandScopeChat
-
-from db import Database
-from bot import BetBot
-from scheduler import BotScheduler
-from stats_api import StatsAPIHandler
 from users import User
 from leagues import League
 from seasons import Season
 from bet_contests import BetContest
-from utils import init_logging
-
-init_logging()
+from contest_views import ContestViews
+from db import TransactionRolledBack  # mysql.connector is only loaded on the first connection
+from season_archive import SeasonArchiver
+import config
+import metrics
+import scoring
+import views
+from workers import WorkerPool
+
+if TYPE_CHECKING:  # telebot, mysql.connector, apscheduler and requests are imported by the app, not by the controller
+    from telebot.types import Message, BotCommand, BotCommandScopeDefault, BotCommandScopeChat
+    from db import Database
+    from bot import BetBot
+    from scheduler import BotScheduler
+    from stats_api import StatsAPIHandler
 
 
 class Controller:
@@ -25,27 +36,46 @@ class Controller:
             telegram_bot: BetBot,
             database: Database,
             scheduler: BotScheduler,
-            stats_api_handler: StatsAPIHandler
+            stats_api_handler: StatsAPIHandler,
+            worker_pool: WorkerPool | None = None
     ):
         self.bot: BetBot = telegram_bot
         self.db: Database = database
         self.sah: StatsAPIHandler = stats_api_handler
         self.scheduler: BotScheduler = scheduler
+        self.worker_pool = worker_pool or WorkerPool()
+        self.views = ContestViews(database, self.worker_pool)
+        self.archiver = SeasonArchiver(database, self.worker_pool)
 
         self._command_dict = {
             'start': {'desc': 'Запуск бота', 'handler': self._handle_start, 'admin': False},
             'help': {'desc': 'Вывод всех поддерживаемых ботом команд', 'handler': self._handle_help, 'admin': False},
+            'table': {'desc': 'Турнирная таблица', 'handler': self._handle_table, 'admin': False},
+            'results': {'desc': 'Результаты тура (например, /results 5)', 'handler': self._handle_results,
+                        'admin': False},
+            'my_stats': {'desc': 'Ваша статистика ставок', 'handler': self._handle_my_stats, 'admin': False},
+            'analytics': {'desc': 'Аналитика ставок соревнования', 'handler': self._handle_analytics, 'admin': True},
+            'season_table': {'desc': 'Итоговая таблица завершённого сезона (например, /season_table 1)',
+                             'handler': self._handle_season_table, 'admin': False},
+            'archive_seasons': {'desc': 'Перенос завершённых сезонов в архив (или одного сезона: /archive_seasons 1)',
+                                'handler': self._handle_archive_seasons, 'admin': True},
+            'restore_season': {'desc': 'Восстановление сезона из архива (например, /restore_season 1)',
+                               'handler': self._handle_restore_season, 'admin': True},
+            'stats': {'desc': 'Статистика производительности бота', 'handler': self._handle_stats, 'admin': True},
             'create_contest': {'desc': 'Создание соревнования по ставкам', 'handler': self._handle_create_contest,
                                'admin': True},
+            'add_member': {'desc': 'Добавление участника соревнования (например, /add_member 123456789)',
+                           'handler': self._handle_add_member, 'admin': True},
+            'remove_member': {'desc': 'Исключение участника соревнования (например, /remove_member 123456789)',
+                              'handler': self._handle_remove_member, 'admin': True},
         }
         self.users: list[User] | None = None
         self.admin: User | None = None
+        self._scope_commands: dict[str, list[BotCommand]] = {}
 
         self.bot.set_command_handler(self)
-        self.bot.register_callback_query_handler(func=lambda query: query.data == "bon_appetit",
-                                                 callback=self.handle_bon_appetit)
-        self.bot.register_callback_query_handler(func=lambda query: query.data == "work_over",
-                                                 callback=self.handle_work_over)
+        self.bot.callbacks.register('bon_appetit', self.handle_bon_appetit)
+        self.bot.callbacks.register('work_over', self.handle_work_over)
 
         self._set_users_field()
         self._set_admin_field()
@@ -53,7 +83,14 @@ class Controller:
         self._set_available_bot_commands()
 
     def _set_available_bot_commands(self) -> None:
-        """Sets all available commands for telegram bot."""
+        """
+        Sets all available commands for telegram bot.
+
+        Regular users get their commands from the default scope and the admin from their own chat scope, so the
+        number of scopes doesn't depend on the number of users. A hash of each scope's command set is stored in
+        the db and only the scopes whose command set has changed since the last start are pushed to telegram.
+        """
+        from telebot.types import BotCommand
 
         admin_commands = [
             BotCommand(command=c, description=self._command_dict.get(c).get('desc'))
@@ -64,19 +101,53 @@ class Controller:
             for c in self._command_dict if not self._command_dict.get(c).get('admin')
         ]
 
-        self._delete_available_bot_commands()
-        for user in self.users:
-            self.bot.set_my_commands(avg_user_commands, scope=BotCommandScopeChat(user.telegram_id))
-        self.bot.set_my_commands(admin_commands, scope=BotCommandScopeChat(self.admin.telegram_id))
+        self._scope_commands = {'default': avg_user_commands}
+        if self.admin:
+            self._scope_commands[f'chat:{self.admin.telegram_id}'] = admin_commands
+
+        stored_hashes = self.db.get_command_scope_hashes()
+        if not stored_hashes:
+            # Commands used to be set for every user's chat separately. Those scopes would shadow the default one.
+            self._delete_available_bot_commands()
+
+        for scope_key, commands in self._scope_commands.items():
+            commands_hash = Controller._hash_commands(commands)
+            if stored_hashes.get(scope_key) == commands_hash:
+                continue
+            self.bot.set_my_commands(commands, scope=Controller._scope_from_key(scope_key))
+            self.db.set_command_scope_hash(scope_key, commands_hash)
+            logging.info(f"Bot commands for scope '{scope_key}' updated.")
+
+        for scope_key in set(stored_hashes) - set(self._scope_commands):
+            self.bot.delete_my_commands(scope=Controller._scope_from_key(scope_key))
+            self.db.delete_command_scope_hash(scope_key)
+            logging.info(f"Bot commands for scope '{scope_key}' deleted.")
+
+    @staticmethod
+    def _hash_commands(commands: list[BotCommand]) -> str:
+        """Returns a stable hash of a command set to detect whether it has to be pushed to telegram again."""
+        serialized = json.dumps([(c.command, c.description) for c in commands], ensure_ascii=False)
+        return hashlib.sha256(serialized.encode('UTF-8')).hexdigest()
+
+    @staticmethod
+    def _scope_from_key(scope_key: str) -> BotCommandScopeDefault | BotCommandScopeChat:
+        """Converts a stored scope key ('default' or 'chat:<telegram_id>') into a telegram command scope."""
+        from telebot.types import BotCommandScopeDefault, BotCommandScopeChat
+
+        if scope_key == 'default':
+            return BotCommandScopeDefault()
+        return BotCommandScopeChat(int(scope_key.split(':')[1]))
 
     def _delete_available_bot_commands(self):
         """Erases all available commands for telegram bot."""
-        for user in self.users:
+        from telebot.types import BotCommandScopeChat
+
+        for user in self.users or []:
             self.bot.delete_my_commands(scope=BotCommandScopeChat(user.telegram_id))
 
     def handle_command(self, message: Message) -> None:
         """Handles commands sent via the telegram bot."""
-        command = message.text[1:]  # cut off / symbol
+        command = Controller._parse_command(message.text)[0]
 
         if command not in self._command_dict:
             self.bot.reply_to(message=message, text="<b>Ой!</b>\n\n"
@@ -85,7 +156,7 @@ class Controller:
             return
 
         command_is_for_admins = self._command_dict.get(command).get('admin')
-        user = self._get_user(message.from_user.id)
+        user = self._get_user(message)
 
         if command_is_for_admins and not user.is_admin:
             self.bot.reply_to(message=message, text="<b>Ой!</b>\n\n"
@@ -95,16 +166,219 @@ class Controller:
 
         handler = self._command_dict.get(command).get('handler')
         if handler:
-            handler(message)
+            with metrics.HANDLER_LATENCY.time(handler=f'/{command}'):
+                handler(message)
         else:
             self.bot.reply_to(message=message, text=f"<b>Ой!</b>\n\n "
                                                     f"К сожалению, команда /{command} пока не поддерживается 😪")
 
+    @staticmethod
+    def _parse_command(text: str) -> tuple[str, list[str]]:
+        """
+        Splits a command message into the command and its arguments, e.g. '/results@MyBot 5' -> ('results', ['5']).
+        """
+        command, *args = text[1:].split() or ['']  # cut off / symbol
+        return command.split('@')[0], args
+
+    def _handle_table(self, message: Message) -> None:
+        """A handler func for the '/table' telegram bot command."""
+        contest_id = self._get_user_contest_id(message)
+        if contest_id is None:
+            return
+        for text in self.views.table(contest_id):
+            self.bot.send_message(message.chat.id, text=text)
+
+    def _handle_results(self, message: Message) -> None:
+        """A handler func for the '/results [round]' telegram bot command."""
+        contest_id = self._get_user_contest_id(message)
+        if contest_id is None:
+            return
+
+        args = Controller._parse_command(message.text)[1]
+        if args and not args[0].isdigit():
+            self.bot.reply_to(message, "<b>Ой!</b>\n\nНомер тура должен быть числом, например: /results 5")
+            return
+        round = int(args[0]) if args else None
+
+        texts = self.views.results(contest_id, round)
+        if not texts:
+            self.bot.reply_to(message, "Результатов этого тура пока нет.")
+            return
+        for text in texts:
+            self.bot.send_message(message.chat.id, text=text)
+
+    def _handle_my_stats(self, message: Message) -> None:
+        """A handler func for the '/my_stats' telegram bot command."""
+        contest_id = self._get_user_contest_id(message)
+        if contest_id is None:
+            return
+        self.bot.send_message(message.chat.id, text=self.views.user_stats(contest_id, message.from_user.id))
+
+    def _handle_analytics(self, message: Message) -> None:
+        """A handler func for the '/analytics' telegram bot command."""
+        contest_id = self._get_user_contest_id(message)
+        if contest_id is None:
+            return
+        for text in self.views.analytics(contest_id):
+            self.bot.send_message(message.chat.id, text=text)
+
+    def _handle_season_table(self, message: Message) -> None:
+        """A handler func for the '/season_table <season_id>' telegram bot command."""
+        season_id = self._parse_season_id(message)
+        if season_id is None:
+            return
+        standings = self.archiver.standings(season_id)
+        if not standings:
+            self.bot.reply_to(message, f"Итоговой таблицы сезона {season_id} нет: сезон не завершён или не найден.")
+            return
+        for text in views.render_table(standings):
+            self.bot.send_message(message.chat.id, text=text)
+
+    def _handle_archive_seasons(self, message: Message) -> None:
+        """
+        A handler func for the '/archive_seasons [season_id]' telegram bot command. Without a season ID archives all
+        finished seasons except restored ones, with it archives the given season, restored or not.
+        """
+        if Controller._parse_command(message.text)[1]:
+            season_id = self._parse_season_id(message)
+            if season_id is None:
+                return
+            archive = self.db.get_season_archive(season_id)
+            if archive and not archive['restored_at']:
+                self.bot.reply_to(message, f"Сезон {season_id} уже в архиве.")
+                return
+            self.archiver.archive(season_id)
+            self._refresh_season_views(season_id)
+            self.bot.reply_to(message, f"Сезон {season_id} перенесён в архив.")
+            return
+        archived = self.archive_finished_seasons()
+        if archived:
+            self.bot.reply_to(message, f"Сезоны перенесены в архив: {', '.join(str(s) for s in archived)}.")
+        else:
+            self.bot.reply_to(message, "Завершённых сезонов для переноса в архив нет.")
+
+    def _handle_restore_season(self, message: Message) -> None:
+        """A handler func for the '/restore_season <season_id>' telegram bot command."""
+        season_id = self._parse_season_id(message)
+        if season_id is None:
+            return
+        if not self.archiver.restore(season_id):
+            self.bot.reply_to(message, f"Сезона {season_id} нет в архиве.")
+            return
+        self._refresh_season_views(season_id)
+        self.bot.reply_to(message, f"Сезон {season_id} восстановлен из архива. Автоматически в архив он больше "
+                                   f"не попадёт, вернуть его туда можно командой /archive_seasons {season_id}")
+
+    def _parse_season_id(self, message: Message) -> int | None:
+        """Parses a season ID from a command. If there is none, replies with an explanatory message and returns None."""
+        args = Controller._parse_command(message.text)[1]
+        if not args or not args[0].isdigit():
+            self.bot.reply_to(message, f"<b>Ой!</b>\n\nУкажите номер сезона, например: {message.text.split()[0]} 1")
+            return None
+        return int(args[0])
+
+    def archive_finished_seasons(self) -> list[int]:
+        """
+        Moves finished seasons' matches and bets out of the hot tables. Run daily by the scheduler.
+        :return: IDs of archived seasons.
+        """
+        archived = self.archiver.archive_finished()
+        for season_id in archived:
+            self._refresh_season_views(season_id)
+        if archived:
+            self.bot.notify_admin(f"Сезоны перенесены в архив: {', '.join(str(s) for s in archived)}.")
+        return archived
+
+    def _refresh_season_views(self, season_id: int) -> None:
+        for contest_id in self.db.get_bet_contest_ids_by_season(season_id):
+            self.views.refresh(contest_id)
+
+    def _get_user_contest_id(self, message: Message) -> int | None:
+        """
+        Returns ID of the latest bet contest the sender participates in. If there is none, replies with an explanatory
+        message and returns None.
+        """
+        contest_ids = self.bot.get_context(message).contest_ids
+        if not contest_ids:
+            self.bot.reply_to(message, "Вы пока не участвуете ни в одном соревновании по ставкам.")
+            return None
+        return max(contest_ids)
+
+    def _handle_stats(self, message: Message) -> None:
+        """A handler func for the '/stats' telegram bot command."""
+        for text in views.split_message(metrics.render_summary().split('\n'), separator='\n'):
+            self.bot.send_message(message.chat.id, text=text)
+
+    def _handle_add_member(self, message: Message) -> None:
+        """A handler func for the '/add_member <telegram_id>' telegram bot command."""
+        contest_id, telegram_id = self._parse_member_command(message)
+        if telegram_id is None:
+            return
+        if self.bot.membership.join(contest_id, telegram_id):
+            self.bot.reply_to(message, f"Пользователь {telegram_id} добавлен в соревнование.")
+        else:
+            self.bot.reply_to(message, f"Пользователь {telegram_id} не найден или уже участвует в соревновании.")
+
+    def _handle_remove_member(self, message: Message) -> None:
+        """A handler func for the '/remove_member <telegram_id>' telegram bot command."""
+        contest_id, telegram_id = self._parse_member_command(message)
+        if telegram_id is None:
+            return
+        if self.bot.membership.leave(contest_id, telegram_id):
+            self.bot.reply_to(message, f"Пользователь {telegram_id} исключён из соревнования.")
+        else:
+            self.bot.reply_to(message, f"Пользователь {telegram_id} не участвует в соревновании.")
+
+    def _parse_member_command(self, message: Message) -> tuple[int | None, int | None]:
+        """
+        Parses a telegram ID from a membership command. The admin's latest bet contest is the one being changed.
+        If the command is invalid, replies with an explanatory message and returns (None, None).
+        """
+        args = Controller._parse_command(message.text)[1]
+        if not args or not args[0].isdigit():
+            self.bot.reply_to(message, "<b>Ой!</b>\n\nУкажите telegram ID пользователя, например: "
+                                       "/add_member 123456789")
+            return None, None
+        contest_id = self._get_user_contest_id(message)
+        if contest_id is None:
+            return None, None
+        return contest_id, int(args[0])
+
+    def sync_match_results(self) -> None:
+        """
+        Fetches final scores of the matches that have recently kicked off but have no score yet and stores them. Run
+        periodically by the scheduler. Stops once the stats API's daily quota runs low.
+        """
+        now = datetime.now()
+        since = now - timedelta(hours=config.RESULTS_SYNC_LOOKBACK_HOURS)
+        for season in self.db.get_seasons_awaiting_scores(since=since, before=now):
+            if self.sah.quota_remaining is not None and self.sah.quota_remaining <= config.RESULTS_SYNC_MIN_QUOTA:
+                logging.warning(f"Match results sync stopped, {self.sah.quota_remaining} stats API requests left.")
+                return
+            scores = self.sah.get_finished_match_scores(season['league_api_id'], season['year'])
+            if scores:
+                self.update_match_scores(season['league_api_id'], scores)
+
+    def update_match_scores(self, league_api_id: int, scores: dict[int, str]) -> None:
+        """
+        Stores final scores of the league's matches and re-renders leaderboards and results of the affected contests.
+        Only the scores that differ from the stored ones are written, and nothing is re-rendered if there are none.
+        :param league_api_id: API ID of the league the matches belong to.
+        :param scores: A dict of match_api_id: score pairs, e.g. {1052: '2-1'}.
+        """
+        changed = scoring.diff_scores(self.db.get_match_scores(league_api_id), scores)
+        if not changed:
+            return
+        for match_api_id, score in changed.items():
+            self.db.update_match_score(match_api_id, score, status_short='FT', status_long='Match Finished')
+        for contest_id in self.db.get_bet_contest_ids_by_league(league_api_id):
+            self.views.refresh(contest_id)
+
     def _handle_create_contest(self, message):
         """A handler func for the '/create_contest' telegram bot command."""
         logging.info(f"Handling '/create_contest' command...")
         country, league_name = 'Russia', 'Premier League'
-        admin = self.db.get_user(message.from_user.id)
+        admin = self._get_user(message)
 
         stored_league = self._get_league(country, league_name)
         if not stored_league:
@@ -157,9 +431,19 @@ class Controller:
 
     def _create_bet_contest(self, season: Season | None, admin: User) -> BetContest | None:
         self.bot.notify_admin("Создание соревнования по ставкам...")
+        if not season:
+            self.bot.notify_admin("<b>Соревнование не создано:</b> не удалось получить данные сезона.")
+            return None
         bc = BetContest(season, [admin])
-        bc_id = self._insert_bet_contest(bc)
-        bc = self._get_bet_contest(bc_id)
+        try:
+            with self.db.transaction():
+                bc_id = self._insert_bet_contest(bc)
+                bc = self._get_bet_contest(bc_id)
+        except TransactionRolledBack as e:
+            logging.error(f"Bet contest creation failed: {repr(e)}")
+            self.bot.notify_admin("<b>Соревнование не создано:</b> ошибка при сохранении в базу данных.")
+            return None
+        self.bot.membership.join(bc_id, admin.telegram_id)
         logging.info(f'New contest created: '
                      f'{bc.season.league.league_country}, {bc.season.league.league_name}, '
                      f'season {bc.season.year}-{bc.season.end_year}.')
@@ -233,9 +517,15 @@ class Controller:
         season = self._fetch_season(country, league)
         if not season:
             return
-        self._insert_league(season.league)
-        self._insert_season(season)
-        season = self._get_season(season.league.api_id)
+        try:
+            with self.db.transaction():
+                self._insert_league(season.league)
+                self._insert_season(season)
+                season = self._get_season(season.league.api_id)
+        except TransactionRolledBack as e:
+            logging.error(f"Season creation failed: {repr(e)}")
+            self.bot.notify_admin("<b>Сезон не сохранён:</b> ошибка при сохранении в базу данных.")
+            return None
         return season
 
     def _league_stored(self, league_api_id: int) -> bool:
@@ -254,14 +544,14 @@ class Controller:
 
     def _handle_help(self, message: Message) -> None:
         """A handler func for the '/help' telegram bot command."""
-        user = self._get_user(message.from_user.id)
+        user = self._get_user(message)
 
         if user.is_admin:
-            scope = BotCommandScopeChat(user.telegram_id)
+            scope_key = f'chat:{user.telegram_id}'
         else:
-            scope = BotCommandScopeDefault()
+            scope_key = 'default'
 
-        commands = [c for c in self.bot.get_my_commands(scope=scope)]
+        commands = self._scope_commands.get(scope_key, self._scope_commands.get('default', []))
         comms_n_descs = [f"/{c.command} - {c.description}" for c in commands]
         comms_n_descs = f'\n\n'.join(comms_n_descs)
         self.bot.reply_to(message, f"Список поддерживаемых ботом команд:\n\n"
@@ -286,10 +576,9 @@ class Controller:
         registers the user.
         :param message: The incoming message object from a user via telegram bot.
         """
-        telegram_id = message.from_user.id
-        new_user = self.db.user_registered(telegram_id)
-        if not new_user:
-            self.db.register_user(telegram_id)
+        user = self._get_user(message)
+        if not user.used_bot:
+            self.db.register_user(user.telegram_id)
 
     def _set_users_field(self) -> None:
         """Fetches and updates the self.users field with a list of registered users from the database."""
@@ -304,5 +593,6 @@ class Controller:
         print("_suggest_bet_contest run. Method hasn't been implemented yet")
         pass
 
-    def _get_user(self, tg_id):
-        return self.db.get_user(tg_id)
+    def _get_user(self, message: Message) -> User | None:
+        """Returns the sender of the message resolved once per update and shared with the bot's filters."""
+        return self.bot.get_context(message).user
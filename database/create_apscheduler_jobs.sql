@@ -0,0 +1,6 @@
+CREATE TABLE `apscheduler_jobs` (
+    `id`    VARCHAR(191) PRIMARY KEY,
+    `next_run_time`    DOUBLE DEFAULT NULL,
+    `job_state`    BLOB NOT NULL,
+    INDEX (`next_run_time`)
+);
\ No newline at end of file
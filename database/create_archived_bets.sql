@@ -0,0 +1,9 @@
+CREATE TABLE `archived_bets` (
+    `id`    INTEGER PRIMARY KEY,
+    `season_id`    INTEGER NOT NULL,
+    `match_id`    MEDIUMINT NOT NULL,
+    `user_id`    INTEGER NOT NULL,
+    `bet` TINYTEXT NOT NULL,
+    `created_at`    TIMESTAMP NULL DEFAULT NULL,
+    INDEX (`season_id`)
+);
\ No newline at end of file
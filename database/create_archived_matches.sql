@@ -0,0 +1,13 @@
+CREATE TABLE `archived_matches` (
+    `api_id`    MEDIUMINT PRIMARY KEY,
+    `season_id`    INTEGER NOT NULL,
+    `league_api_id`  INTEGER NOT NULL,
+    `start_datetime`    TIMESTAMP,
+    `round`    TINYINT,
+    `home_team_id` SMALLINT NOT NULL,
+    `away_team_id` SMALLINT NOT NULL,
+    `score`    TINYTEXT DEFAULT NULL,
+    `status_long`    TINYTEXT DEFAULT NULL,
+    `status_short`    TINYTEXT DEFAULT NULL,
+    INDEX (`season_id`)
+);
\ No newline at end of file
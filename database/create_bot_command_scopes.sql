@@ -0,0 +1,6 @@
+CREATE TABLE `bot_command_scopes` (
+    `scope`    VARCHAR(64) PRIMARY KEY,
+    `commands_hash`    CHAR(64) NOT NULL,
+    `created_at`    TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    `last_updated_at`  TIMESTAMP DEFAULT NULL ON UPDATE CURRENT_TIMESTAMP
+);
\ No newline at end of file
@@ -0,0 +1,8 @@
+CREATE TABLE `season_archives` (
+    `season_id`    INTEGER PRIMARY KEY,
+    `matches`    MEDIUMINT NOT NULL,
+    `bets`    INTEGER NOT NULL,
+    `archived_at`    TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    `restored_at`    TIMESTAMP DEFAULT NULL,
+    FOREIGN KEY (`season_id`) REFERENCES seasons (`id`)
+);
\ No newline at end of file
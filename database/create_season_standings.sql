@@ -0,0 +1,12 @@
+CREATE TABLE `season_standings` (
+    `season_id`    INTEGER NOT NULL,
+    `bet_contest_id`    SMALLINT NOT NULL,
+    `telegram_id`   BIGINT NOT NULL,
+    `position`    SMALLINT NOT NULL,
+    `points`    SMALLINT NOT NULL,
+    `exact`    SMALLINT NOT NULL,
+    `bets`    SMALLINT NOT NULL,
+    PRIMARY KEY (`bet_contest_id`, `telegram_id`),
+    INDEX (`season_id`),
+    FOREIGN KEY (`bet_contest_id`) REFERENCES bet_contests (`id`)
+);
\ No newline at end of file
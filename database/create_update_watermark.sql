@@ -0,0 +1,5 @@
+CREATE TABLE `update_watermark` (
+    `id`    TINYINT PRIMARY KEY,
+    `last_update_id`    BIGINT NOT NULL,
+    `saved_at`  TIMESTAMP NOT NULL
+);
\ No newline at end of file
@@ -1,28 +1,79 @@
+from __future__ import annotations
+
 import logging
+import threading
 import time
+from datetime import datetime
 from os import path
 from pprint import pprint
 
-import mysql.connector
-from utils import get_from_env, init_logging
-from users import User
+import config
+import metrics
+import query_profiler
+from settings import get_settings
+from utils import init_logging, lazy_import
+import row_mappers
+from users import User, USER_COLUMNS
 from leagues import League
 from seasons import Season
 from bet_contests import BetContest
 
-DB_HOST = str(get_from_env("MYSQL_DB_HOST"))
-DB_LOGIN = str(get_from_env("MYSQL_DB_USERNAME"))
-DB_PASSWORD = str(get_from_env("MYSQL_DB_PASSWORD"))
-ENV_TYPE = str(get_from_env("ENV_TYPE"))
-DB_NAME = 'local_BetBotDB' if ENV_TYPE == 'development' else str(get_from_env("MYSQL_DB_NAME"))
-DB_PORT = 3306 if ENV_TYPE == 'development' else str(get_from_env("MYSQL_DB_PORT"))
+mysql_connector = lazy_import('mysql.connector')  # loaded on the first connection, the embedded db never loads it
+
+DB_HOST = str(get_settings().mysql_host)
+DB_LOGIN = str(get_settings().mysql_username)
+DB_PASSWORD = str(get_settings().mysql_password)
+ENV_TYPE = str(get_settings().env_type)
+DB_NAME = 'local_BetBotDB' if ENV_TYPE == 'development' else str(get_settings().mysql_db_name)
+DB_PORT = 3306 if ENV_TYPE == 'development' else str(get_settings().mysql_port)
+
+
+class _InstrumentedCursor:
+    """Proxies a db cursor counting executed queries. Slow and repeated queries are detected if profiling is on."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, operation: str, params=()):
+        metrics.DB_QUERIES.inc(kind=operation.lstrip().split(None, 1)[0].upper())
+        if query_profiler.ENABLED:
+            return query_profiler.execute(self._cursor, operation, params)
+        return self._cursor.execute(operation, params)
 
-init_logging()
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
 
 
+class TransactionRolledBack(Exception):
+    """Raised when a transaction is rolled back because an error inside it was caught and not re-raised."""
+
+
+@metrics.instrument_methods(metrics.DB_METHOD_LATENCY)
 class Database:
     MAX_RETRIES = 3
     RETRY_DELAY = 2
+    ITER_BATCH_SIZE = 1000  # rows fetched at once by iter_* methods
+    # matches aren't linked to seasons, a match belongs to the season of its league it kicks off within
+    _MATCH_SEASON_JOIN = 'JOIN seasons s ON s.league_api_id = m.league_api_id ' \
+                         'AND DATE(m.start_datetime) BETWEEN s.start_date AND s.end_date'
+    _CONTEST_SCORED_BETS_QUERY = (
+        'SELECT m.api_id AS match_id, m.round, m.start_datetime, m.score, '
+        'th.name AS home_team, th.name_ru AS home_team_ru, ta.name AS away_team, ta.name_ru AS away_team_ru, '
+        'u.telegram_id, u.first_name, u.last_name, b.bet '
+        'FROM bet_contests bc '
+        'JOIN seasons s ON s.id = bc.season_id '
+        'JOIN matches m ON m.league_api_id = s.league_api_id '
+        'AND DATE(m.start_datetime) BETWEEN s.start_date AND s.end_date '
+        'JOIN bets b ON b.match_id = m.api_id '
+        'JOIN bet_contest_users bcu ON bcu.bet_contest_id = bc.id AND bcu.user_id = b.user_id '
+        'JOIN users u ON u.id = b.user_id '
+        'JOIN teams th ON th.api_id = m.home_team_id '
+        'JOIN teams ta ON ta.api_id = m.away_team_id '
+        'WHERE bc.id = %s AND m.score IS NOT NULL '
+        'ORDER BY m.round, m.start_datetime, m.api_id, u.id'
+    )
+    # users are selected by explicit columns to be mapped to User objects straight from row tuples
+    _USER_SELECT = f"SELECT {', '.join(f'u.{c}' for c in USER_COLUMNS)} FROM users u"
 
     def __init__(self):
         self._name = DB_NAME
@@ -36,30 +87,79 @@ class Database:
             'bet_contests': {'create': 'create_bet_contests.sql'},
             'matches': {'create': 'create_matches.sql'},
             'bets': {'create': 'create_bets.sql'},
-            'bet_contest_users': {'create': 'create_bet_contest_users.sql'}
+            'bet_contest_users': {'create': 'create_bet_contest_users.sql',
+                                  'populate': self._populate_bet_contest_users},
+            'bot_command_scopes': {'create': 'create_bot_command_scopes.sql'},
+            'apscheduler_jobs': {'create': 'create_apscheduler_jobs.sql'},
+            'archived_matches': {'create': 'create_archived_matches.sql'},
+            'archived_bets': {'create': 'create_archived_bets.sql'},
+            'season_standings': {'create': 'create_season_standings.sql'},
+            'season_archives': {'create': 'create_season_archives.sql'},
+            'update_watermark': {'create': 'create_update_watermark.sql'}
         }
         self._creation_order = ('api_requests', 'users', 'teams', 'leagues', 'seasons', 'bet_contests', 'matches',
-                                'bets')
-        self.conn = None
-        self.cur = None
-        self._conn_attempt = 0
+                                'bets', 'bet_contest_users', 'bot_command_scopes', 'apscheduler_jobs',
+                                'archived_matches', 'archived_bets', 'season_standings', 'season_archives',
+                                'update_watermark')
+        # Updates are handled concurrently, so every thread gets its own connection and cursor
+        self._local = threading.local()
 
         self._ensure_db_exists()
         logging.info(f"Database initialized.")
 
-    def _try_connect(self) -> mysql.connector.connection.MySQLConnectionAbstract | None:
+    @property
+    def conn(self) -> mysql_connector.connection.MySQLConnectionAbstract | None:
+        return getattr(self._local, 'conn', None)
+
+    @conn.setter
+    def conn(self, value: mysql_connector.connection.MySQLConnectionAbstract | None) -> None:
+        self._local.conn = value
+
+    @property
+    def cur(self) -> mysql_connector.cursor.MySQLCursorAbstract | None:
+        return getattr(self._local, 'cur', None)
+
+    @cur.setter
+    def cur(self, value: mysql_connector.cursor.MySQLCursorAbstract | None) -> None:
+        self._local.cur = value
+
+    @property
+    def _tx_depth(self) -> int:
+        return getattr(self._local, 'tx_depth', 0)
+
+    @_tx_depth.setter
+    def _tx_depth(self, value: int) -> None:
+        self._local.tx_depth = value
+
+    @property
+    def _rollback_only(self) -> bool:
+        return getattr(self._local, 'rollback_only', False)
+
+    @_rollback_only.setter
+    def _rollback_only(self, value: bool) -> None:
+        self._local.rollback_only = value
+
+    @property
+    def _conn_attempt(self) -> int:
+        return getattr(self._local, 'conn_attempt', 0)
+
+    @_conn_attempt.setter
+    def _conn_attempt(self, value: int) -> None:
+        self._local.conn_attempt = value
+
+    def _try_connect(self) -> mysql_connector.connection.MySQLConnectionAbstract | None:
 
         conn_args = {'host': DB_HOST, 'user': DB_LOGIN, 'password': DB_PASSWORD, 'port': DB_PORT}
         if self._exists:
             conn_args['database'] = self._name
 
         try:
-            self.conn = mysql.connector.connect(**conn_args, connection_timeout=10)
+            self.conn = mysql_connector.connect(**conn_args, connection_timeout=10)
             if self._conn_attempt != 0:
                 logging.info(f"Connection retry successful.")
             self._conn_attempt = 0
             return self.conn
-        except mysql.connector.errors.Error as e:
+        except mysql_connector.errors.Error as e:
             logging.exception(f"Database error: {e.msg}")
             if Database._error_retriable(e):
                 self._retry_connection()
@@ -72,8 +172,50 @@ class Database:
         self.conn = None
         return
 
+    def _connect_detached(self) -> mysql_connector.connection.MySQLConnectionAbstract | None:
+        """Opens a connection that isn't bound to the thread, so it can stay open across `with self:` blocks."""
+        thread_conn = self.conn
+        try:
+            return self._try_connect()
+        finally:
+            self.conn = thread_conn
+
+    def _iter_query(self, query: str, params: tuple = (), as_tuples: bool = False, batch_size: int | None = None):
+        """
+        Streams the query's rows through an unbuffered cursor of a separate connection, batch_size rows at a time, so
+        memory use doesn't depend on the size of the result. Other Database methods can be called while iterating.
+        :param query: A SELECT query.
+        :param params: Query parameters.
+        :param as_tuples: Yield tuples in the order of the selected columns instead of dicts.
+        :param batch_size: Number of rows fetched at once. Database.ITER_BATCH_SIZE if not given.
+        """
+        conn = self._connect_detached()
+        if not conn:
+            return
+        cur = _InstrumentedCursor(conn.cursor(buffered=False, dictionary=not as_tuples))
+        exhausted = False
+        try:
+            cur.execute(query, params)
+            while rows := cur.fetchmany(batch_size or self.ITER_BATCH_SIZE):
+                yield from rows
+            exhausted = True
+        finally:
+            if exhausted:  # closing an unbuffered cursor with unread rows fails, closing the connection drops them
+                cur.close()
+            conn.close()
+
+    def _fetch_rows(self, query: str, params: tuple = ()) -> list[tuple]:
+        """Executes the query and returns its rows as tuples, which are cheaper to build than dicts."""
+        with self:
+            cur = _InstrumentedCursor(self.conn.cursor(buffered=True))
+            try:
+                cur.execute(query, params)
+                return cur.fetchall()
+            finally:
+                cur.close()
+
     @staticmethod
-    def _error_retriable(e: mysql.connector.errors.Error) -> bool:
+    def _error_retriable(e: mysql_connector.errors.Error) -> bool:
         """Defines if a connection led to an error worth being retried."""
         # Considered err_codes:
         # 1045: Access denied for user 'user_name'@'host_name' (using password: YES) (wrong username or password)
@@ -96,21 +238,51 @@ class Database:
         else:
             logging.error(f"Exceeded maximum connect retry attempts. Unable to connect to database.")
 
+    def transaction(self) -> Database:
+        """
+        Returns the db as a context manager running everything inside it in one transaction on one connection:
+            with db.transaction():
+                contest_id = db.insert_bet_contest(...)
+                contest = db.get_bet_contest_by_id(contest_id)
+        Database methods called inside join the transaction instead of connecting and committing on their own. It is
+        committed when the outermost block exits and rolled back if any block inside it fails, even if the error was
+        caught, in which case TransactionRolledBack is raised. iter_* methods read through separate connections and
+        don't see uncommitted changes.
+        """
+        return self
+
     def __enter__(self):
+        if self._tx_depth:
+            self._tx_depth += 1
+            return self
         self.conn = self._try_connect()
         if self.conn:
-            self.cur = self.conn.cursor(buffered=True, dictionary=True)
+            self.cur = _InstrumentedCursor(self.conn.cursor(buffered=True, dictionary=True))
+            self._tx_depth = 1
+            self._rollback_only = False
         return self
 
     def __exit__(self, ext_type, exc_value, traceback):
-        if not self.conn:
+        if not self._tx_depth:
             return
-        self.cur.close()
+        self._tx_depth -= 1
         if isinstance(exc_value, Exception):
-            self.conn.rollback()
-        else:
-            self.conn.commit()
-        self.conn.close()
+            self._rollback_only = True
+        if self._tx_depth:
+            return
+        rolled_back = self._rollback_only
+        try:
+            self.cur.close()
+            if rolled_back:
+                self.conn.rollback()
+            else:
+                self.conn.commit()
+        finally:
+            self.conn.close()
+            self.conn = None
+            self.cur = None
+        if rolled_back and exc_value is None:
+            raise TransactionRolledBack('An error occurred inside the transaction, all its changes were rolled back.')
 
     def _db_exists(self) -> bool:
         """Shows if a db is already stored on server"""
@@ -242,11 +414,11 @@ class Database:
     def _populate_users(self):
         """Populates 'users' table with initial data."""
         admin_data = {
-            'telegram_id': int(get_from_env('ADMIN_ID')),
+            'telegram_id': get_settings().admin_id,
             'is_admin': True
         }
         test_user_data = {
-            'telegram_id': int(get_from_env('TEST_ACCOUNT_ID')),
+            'telegram_id': get_settings().test_account_id,
             'first_name': 'test',
             'last_name': 'account'
         }
@@ -258,6 +430,10 @@ class Database:
             self.cur.execute(admin_q, tuple(admin_data.values()))
             #self.cur.execute(test_q, tuple(test_user_data.values()))
 
+    def _populate_bet_contest_users(self):
+        """Populates 'bet_contest_users' table with users stored before contests got participants."""
+        self.backfill_contest_users()
+
     def _populate_api_requests(self):
         """Populates 'api_requests' table with initial data."""
         data = {'requests_today': 0, 'daily_quota': 100}
@@ -266,31 +442,27 @@ class Database:
             self.cur.execute(query, tuple(data.values()))
 
     def get_users(self) -> list[User] | None:
-        query = 'SELECT * FROM users WHERE used_bot = 1'
-        with self:
-            self.cur.execute(query)
-            res = self.cur.fetchall()
+        query = f'{Database._USER_SELECT} WHERE u.used_bot = 1'
+        res = self._fetch_rows(query)
         if res:
-            res = [User.from_dict(d) for d in res]
+            res = row_mappers.load_rows(User, USER_COLUMNS, res)
         return res
 
+    def iter_users(self):
+        """Streams all users who have used the bot as User objects."""
+        load = row_mappers.row_loader(User, USER_COLUMNS)
+        for row in self._iter_query(f'{Database._USER_SELECT} WHERE u.used_bot = 1', as_tuples=True):
+            yield load(row)
+
     def get_user(self, telegram_id: int) -> User | None:
-        query = f'SELECT * FROM users WHERE telegram_id = {telegram_id}'
-        with self:
-            self.cur.execute(query)
-            res = self.cur.fetchone()
-        if res:
-            res = User.from_dict(res)
-        return res
+        query = f'{Database._USER_SELECT} WHERE u.telegram_id = %s'
+        res = self._fetch_rows(query, (telegram_id,))
+        return User.from_row(USER_COLUMNS, res[0]) if res else None
 
     def get_admin(self) -> User | None:
-        query = 'SELECT * FROM users WHERE is_admin = True'
-        with self:
-            self.cur.execute(query)
-            res = self.cur.fetchone()
-        if res:
-            res = User.from_dict(res)
-        return res
+        query = f'{Database._USER_SELECT} WHERE u.is_admin = True LIMIT 1'
+        res = self._fetch_rows(query)
+        return User.from_row(USER_COLUMNS, res[0]) if res else None
 
     def user_registered(self, telegram_id: int) -> bool:
         user = self.get_user(telegram_id)
@@ -311,10 +483,48 @@ class Database:
         with self:
             self.cur.execute(query)
 
+    def mark_bot_unblock_many(self, telegram_ids: list[int]) -> None:
+        """Marks the users as not blocking the bot with a single query."""
+        placeholders = ', '.join(['%s'] * len(telegram_ids))
+        query = f"UPDATE users SET blocked_bot = 0 WHERE blocked_bot = 1 AND telegram_id IN ({placeholders})"
+        with self:
+            self.cur.execute(query, tuple(telegram_ids))
+
     def check_bot_block(self, telegram_id: int) -> bool:
         user = self.get_user(telegram_id)
         return bool(user.blocked_bot)
 
+    def get_command_scope_hashes(self) -> dict[str, str]:
+        """Returns a dict of scope: commands_hash pairs for all bot command scopes pushed to telegram."""
+        query = 'SELECT scope, commands_hash FROM bot_command_scopes'
+        with self:
+            self.cur.execute(query)
+            res = self.cur.fetchall()
+        return {d['scope']: d['commands_hash'] for d in res}
+
+    def set_command_scope_hash(self, scope: str, commands_hash: str) -> None:
+        query = 'REPLACE INTO bot_command_scopes (scope, commands_hash) VALUES (%s, %s)'
+        with self:
+            self.cur.execute(query, (scope, commands_hash))
+
+    def delete_command_scope_hash(self, scope: str) -> None:
+        query = 'DELETE FROM bot_command_scopes WHERE scope = %s'
+        with self:
+            self.cur.execute(query, (scope,))
+
+    def get_update_watermark(self) -> dict | None:
+        """Returns a dict with 'last_update_id' and 'saved_at' keys or None if the watermark was never saved."""
+        with self:
+            self.cur.execute('SELECT last_update_id, saved_at FROM update_watermark WHERE id = 1')
+            res = self.cur.fetchone()
+        return res
+
+    def set_update_watermark(self, last_update_id: int) -> None:
+        """Stores the id of the update up to which all received updates have been processed."""
+        query = 'REPLACE INTO update_watermark (id, last_update_id, saved_at) VALUES (1, %s, %s)'
+        with self:
+            self.cur.execute(query, (last_update_id, datetime.now()))
+
     def insert_league(self, league_data: dict) -> None:
         query = Database._gen_insert_query('leagues', league_data)
         try:
@@ -370,9 +580,9 @@ class Database:
         with self:
             self.cur.execute(q, (id,))
             res = self.cur.fetchone()
-        if res:
-            league = self.get_league_by_api_id(res['league_api_id'])
-            res = Season.from_db_dict(league, res)
+            if res:
+                league = self.get_league_by_api_id(res['league_api_id'])
+                res = Season.from_db_dict(league, res)
         return res
 
     def get_season_by_league_api_id_and_year(self, league_api_id: int, year: int) -> Season | None:
@@ -380,9 +590,9 @@ class Database:
         with self:
             self.cur.execute(q, (league_api_id, year))
             res = self.cur.fetchone()
-        if res:
-            league = self.get_league_by_api_id(league_api_id)
-            res = Season.from_db_dict(league, res)
+            if res:
+                league = self.get_league_by_api_id(league_api_id)
+                res = Season.from_db_dict(league, res)
         return res
 
     def get_seasons_by_league_api_id(self, league_api_id: int) -> list[Season] | None:
@@ -390,9 +600,9 @@ class Database:
         with self:
             self.cur.execute(q, (league_api_id,))
             res = self.cur.fetchall()
-        if res:
-            league = self.get_league_by_api_id(league_api_id)
-            res = [Season.from_db_dict(league, s) for s in res]
+            if res:
+                league = self.get_league_by_api_id(league_api_id)
+                res = [Season.from_db_dict(league, s) for s in res]
         return res
 
     def get_last_stored_season(self, league_api_id: int) -> Season | None:
@@ -400,9 +610,9 @@ class Database:
         with self:
             self.cur.execute(q, (league_api_id,))
             res = self.cur.fetchone()
-        if res:
-            league = self.get_league_by_api_id(league_api_id)
-            res = Season.from_db_dict(league, res)
+            if res:
+                league = self.get_league_by_api_id(league_api_id)
+                res = Season.from_db_dict(league, res)
         return res
 
     def update_season(self, id: int, diff: dict) -> None:
@@ -433,9 +643,9 @@ class Database:
         with self:
             self.cur.execute(q, (season_id,))
             res = self.cur.fetchall()
-        if res:
-            season = self.get_season_by_id(season_id)
-            res = [BetContest.from_db_dict(season, s) for s in res]
+            if res:
+                season = self.get_season_by_id(season_id)
+                res = [BetContest.from_db_dict(season, s) for s in res]
         return res
 
     def get_bet_contest_by_id(self, id: int) -> BetContest | None:
@@ -443,12 +653,308 @@ class Database:
         with self:
             self.cur.execute(q, (id,))
             res = self.cur.fetchone()
-        if res:
-            season = self.get_season_by_id(res['season_id'])
-            res = BetContest.from_db_dict(season, res)
+            if res:
+                season = self.get_season_by_id(res['season_id'])
+                res = BetContest.from_db_dict(season, res)
+        return res
+
+    def get_round_deadlines(self, after: datetime) -> list[dict]:
+        """
+        Returns betting deadlines of rounds that start after the given moment. A round's deadline is the kickoff of its
+        first match. Rounds are told apart by season, so round N of one season doesn't merge with round N of another.
+        :param after: Rounds with deadlines before this datetime are omitted.
+        :return: A list of dicts with 'season_id', 'league_api_id', 'round' and 'deadline' keys ordered by deadline.
+        """
+        q = 'SELECT s.id AS season_id, m.league_api_id, m.round, MIN(m.start_datetime) AS deadline ' \
+            f'FROM matches m {Database._MATCH_SEASON_JOIN} ' \
+            'GROUP BY s.id, m.league_api_id, m.round HAVING deadline > %s ORDER BY deadline'
+        with self:
+            self.cur.execute(q, (after,))
+            res = self.cur.fetchall()
         return res
 
+    def get_next_round_matches(self, contest_id: int, after: datetime) -> list[dict]:
+        """
+        Returns matches of the bet contest's earliest round that still accepts bets, i.e. whose first match kicks off
+        after the given moment.
+        :param contest_id: ID of the bet contest.
+        :param after: Rounds with deadlines before this datetime are closed.
+        :return: A list of dicts with 'api_id', 'league_api_id', 'round', 'start_datetime' and team name keys ordered
+        by kickoff. Empty if no round is open.
+        """
+        q = 'SELECT m.api_id, m.league_api_id, m.round, m.start_datetime, ' \
+            'th.name AS home_team, th.name_ru AS home_team_ru, ta.name AS away_team, ta.name_ru AS away_team_ru ' \
+            'FROM bet_contests bc ' \
+            'JOIN seasons s ON s.id = bc.season_id ' \
+            'JOIN matches m ON m.league_api_id = s.league_api_id ' \
+            'AND DATE(m.start_datetime) BETWEEN s.start_date AND s.end_date ' \
+            'JOIN teams th ON th.api_id = m.home_team_id ' \
+            'JOIN teams ta ON ta.api_id = m.away_team_id ' \
+            'WHERE bc.id = %s AND m.round = (' \
+            'SELECT r.round FROM matches r WHERE r.league_api_id = s.league_api_id ' \
+            'AND DATE(r.start_datetime) BETWEEN s.start_date AND s.end_date ' \
+            'GROUP BY r.round HAVING MIN(r.start_datetime) > %s ORDER BY MIN(r.start_datetime) LIMIT 1) ' \
+            'ORDER BY m.start_datetime, m.api_id'
+        with self:
+            self.cur.execute(q, (contest_id, after))
+            res = self.cur.fetchall()
+        return res
+
+    def get_users_without_bets(self, season_id: int, round: int) -> list[User]:
+        """
+        Returns users that haven't placed a single bet on matches of the round yet and haven't blocked the bot.
+        :param season_id: ID of the season the round belongs to.
+        :param round: Round number.
+        """
+        q = f'{Database._USER_SELECT} WHERE u.used_bot = 1 AND u.blocked_bot = 0 AND NOT EXISTS (' \
+            f'SELECT 1 FROM bets b JOIN matches m ON m.api_id = b.match_id {Database._MATCH_SEASON_JOIN} ' \
+            'WHERE b.user_id = u.id AND s.id = %s AND m.round = %s)'
+        res = self._fetch_rows(q, (season_id, round))
+        return row_mappers.load_rows(User, USER_COLUMNS, res)
+
+    def get_round_bets(self, season_id: int, round: int) -> list[dict]:
+        """
+        Returns all bets placed on matches of the round along with match and user data using a single query.
+        :param season_id: ID of the season the round belongs to.
+        :param round: Round number.
+        :return: A list of dicts ordered by match kickoff.
+        """
+        q = 'SELECT m.api_id AS match_id, m.start_datetime, ' \
+            'th.name AS home_team, th.name_ru AS home_team_ru, ta.name AS away_team, ta.name_ru AS away_team_ru, ' \
+            'u.telegram_id, u.first_name, u.last_name, b.bet ' \
+            'FROM bets b ' \
+            'JOIN matches m ON m.api_id = b.match_id ' \
+            f'{Database._MATCH_SEASON_JOIN} ' \
+            'JOIN users u ON u.id = b.user_id ' \
+            'JOIN teams th ON th.api_id = m.home_team_id ' \
+            'JOIN teams ta ON ta.api_id = m.away_team_id ' \
+            'WHERE s.id = %s AND m.round = %s ' \
+            'ORDER BY m.start_datetime, m.api_id, u.id'
+        with self:
+            self.cur.execute(q, (season_id, round))
+            res = self.cur.fetchall()
+        return res
+
+    def get_contest_scored_bets(self, contest_id: int) -> list[dict]:
+        """
+        Returns bets of the contest's participants on the contest season's matches that already have a final score.
+        :param contest_id: Bet contest ID.
+        :return: A list of dicts ordered by round and match kickoff.
+        """
+        with self:
+            self.cur.execute(Database._CONTEST_SCORED_BETS_QUERY, (contest_id,))
+            res = self.cur.fetchall()
+        return res
+
+    def iter_contest_scored_bets(self, contest_id: int, as_tuples: bool = False):
+        """Streams the rows of self.get_contest_scored_bets(), as tuples in the order of its columns if as_tuples."""
+        return self._iter_query(Database._CONTEST_SCORED_BETS_QUERY, (contest_id,), as_tuples=as_tuples)
+
+    def iter_bets(self, as_tuples: bool = False):
+        """
+        Streams all bets in the hot tables ordered by ID. Columns: id, match_id, league_api_id, round, start_datetime,
+        score, telegram_id, bet, created_at.
+        """
+        q = 'SELECT b.id, b.match_id, m.league_api_id, m.round, m.start_datetime, m.score, u.telegram_id, b.bet, ' \
+            'b.created_at ' \
+            'FROM bets b JOIN matches m ON m.api_id = b.match_id JOIN users u ON u.id = b.user_id ' \
+            'ORDER BY b.id'
+        return self._iter_query(q, as_tuples=as_tuples)
+
+    def iter_archived_bets(self, season_id: int | None = None, as_tuples: bool = False):
+        """
+        Streams archived bets of a season or of all archived seasons ordered by ID. Columns are the same as of
+        self.iter_bets().
+        """
+        q = 'SELECT b.id, b.match_id, m.league_api_id, m.round, m.start_datetime, m.score, u.telegram_id, b.bet, ' \
+            'b.created_at ' \
+            'FROM archived_bets b JOIN archived_matches m ON m.api_id = b.match_id JOIN users u ON u.id = b.user_id '
+        if season_id is None:
+            return self._iter_query(q + 'ORDER BY b.id', as_tuples=as_tuples)
+        return self._iter_query(q + 'WHERE b.season_id = %s ORDER BY b.id', (season_id,), as_tuples=as_tuples)
+
+    def get_contest_memberships(self) -> list[tuple[int, int]]:
+        """Fetches all participants of all bet contests as (bet contest ID, telegram ID) pairs."""
+        query = 'SELECT bcu.bet_contest_id, u.telegram_id FROM bet_contest_users bcu JOIN users u ON u.id = bcu.user_id'
+        with self:
+            self.cur.execute(query)
+            res = self.cur.fetchall()
+        return [(d['bet_contest_id'], d['telegram_id']) for d in res]
+
+    def add_bet_contest_user(self, bet_contest_id: int, telegram_id: int) -> bool:
+        """
+        Adds a stored user to the bet contest's participants.
+        :return: True if the user was added, False if the user isn't stored in the db.
+        """
+        query = 'INSERT INTO bet_contest_users (bet_contest_id, user_id) ' \
+                'SELECT %s, id FROM users WHERE telegram_id = %s'
+        with self:
+            self.cur.execute(query, (bet_contest_id, telegram_id))
+            return self.cur.rowcount > 0
+
+    def backfill_contest_users(self) -> int:
+        """
+        Makes every stored user a participant of the latest bet contest if no contest has participants yet. Users
+        used to be admitted by having a 'users' row, so this keeps them admitted after the upgrade. Run once, when
+        'bet_contest_users' is created: afterwards an empty table means the admin has removed every participant.
+        :return: Number of added participants.
+        """
+        query = 'INSERT INTO bet_contest_users (bet_contest_id, user_id) ' \
+                'SELECT bc.id, u.id FROM users u JOIN bet_contests bc ON bc.id = (SELECT MAX(id) FROM bet_contests) ' \
+                'WHERE NOT EXISTS (SELECT 1 FROM bet_contest_users)'
+        with self:
+            self.cur.execute(query)
+            n = self.cur.rowcount
+        if n > 0:
+            logging.info(f"{n} stored users added to the latest bet contest's participants.")
+        return max(n, 0)
+
+    def remove_bet_contest_user(self, bet_contest_id: int, telegram_id: int) -> None:
+        query = 'DELETE FROM bet_contest_users ' \
+                'WHERE bet_contest_id = %s AND user_id = (SELECT id FROM users WHERE telegram_id = %s)'
+        with self:
+            self.cur.execute(query, (bet_contest_id, telegram_id))
+
+    def get_bet_contest_ids_by_league(self, league_api_id: int) -> list[int]:
+        """Returns IDs of active bet contests on seasons of the league."""
+        q = 'SELECT bc.id FROM bet_contests bc JOIN seasons s ON s.id = bc.season_id ' \
+            'WHERE s.league_api_id = %s AND bc.is_active = 1'
+        with self:
+            self.cur.execute(q, (league_api_id,))
+            res = self.cur.fetchall()
+        return [d['id'] for d in res]
+
+    def get_bet_contest_ids_by_season(self, season_id: int) -> list[int]:
+        q = 'SELECT id FROM bet_contests WHERE season_id = %s'
+        with self:
+            self.cur.execute(q, (season_id,))
+            res = self.cur.fetchall()
+        return [d['id'] for d in res]
+
+    def get_archivable_season_ids(self) -> list[int]:
+        """
+        Returns IDs of finished seasons whose matches and bets are still in the hot tables. Seasons restored from the
+        archive are left out, so they stay restored until they are archived by hand.
+        """
+        q = 'SELECT s.id FROM seasons s LEFT JOIN season_archives a ON a.season_id = s.id ' \
+            'WHERE s.finished = 1 AND a.season_id IS NULL'
+        with self:
+            self.cur.execute(q)
+            res = self.cur.fetchall()
+        return [d['id'] for d in res]
+
+    def get_season_archive(self, season_id: int) -> dict | None:
+        """Returns the season's archive record or None if it was never archived. 'restored_at' is set if restored."""
+        q = 'SELECT * FROM season_archives WHERE season_id = %s'
+        with self:
+            self.cur.execute(q, (season_id,))
+            res = self.cur.fetchone()
+        return res
+
+    def archive_season(self, season_id: int, standings: list[tuple]) -> tuple[int, int]:
+        """
+        Moves the season's matches and bets from the hot tables to the archive tables and stores final standings of
+        its bet contests, all in a single transaction.
+        :param season_id: Season ID.
+        :param standings: (bet_contest_id, telegram_id, position, points, exact, bets) tuples.
+        :return: Numbers of archived matches and bets.
+        """
+        q_matches = 'INSERT INTO archived_matches (api_id, season_id, league_api_id, start_datetime, round, ' \
+                    'home_team_id, away_team_id, score, status_long, status_short) ' \
+                    'SELECT m.api_id, s.id, m.league_api_id, m.start_datetime, m.round, m.home_team_id, ' \
+                    'm.away_team_id, m.score, m.status_long, m.status_short ' \
+                    'FROM matches m JOIN seasons s ON s.league_api_id = m.league_api_id ' \
+                    'AND DATE(m.start_datetime) BETWEEN s.start_date AND s.end_date ' \
+                    'WHERE s.id = %s'
+        q_bets = 'INSERT INTO archived_bets (id, season_id, match_id, user_id, bet, created_at) ' \
+                 'SELECT b.id, am.season_id, b.match_id, b.user_id, b.bet, b.created_at ' \
+                 'FROM bets b JOIN archived_matches am ON am.api_id = b.match_id WHERE am.season_id = %s'
+        q_standings = 'INSERT INTO season_standings (season_id, bet_contest_id, telegram_id, position, points, ' \
+                      'exact, bets) VALUES (%s, %s, %s, %s, %s, %s, %s)'
+        with self:
+            self.cur.execute(q_matches, (season_id,))
+            n_matches = self.cur.rowcount
+            self.cur.execute(q_bets, (season_id,))
+            n_bets = self.cur.rowcount
+            self.cur.execute('DELETE FROM bets WHERE match_id IN '
+                             '(SELECT api_id FROM archived_matches WHERE season_id = %s)', (season_id,))
+            self.cur.execute('DELETE FROM matches WHERE api_id IN '
+                             '(SELECT api_id FROM archived_matches WHERE season_id = %s)', (season_id,))
+            if standings:
+                self.cur.executemany(q_standings, [(season_id, *s) for s in standings])
+            self.cur.execute('REPLACE INTO season_archives (season_id, matches, bets, restored_at) '
+                             'VALUES (%s, %s, %s, NULL)', (season_id, n_matches, n_bets))
+        return n_matches, n_bets
+
+    def restore_season(self, season_id: int) -> None:
+        """
+        Moves the season's matches and bets back to the hot tables in a single transaction. The season's archive record
+        is kept with 'restored_at' set, which excludes the season from automatic archival.
+        """
+        q_matches = 'INSERT INTO matches (api_id, league_api_id, start_datetime, round, home_team_id, away_team_id, ' \
+                    'score, status_long, status_short) ' \
+                    'SELECT api_id, league_api_id, start_datetime, round, home_team_id, away_team_id, ' \
+                    'score, status_long, status_short FROM archived_matches WHERE season_id = %s'
+        q_bets = 'INSERT INTO bets (id, match_id, user_id, bet, created_at) ' \
+                 'SELECT id, match_id, user_id, bet, created_at FROM archived_bets WHERE season_id = %s'
+        with self:
+            self.cur.execute(q_matches, (season_id,))
+            self.cur.execute(q_bets, (season_id,))
+            for table in ('archived_bets', 'archived_matches', 'season_standings'):
+                self.cur.execute(f'DELETE FROM {table} WHERE season_id = %s', (season_id,))
+            self.cur.execute('UPDATE season_archives SET restored_at = NOW() WHERE season_id = %s', (season_id,))
+
+    def get_season_standings(self, season_id: int) -> list[dict]:
+        """
+        Returns final standings of the archived season's bet contests.
+        :return: A list of dicts ordered by bet contest and position.
+        """
+        q = 'SELECT ss.bet_contest_id, ss.telegram_id, ss.position, ss.points, ss.exact, ss.bets, ' \
+            'u.first_name, u.last_name ' \
+            'FROM season_standings ss LEFT JOIN users u ON u.telegram_id = ss.telegram_id ' \
+            'WHERE ss.season_id = %s ORDER BY ss.bet_contest_id, ss.position'
+        with self:
+            self.cur.execute(q, (season_id,))
+            res = self.cur.fetchall()
+        return res
+
+    def get_match_scores(self, league_api_id: int) -> dict[int, str | None]:
+        """Returns a dict of match_api_id: score pairs of the league's matches, None for matches without a score."""
+        q = 'SELECT api_id, score FROM matches WHERE league_api_id = %s'
+        with self:
+            self.cur.execute(q, (league_api_id,))
+            res = self.cur.fetchall()
+        return {d['api_id']: d['score'] for d in res}
+
+    def get_seasons_awaiting_scores(self, since: datetime, before: datetime) -> list[dict]:
+        """
+        Returns active seasons that have matches kicked off in the given period but still without a score. Postponed,
+        cancelled and abandoned matches aren't waited for.
+        :param since: Matches kicked off before this datetime aren't expected to get a score anymore.
+        :param before: Matches kicked off after this datetime are not expected to have a score yet.
+        :return: A list of dicts with 'league_api_id' and 'year' keys.
+        """
+        unplayed = ', '.join(['%s'] * len(config.UNPLAYED_MATCH_STATUSES))
+        q = 'SELECT DISTINCT s.league_api_id, s.year FROM matches m ' \
+            f'{Database._MATCH_SEASON_JOIN} ' \
+            'WHERE s.active = 1 AND m.score IS NULL AND m.start_datetime BETWEEN %s AND %s ' \
+            f'AND (m.status_short IS NULL OR m.status_short NOT IN ({unplayed}))'
+        with self:
+            self.cur.execute(q, (since, before, *config.UNPLAYED_MATCH_STATUSES))
+            res = self.cur.fetchall()
+        return res
+
+    def update_match_score(self, api_id: int, score: str, status_short: str = None, status_long: str = None) -> None:
+        q = 'UPDATE matches SET score = %s, status_short = %s, status_long = %s WHERE api_id = %s'
+        try:
+            with self:
+                self.cur.execute(q, (score, status_short, status_long, api_id))
+            logging.info(f"Table 'matches', api_id {api_id} score updated: {score}.")
+        except Exception as e:
+            logging.exception(f"An unexpected error occurred while updating table 'matches': {repr(e)}")
+
 
 if __name__ == '__main__':
+    init_logging()
     db = Database()
 
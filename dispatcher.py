@@ -0,0 +1,85 @@
+import logging
+import queue
+import threading
+from collections import deque
+from typing import Any, Callable, Hashable
+
+
+_STOP = object()
+
+
+class UpdateDispatcher:
+    """
+    Processes updates concurrently across chats but strictly in order within a chat.
+
+    Every chat with pending updates owns a FIFO queue. A chat is handed to at most one worker at a time, and the worker
+    takes a single update from it before putting the chat back in line, so a chat flooding the bot doesn't starve the
+    others. The total number of pending updates is bounded: submit() blocks while the limit is reached.
+    """
+
+    def __init__(self, handler: Callable[[Any], None], workers: int, max_pending: int):
+        """
+        :param handler: A callable processing a single update.
+        :param workers: Number of worker threads.
+        :param max_pending: Max number of updates accepted but not yet processed.
+        """
+        self._handler = handler
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._pending: dict[Hashable, deque] = {}  # a chat is stored here while it's queued or being processed
+        self._ready: queue.SimpleQueue = queue.SimpleQueue()
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._workers = [threading.Thread(target=self._work, name=f'UpdateDispatcher-{i}', daemon=True)
+                         for i in range(workers)]
+        for w in self._workers:
+            w.start()
+
+    def submit(self, chat_key: Hashable, update: Any) -> None:
+        """
+        Queues an update for processing after all previously submitted updates of the same chat.
+        :param chat_key: A key identifying the chat the update belongs to.
+        :param update: An update to pass to the handler.
+        """
+        self._slots.acquire()
+        with self._lock:
+            chat_queue = self._pending.get(chat_key)
+            if chat_queue is not None:
+                chat_queue.append(update)
+                return
+            self._pending[chat_key] = deque((update,))
+        self._ready.put(chat_key)
+
+    def stop(self, wait: bool = True) -> None:
+        """
+        Stops worker threads.
+        :param wait: If True, waits for all pending updates to be processed first.
+        """
+        if wait:
+            with self._idle:
+                self._idle.wait_for(lambda: not self._pending)
+        for _ in self._workers:
+            self._ready.put(_STOP)
+
+    def _work(self) -> None:
+        """A worker thread loop that processes one update of a ready chat at a time."""
+        while True:
+            chat_key = self._ready.get()
+            if chat_key is _STOP:
+                return
+
+            with self._lock:
+                update = self._pending[chat_key].popleft()
+            try:
+                self._handler(update)
+            except Exception as e:
+                logging.exception(f"An unexpected error occurred while processing an update: {repr(e)}")
+            finally:
+                self._slots.release()
+
+            with self._lock:
+                if self._pending[chat_key]:
+                    self._ready.put(chat_key)
+                else:
+                    del self._pending[chat_key]
+                    if not self._pending:
+                        self._idle.notify_all()
@@ -0,0 +1,197 @@
+import logging
+import os
+import re
+import sqlite3
+import tempfile
+from datetime import date, datetime, timedelta
+from os import path
+
+from db import Database
+from settings import get_settings
+
+
+sqlite3.register_adapter(datetime, lambda d: d.isoformat(' '))
+sqlite3.register_adapter(date, lambda d: d.isoformat())
+sqlite3.register_converter('TIMESTAMP', lambda b: datetime.fromisoformat(b.decode()))
+sqlite3.register_converter('DATETIME', lambda b: datetime.fromisoformat(b.decode()))
+sqlite3.register_converter('DATE', lambda b: date.fromisoformat(b.decode()))
+
+# (MySQL pattern, SQLite replacement) pairs applied to every query
+_QUERY_TRANSLATIONS = (
+    (re.compile(r'%s'), '?'),
+    (re.compile(r'\bNOW\(\)', re.IGNORECASE), 'CURRENT_TIMESTAMP'),
+)
+# (MySQL pattern, SQLite replacement) pairs applied to the table creation scripts
+_DDL_TRANSLATIONS = (
+    (re.compile(r'\w+\s+PRIMARY KEY AUTO_INCREMENT', re.IGNORECASE), 'INTEGER PRIMARY KEY AUTOINCREMENT'),
+    (re.compile(r'\s*ON UPDATE CURRENT_TIMESTAMP', re.IGNORECASE), ''),
+    (re.compile(r',\s*INDEX\s*\([^)]*\)', re.IGNORECASE), ''),
+)
+
+
+def _translate(query: str, translations: tuple) -> str:
+    for pattern, replacement in translations:
+        query = pattern.sub(replacement, query)
+    return query
+
+
+class _SQLiteCursor:
+    """Makes an sqlite3 cursor look like a mysql.connector one to Database."""
+
+    def __init__(self, cursor: sqlite3.Cursor, dictionary: bool):
+        self._cursor = cursor
+        self._dictionary = dictionary
+
+    def execute(self, operation: str, params=()):
+        self._cursor.execute(_translate(operation, _QUERY_TRANSLATIONS), params or ())
+
+    def executemany(self, operation: str, seq_params) -> None:
+        self._cursor.executemany(_translate(operation, _QUERY_TRANSLATIONS), seq_params)
+
+    def _row(self, row: tuple | None) -> dict | tuple | None:
+        if row is None or not self._dictionary:
+            return row
+        return dict(zip((d[0] for d in self._cursor.description), row))
+
+    def fetchone(self) -> dict | tuple | None:
+        return self._row(self._cursor.fetchone())
+
+    def fetchmany(self, size: int = 1) -> list:
+        return [self._row(r) for r in self._cursor.fetchmany(size)]
+
+    def fetchall(self) -> list:
+        return [self._row(r) for r in self._cursor.fetchall()]
+
+    @property
+    def lastrowid(self) -> int:
+        return self._cursor.lastrowid
+
+    @property
+    def rowcount(self) -> int:
+        return self._cursor.rowcount
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def close(self) -> None:
+        self._cursor.close()
+
+
+class _SQLiteConnection:
+    """Makes an sqlite3 connection look like a mysql.connector one to Database."""
+
+    def __init__(self, filepath: str):
+        self._conn = sqlite3.connect(filepath, timeout=30, detect_types=sqlite3.PARSE_DECLTYPES,
+                                     check_same_thread=False)
+
+    def cursor(self, buffered: bool = True, dictionary: bool = False, **kwargs) -> _SQLiteCursor:
+        return _SQLiteCursor(self._conn.cursor(), dictionary)
+
+    def commit(self) -> None:
+        self._conn.commit()
+
+    def rollback(self) -> None:
+        self._conn.rollback()
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class EmbeddedDatabase(Database):
+    """
+    Database stored in an SQLite file instead of a MySQL server. Runs the same Database methods and the same table
+    creation scripts (translated to SQLite), so benchmarks and load tests don't need a MySQL server.
+    """
+
+    def __init__(self, filepath: str | None = None):
+        """:param filepath: A path to the SQLite db file. A new file in a temp dir is created if not given."""
+        self._filepath = filepath or path.join(tempfile.mkdtemp(prefix='betbot_'), 'embedded.db')
+        super().__init__()
+        with self:
+            self.cur.execute('PRAGMA journal_mode=WAL')
+
+    def _try_connect(self) -> _SQLiteConnection:
+        self.conn = _SQLiteConnection(self._filepath)
+        return self.conn
+
+    def _db_exists(self) -> bool:
+        return True
+
+    def _missing_tables(self) -> tuple[str, ...]:
+        with self:
+            self.cur.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+            stored_tables = [d['name'] for d in self.cur.fetchall()]
+        return tuple(set(self._tables) - set(stored_tables))
+
+    def _execute_mysql_script(self, filepath: str) -> None:
+        if not path.exists(filepath):
+            raise FileNotFoundError('Failed to find MySQL script file')
+
+        queries = Database._extract_mysql_queries(filepath)
+        with self:
+            for q in queries:
+                self.cur.execute(_translate(q, _DDL_TRANSLATIONS))
+
+    def _populate_users(self):
+        """Populates 'users' table with the admin. ADMIN_ID is optional for an embedded db."""
+        admin_data = {'telegram_id': get_settings().admin_id or 1, 'is_admin': True}
+        with self:
+            self.cur.execute(Database._gen_insert_query('users', admin_data), tuple(admin_data.values()))
+
+    def drop(self) -> None:
+        """Deletes the db file."""
+        for suffix in ('', '-wal', '-shm'):
+            if path.exists(self._filepath + suffix):
+                os.remove(self._filepath + suffix)
+        logging.info(f"Embedded database '{self._filepath}' deleted.")
+
+
+def seed_demo_data(db: Database, n_users: int = 100, n_rounds: int = 10, matches_per_round: int = 8,
+                   league_api_id: int = 235) -> None:
+    """
+    Fills an empty db with a league, a season, a bet contest, teams, registered users participating in the contest,
+    matches and a bet of every user on every match. Rounds in the first half of the season are finished, the rest start
+    in the future.
+    :param db: Database instance to fill.
+    :param n_users: Number of users (besides the admin).
+    :param n_rounds: Number of rounds.
+    :param matches_per_round: Number of matches in a round.
+    :param league_api_id: API ID of the league.
+    """
+    now = datetime.now().replace(microsecond=0)
+    season_start = now - timedelta(weeks=n_rounds // 2 + 1)
+    season_end = now + timedelta(weeks=n_rounds)
+    n_teams = matches_per_round * 2
+
+    users = [(1000 + i, 'User', str(i), 1) for i in range(n_users)]
+    teams = [(i, f'Team {i}', f'City {i}') for i in range(1, n_teams + 1)]
+    matches = []
+    for r in range(1, n_rounds + 1):
+        kickoff = now + timedelta(weeks=r - n_rounds // 2 - 1)
+        finished = kickoff < now
+        for j in range(matches_per_round):
+            score = f'{(r + j) % 4}-{(r * j) % 3}' if finished else None
+            matches.append((r * 100 + j, league_api_id, kickoff + timedelta(hours=j), r, 2 * j + 1, 2 * j + 2, score))
+
+    with db:
+        db.cur.execute('INSERT INTO leagues (api_id, league_country, league_name) VALUES (%s, %s, %s)',
+                       (league_api_id, 'Russia', 'Premier League'))
+        db.cur.execute('INSERT INTO seasons (league_api_id, year, end_year, start_date, end_date, active) '
+                       'VALUES (%s, %s, %s, %s, %s, 1)',
+                       (league_api_id, season_start.year, season_end.year, season_start.date(), season_end.date()))
+        season_id = db.cur.lastrowid
+        db.cur.execute('INSERT INTO bet_contests (season_id) VALUES (%s)', (season_id,))
+        contest_id = db.cur.lastrowid
+        db.cur.executemany('INSERT INTO teams (api_id, name, city) VALUES (%s, %s, %s)', teams)
+        db.cur.executemany('INSERT INTO users (telegram_id, first_name, last_name, used_bot) VALUES (%s, %s, %s, %s)',
+                           users)
+        db.cur.execute('SELECT id FROM users WHERE is_admin = 0')
+        user_ids = [d['id'] for d in db.cur.fetchall()]
+        db.cur.executemany('INSERT INTO bet_contest_users (bet_contest_id, user_id) VALUES (%s, %s)',
+                           [(contest_id, u) for u in user_ids])
+        db.cur.executemany('INSERT INTO matches (api_id, league_api_id, start_datetime, round, home_team_id, '
+                           'away_team_id, score) VALUES (%s, %s, %s, %s, %s, %s, %s)', matches)
+        db.cur.executemany('INSERT INTO bets (match_id, user_id, bet) VALUES (%s, %s, %s)',
+                           [(m[0], u, f'{(u + m[0]) % 4}-{(u * m[0]) % 3}') for m in matches for u in user_ids])
+    logging.info(f"Embedded database seeded: {n_users} users, {len(matches)} matches.")
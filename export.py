@@ -0,0 +1,50 @@
+"""
+Exports all bets to a CSV file, streaming them from the db in constant memory.
+
+Usage:
+    python export.py bets.csv              # bets in the hot tables
+    python export.py bets.csv --archived   # bets of archived seasons
+"""
+import argparse
+import csv
+import logging
+
+from utils import init_logging
+
+BET_COLUMNS = ('id', 'match_id', 'league_api_id', 'round', 'start_datetime', 'score', 'telegram_id', 'bet',
+               'created_at')  # columns of Database.iter_bets() and Database.iter_archived_bets()
+
+
+def export_bets(db, filepath: str, archived: bool = False) -> int:
+    """
+    Writes bets to a CSV file.
+    :param db: Database instance.
+    :param filepath: A path to the CSV file.
+    :param archived: Export bets of archived seasons instead of the hot tables.
+    :return: Number of exported bets.
+    """
+    rows = db.iter_archived_bets(as_tuples=True) if archived else db.iter_bets(as_tuples=True)
+    n = 0
+    with open(filepath, 'w', newline='', encoding='UTF-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(BET_COLUMNS)
+        for row in rows:
+            writer.writerow(row)
+            n += 1
+    logging.info(f"{n} bets exported to '{filepath}'.")
+    return n
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Exports bets to a CSV file.')
+    parser.add_argument('filepath', help='CSV file to write')
+    parser.add_argument('--archived', action='store_true', help='export bets of archived seasons')
+    args = parser.parse_args()
+    init_logging()
+
+    from db import Database
+    print(f"{export_bets(Database(), args.filepath, args.archived)} bets exported.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+import threading
+import time
+
+import config
+
+
+class FloodLimiter:
+    """
+    Limits the rate of updates from every user with a token bucket.
+
+    A user's bucket holds up to `burst` tokens and regains `refill_rate` tokens per second. Every update takes a token
+    and is dropped if there is none. Buckets live in memory and are checked before any filter, so a flooding user costs
+    no db work. A user is warned about dropped updates at most once per warning_cooldown seconds. Buckets that have
+    refilled completely and are out of their warning cooldown are pruned from time to time to keep memory bounded.
+    """
+
+    def __init__(self, burst: int = config.FLOOD_BURST, refill_rate: float = config.FLOOD_REFILL_RATE,
+                 warning_cooldown: float = config.FLOOD_WARNING_COOLDOWN):
+        """
+        :param burst: Max number of updates a user can send at once.
+        :param refill_rate: Number of updates per second a user can keep sending.
+        :param warning_cooldown: Min seconds between two warnings to the same user.
+        """
+        self.burst = burst
+        self.refill_rate = refill_rate
+        self.warning_cooldown = warning_cooldown
+        self._buckets: dict[int, list] = {}  # telegram ID: [tokens, time of the last update, time of the last warning]
+        self._full_after = burst / refill_rate  # seconds an empty bucket takes to refill
+        self._pruned_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def allow(self, telegram_id: int) -> tuple[bool, bool]:
+        """
+        Takes a token from the user's bucket.
+        :param telegram_id: Telegram ID of the update's sender.
+        :return: (allowed, warn) pair. allowed is False if the update must be dropped. warn is True for a dropped update
+        if the user hasn't been warned for warning_cooldown seconds.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if now - self._pruned_at > self._full_after:
+                self._prune(now)
+            bucket = self._buckets.get(telegram_id)
+            if bucket is None:
+                self._buckets[telegram_id] = [self.burst - 1, now, None]
+                return True, False
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.refill_rate)
+            bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return True, False
+            warn = bucket[2] is None or now - bucket[2] >= self.warning_cooldown
+            if warn:
+                bucket[2] = now
+            return False, warn
+
+    def _prune(self, now: float) -> None:
+        """Forgets buckets that have refilled completely since their last update and whose users may be warned again."""
+        self._buckets = {telegram_id: bucket for telegram_id, bucket in self._buckets.items()
+                         if now - bucket[1] < self._full_after
+                         or (bucket[2] is not None and now - bucket[2] < self.warning_cooldown)}
+        self._pruned_at = now
@@ -0,0 +1,111 @@
+import logging
+import pickle
+
+from apscheduler.jobstores.base import BaseJobStore, ConflictingIdError, JobLookupError
+from apscheduler.job import Job
+from apscheduler.util import datetime_to_utc_timestamp, utc_timestamp_to_datetime
+
+
+class DatabaseJobStore(BaseJobStore):
+    """
+    An APScheduler job store keeping jobs in the app's database ('apscheduler_jobs' table).
+
+    Jobs survive restarts. Only the jobs that are due are loaded from the db when the scheduler wakes up, so the
+    number of stored jobs doesn't affect startup time.
+    """
+
+    def __init__(self, db, pickle_protocol: int = pickle.HIGHEST_PROTOCOL):
+        """
+        :param db: Database instance.
+        :param pickle_protocol: Pickle protocol used to serialize job states.
+        """
+        super().__init__()
+        self.db = db
+        self.pickle_protocol = pickle_protocol
+
+    def lookup_job(self, job_id: str) -> Job | None:
+        q = 'SELECT job_state FROM apscheduler_jobs WHERE id = %s'
+        with self.db:
+            self.db.cur.execute(q, (job_id,))
+            res = self.db.cur.fetchone()
+        return self._reconstitute_job(res['job_state']) if res else None
+
+    def get_due_jobs(self, now) -> list[Job]:
+        timestamp = datetime_to_utc_timestamp(now)
+        return self._get_jobs('WHERE next_run_time <= %s', (timestamp,))
+
+    def get_next_run_time(self):
+        q = 'SELECT next_run_time FROM apscheduler_jobs WHERE next_run_time IS NOT NULL ' \
+            'ORDER BY next_run_time LIMIT 1'
+        with self.db:
+            self.db.cur.execute(q)
+            res = self.db.cur.fetchone()
+        return utc_timestamp_to_datetime(res['next_run_time']) if res else None
+
+    def get_all_jobs(self) -> list[Job]:
+        jobs = self._get_jobs()
+        self._fix_paused_jobs_sorting(jobs)
+        return jobs
+
+    def add_job(self, job: Job) -> None:
+        with self.db:
+            self.db.cur.execute('SELECT id FROM apscheduler_jobs WHERE id = %s', (job.id,))
+            if self.db.cur.fetchone():
+                raise ConflictingIdError(job.id)
+            self.db.cur.execute('INSERT INTO apscheduler_jobs (id, next_run_time, job_state) VALUES (%s, %s, %s)',
+                                (job.id, datetime_to_utc_timestamp(job.next_run_time), self._serialize_job(job)))
+
+    def update_job(self, job: Job) -> None:
+        q = 'UPDATE apscheduler_jobs SET next_run_time = %s, job_state = %s WHERE id = %s'
+        with self.db:
+            self.db.cur.execute(q, (datetime_to_utc_timestamp(job.next_run_time), self._serialize_job(job), job.id))
+            updated = self.db.cur.rowcount
+        if updated == 0:
+            raise JobLookupError(job.id)
+
+    def remove_job(self, job_id: str) -> None:
+        with self.db:
+            self.db.cur.execute('DELETE FROM apscheduler_jobs WHERE id = %s', (job_id,))
+            deleted = self.db.cur.rowcount
+        if deleted == 0:
+            raise JobLookupError(job_id)
+
+    def remove_all_jobs(self) -> None:
+        with self.db:
+            self.db.cur.execute('DELETE FROM apscheduler_jobs')
+
+    def _serialize_job(self, job: Job) -> bytes:
+        return pickle.dumps(job.__getstate__(), self.pickle_protocol)
+
+    def _reconstitute_job(self, job_state: bytes) -> Job:
+        job_state = pickle.loads(job_state)
+        job_state['jobstore'] = self
+        job = Job.__new__(Job)
+        job.__setstate__(job_state)
+        job._scheduler = self._scheduler
+        job._jobstore_alias = self._alias
+        return job
+
+    def _get_jobs(self, condition: str = '', params: tuple = ()) -> list[Job]:
+        """Fetches jobs matching an optional WHERE clause. Jobs that fail to be restored are deleted."""
+        q = f'SELECT id, job_state FROM apscheduler_jobs {condition} ORDER BY next_run_time'
+        with self.db:
+            self.db.cur.execute(q, params)
+            res = self.db.cur.fetchall()
+
+        jobs, failed_job_ids = [], []
+        for row in res:
+            try:
+                jobs.append(self._reconstitute_job(row['job_state']))
+            except Exception as e:
+                logging.exception(f"Unable to restore job '{row['id']}', removing it: {repr(e)}")
+                failed_job_ids.append(row['id'])
+
+        if failed_job_ids:
+            with self.db:
+                for job_id in failed_job_ids:
+                    self.db.cur.execute('DELETE FROM apscheduler_jobs WHERE id = %s', (job_id,))
+        return jobs
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__}>'
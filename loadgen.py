@@ -0,0 +1,224 @@
+"""
+Synthetic load test driving BetBot end to end with a stubbed Telegram API and an embedded db.
+
+Every simulated user sends /start and /help, presses the button starting a bet input session and then sends a bet on
+every match of the session, either typed (some of them invalid) or with a score button. A share of senders are
+strangers the bot has to reject.
+
+Usage:
+    python loadgen.py --users 2000 --invalid-ratio 0.2 --api-latency-ms 30
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+
+os.environ.setdefault('TELEGRAM_TOKEN', '123456789:LOADTEST')
+os.environ.setdefault('ADMIN_ID', '1')
+
+import telebot
+
+import metrics
+from callback_router import encode_callback_data
+from embedded_db import EmbeddedDatabase, seed_demo_data
+from utils import init_logging
+
+FIRST_USER_ID = 1000  # telegram ID of the first user created by seed_demo_data()
+STRANGER_ID_OFFSET = 10 ** 9
+MATCHES_PER_SESSION = 3  # matches per seeded round, BetBot._start_bets_callback offers the next round's matches
+OPEN_ROUND = 3  # the last of the seeded rounds, it starts in a week and accepts bets
+
+TELEGRAM_API_CALLS = metrics.REGISTRY.counter('betbot_loadgen_telegram_api_calls_total',
+                                              'Calls of the stubbed Telegram API made during a load test.')
+
+
+class _FakeResponse:
+    def __init__(self, result):
+        self.status_code = 200
+        self.reason = 'OK'
+        self.text = json.dumps({'ok': True, 'result': result})
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class FakeTelegramAPI:
+    """Answers telebot's HTTP requests locally instead of sending them to Telegram."""
+
+    def __init__(self, latency: float = 0.):
+        """:param latency: Seconds every API call takes."""
+        self.latency = latency
+        self._message_ids = itertools.count(1)
+
+    def __call__(self, method: str, url: str, params: dict = None, **kwargs) -> _FakeResponse:
+        api_method = url.rsplit('/', 1)[-1]
+        TELEGRAM_API_CALLS.inc(method=api_method)
+        if self.latency:
+            time.sleep(self.latency)
+
+        params = params or {}
+        if api_method == 'sendMessage':
+            return _FakeResponse(self._message(int(params['chat_id']), params.get('text')))
+        if api_method == 'getMe':
+            return _FakeResponse({'id': 1, 'is_bot': True, 'first_name': 'BetBot', 'username': 'BetBot'})
+        if api_method == 'getMyCommands':
+            return _FakeResponse([])
+        return _FakeResponse(True)
+
+    def _message(self, chat_id: int, text: str | None) -> dict:
+        return {'message_id': next(self._message_ids), 'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'}, 'text': text}
+
+
+class UpdateFactory:
+    """Builds telegram updates as they arrive from Telegram."""
+
+    def __init__(self):
+        self._update_ids = itertools.count(1)
+
+    def message(self, telegram_id: int, text: str) -> dict:
+        update_id = next(self._update_ids)
+        message = {'message_id': update_id, 'date': int(time.time()), 'text': text,
+                   'chat': {'id': telegram_id, 'type': 'private'},
+                   'from': {'id': telegram_id, 'is_bot': False, 'first_name': 'User', 'last_name': str(telegram_id)}}
+        if text.startswith('/'):
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+        return {'update_id': update_id, 'message': message}
+
+    def callback(self, telegram_id: int, data: str) -> dict:
+        update_id = next(self._update_ids)
+        user = {'id': telegram_id, 'is_bot': False, 'first_name': 'User'}
+        message = {'message_id': update_id, 'date': int(time.time()), 'text': 'Выберете опцию:',
+                   'chat': {'id': telegram_id, 'type': 'private'}, 'from': {'id': 1, 'is_bot': True,
+                                                                            'first_name': 'BetBot'}}
+        return {'update_id': update_id, 'callback_query': {'id': str(update_id), 'from': user, 'data': data,
+                                                           'chat_instance': str(telegram_id), 'message': message}}
+
+
+def user_script(factory: UpdateFactory, telegram_id: int, invalid_ratio: float, button_ratio: float) -> list[dict]:
+    """Returns updates a single registered user sends in order."""
+    updates = [factory.message(telegram_id, '/start'), factory.message(telegram_id, '/help'),
+               factory.callback(telegram_id, encode_callback_data('start_bets'))]
+    placed = 0
+    while placed < MATCHES_PER_SESSION:
+        if random.random() < button_ratio:
+            match_id = OPEN_ROUND * 100 + placed  # seed_demo_data() numbers matches of round r from r * 100
+            data = encode_callback_data('bet', match_id, random.randint(0, 3), random.randint(0, 3))
+            updates.append(factory.callback(telegram_id, data))
+            placed += 1
+        elif random.random() < invalid_ratio:
+            updates.append(factory.message(telegram_id, random.choice(('2--1', 'abc', '1', '3:2:1'))))
+        else:
+            updates.append(factory.message(telegram_id, f'{random.randint(0, 4)}-{random.randint(0, 4)}'))
+            placed += 1
+    return updates
+
+
+def generate_updates(n_users: int, invalid_ratio: float, stranger_ratio: float,
+                     button_ratio: float = 0.) -> list[telebot.types.Update]:
+    """Interleaves scripts of all users the way concurrent users' updates arrive."""
+    factory = UpdateFactory()
+    scripts = [user_script(factory, FIRST_USER_ID + i, invalid_ratio, button_ratio) for i in range(n_users)]
+    scripts += [[factory.message(STRANGER_ID_OFFSET + i, '/start'), factory.message(STRANGER_ID_OFFSET + i, '2-1')]
+                for i in range(int(n_users * stranger_ratio))]
+
+    updates = []
+    for step in itertools.zip_longest(*scripts):
+        updates.extend(u for u in step if u)
+    return [telebot.types.Update.de_json(u) for u in updates]
+
+
+def create_bot(db) -> SimpleNamespace:
+    """Creates the bot and the controller the same way app.py does, minus starting them."""
+    from bot import BetBot
+    from controller import Controller
+    from scheduler import BotScheduler
+    from stats_api import StatsAPIHandler
+
+    bot = BetBot(db)
+    controller = Controller(telegram_bot=bot, database=db, scheduler=BotScheduler(),
+                            stats_api_handler=StatsAPIHandler(db))
+    return SimpleNamespace(bot=bot, controller=controller)
+
+
+def percentile(sorted_values: list[float], p: float) -> float:
+    if not sorted_values:
+        return 0.
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p))]
+
+
+def run(n_users: int, invalid_ratio: float, stranger_ratio: float, api_latency: float, batch_size: int,
+        button_ratio: float = 0.) -> dict:
+    telebot.apihelper.CUSTOM_REQUEST_SENDER = FakeTelegramAPI(latency=api_latency)
+    db = EmbeddedDatabase()
+    try:
+        seed_demo_data(db, n_users=n_users, n_rounds=OPEN_ROUND, matches_per_round=MATCHES_PER_SESSION)
+        app = create_bot(db)
+        updates = generate_updates(n_users, invalid_ratio, stranger_ratio, button_ratio)
+
+        latencies, lock = [], threading.Lock()
+
+        def timed_process_update(update):
+            start = time.perf_counter()
+            app.bot._process_update(update)
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+
+        app.bot._dispatcher._handler = timed_process_update  # records latency of every update
+
+        queries_before = metrics.DB_QUERIES.total()
+        api_calls_before = TELEGRAM_API_CALLS.total()
+        start = time.perf_counter()
+        for i in range(0, len(updates), batch_size):
+            app.bot.process_new_updates(updates[i:i + batch_size])
+        app.bot._dispatcher.stop(wait=True)
+        elapsed = time.perf_counter() - start
+
+        latencies.sort()
+        queries = metrics.DB_QUERIES.total() - queries_before
+        return {
+            'updates': len(updates),
+            'seconds': elapsed,
+            'throughput': len(updates) / elapsed,
+            'p50_ms': percentile(latencies, .5) * 1000,
+            'p99_ms': percentile(latencies, .99) * 1000,
+            'max_ms': (latencies[-1] if latencies else 0.) * 1000,
+            'db_queries': queries,
+            'db_queries_per_update': queries / len(updates),
+            'telegram_api_calls': TELEGRAM_API_CALLS.total() - api_calls_before,
+        }
+    finally:
+        telebot.apihelper.CUSTOM_REQUEST_SENDER = None
+        db.drop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Synthetic load test of BetBot.')
+    parser.add_argument('--users', type=int, default=1000, help='number of simulated registered users')
+    parser.add_argument('--invalid-ratio', type=float, default=.2, help='share of invalid bets')
+    parser.add_argument('--stranger-ratio', type=float, default=.05,
+                        help='number of unregistered senders relative to --users')
+    parser.add_argument('--api-latency-ms', type=float, default=0., help='simulated Telegram API latency')
+    parser.add_argument('--batch', type=int, default=100, help='updates per polling batch')
+    parser.add_argument('--button-ratio', type=float, default=0., help='share of bets placed with score buttons')
+    args = parser.parse_args()
+    init_logging(log_dir=tempfile.gettempdir())  # keeps the runtime log out of the repo
+
+    report = run(args.users, args.invalid_ratio, args.stranger_ratio, args.api_latency_ms / 1000, args.batch,
+                 args.button_ratio)
+    print(f"Updates:              {report['updates']}")
+    print(f"Time:                 {report['seconds']:.2f} s")
+    print(f"Throughput:           {report['throughput']:.0f} updates/s")
+    print(f"Latency p50/p99/max:  {report['p50_ms']:.1f} / {report['p99_ms']:.1f} / {report['max_ms']:.1f} ms")
+    print(f"DB queries:           {report['db_queries']:.0f} ({report['db_queries_per_update']:.2f} per update)")
+    print(f"Telegram API calls:   {report['telegram_api_calls']:.0f}")
+
+
+if __name__ == '__main__':
+    main()
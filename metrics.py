@@ -0,0 +1,249 @@
+import functools
+import inspect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from html import escape
+
+DEFAULT_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self._lock = threading.Lock()
+        self._values: dict[tuple, object] = {}
+
+    @staticmethod
+    def _key(labels: dict) -> tuple:
+        return tuple(sorted(labels.items()))
+
+    @staticmethod
+    def _format_labels(key: tuple, extra: tuple = ()) -> str:
+        pairs = (*key, *extra)
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{k}="{v}"' for k, v in pairs) + '}'
+
+    def render(self) -> list[str]:
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} {self.type}']
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_value(key, value))
+        return lines
+
+    def _render_value(self, key: tuple, value) -> list[str]:
+        return [f'{self.name}{self._format_labels(key)} {value}']
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def total(self) -> float:
+        """Returns the sum of values over all label combinations."""
+        with self._lock:
+            return sum(self._values.values())
+
+
+class Gauge(_Metric):
+    type = 'gauge'
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+
+class _HistogramValue:
+    __slots__ = ('buckets', 'count', 'sum', 'max')
+
+    def __init__(self, n_buckets: int):
+        self.buckets = [0] * n_buckets
+        self.count = 0
+        self.sum = 0.
+        self.max = 0.
+
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name: str, description: str, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, description)
+        self.buckets = buckets
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            v = self._values.get(key)
+            if v is None:
+                v = self._values[key] = _HistogramValue(len(self.buckets))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    v.buckets[i] += 1
+                    break
+            v.count += 1
+            v.sum += value
+            v.max = max(v.max, value)
+
+    @contextmanager
+    def time(self, **labels):
+        """Observes the time spent in the with-block in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def stats(self) -> dict[tuple, _HistogramValue]:
+        with self._lock:
+            return dict(self._values)
+
+    def _render_value(self, key: tuple, value: _HistogramValue) -> list[str]:
+        lines, cumulative = [], 0
+        for bound, n in zip(self.buckets, value.buckets):
+            cumulative += n
+            lines.append(f'{self.name}_bucket{self._format_labels(key, (("le", bound),))} {cumulative}')
+        lines.append(f'{self.name}_bucket{self._format_labels(key, (("le", "+Inf"),))} {value.count}')
+        lines.append(f'{self.name}_sum{self._format_labels(key)} {value.sum}')
+        lines.append(f'{self.name}_count{self._format_labels(key)} {value.count}')
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+
+    def counter(self, name: str, description: str) -> Counter:
+        return self._register(Counter(name, description))
+
+    def gauge(self, name: str, description: str) -> Gauge:
+        return self._register(Gauge(name, description))
+
+    def histogram(self, name: str, description: str, buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, description, buckets))
+
+    def _register(self, metric: _Metric):
+        return self._metrics.setdefault(metric.name, metric)
+
+    def metrics(self) -> list[_Metric]:
+        return list(self._metrics.values())
+
+    def render_prometheus(self) -> str:
+        """Renders all metrics in Prometheus text exposition format."""
+        lines = []
+        for m in self._metrics.values():
+            lines.extend(m.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+HANDLER_LATENCY = REGISTRY.histogram('betbot_handler_seconds', 'Time spent in bot handlers.')
+DB_METHOD_LATENCY = REGISTRY.histogram('betbot_db_method_seconds', 'Time spent in Database methods.')
+DB_QUERIES = REGISTRY.counter('betbot_db_queries_total', 'Queries executed by Database.')
+STATS_API_REQUESTS = REGISTRY.counter('betbot_stats_api_requests_total', 'Requests made to the stats API.')
+STATS_API_QUOTA_REMAINING = REGISTRY.gauge('betbot_stats_api_quota_remaining',
+                                           'Stats API requests left for today as reported by the API.')
+TELEGRAM_SENDS = REGISTRY.counter('betbot_telegram_sends_total', 'Messages sent to telegram by result.')
+UPDATES_SKIPPED = REGISTRY.counter('betbot_updates_skipped_total', 'Updates skipped before processing by reason.')
+ACTIVE_SESSIONS = REGISTRY.gauge('betbot_active_bet_sessions', 'Bet input sessions in progress.')
+WORKER_TASK_LATENCY = REGISTRY.histogram('betbot_worker_task_seconds',
+                                         'Time spent waiting for CPU-heavy tasks run by the worker pool.')
+
+
+def timed(histogram: Histogram, **labels):
+    """A decorator observing the decorated function's execution time."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with histogram.time(**labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def instrument_methods(histogram: Histogram):
+    """A class decorator observing execution time of every public method labeled with the method's name."""
+    def decorator(cls):
+        for name, attr in list(vars(cls).items()):
+            if not name.startswith('_') and inspect.isfunction(attr):
+                setattr(cls, name, timed(histogram, method=name)(attr))
+        return cls
+    return decorator
+
+
+def render_summary() -> str:
+    """Renders a short HTML summary of all metrics for the admin's /stats command."""
+    lines = ['<b>Статистика</b>']
+    for m in REGISTRY.metrics():
+        if isinstance(m, Histogram):
+            stats = sorted(m.stats().items(), key=lambda i: -i[1].sum)
+            if not stats:
+                continue
+            lines.append(f'\n<b>{m.name}</b> (вызовов / среднее / макс, мс)')
+            for key, v in stats[:10]:
+                label = ', '.join(str(val) for _, val in key) or '-'
+                lines.append(f'{escape(label)}: {v.count} / {v.sum / v.count * 1000:.1f} / {v.max * 1000:.1f}')
+        else:
+            values = m.render()[2:]
+            if values:
+                lines.append(f'\n<b>{m.name}</b>')
+                lines.extend(escape(v[len(m.name):] or v) for v in values)
+    return '\n'.join(lines)
+
+
+def write_to_file(filepath: str) -> None:
+    """Writes all metrics to a file in Prometheus text format, e.g. for node exporter's textfile collector."""
+    tmp_path = f'{filepath}.tmp'
+    with open(tmp_path, 'w', encoding='UTF-8') as f:
+        f.write(REGISTRY.render_prometheus())
+    os.replace(tmp_path, filepath)
+
+
+def start_http_server(port: int, host: str = '0.0.0.0'):
+    """Serves all metrics in Prometheus text format at http://host:port/metrics from a background thread."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsRequestHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != '/metrics':
+                self.send_response(404)
+                self.end_headers()
+                return
+            body = REGISTRY.render_prometheus().encode('UTF-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsRequestHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='MetricsServer', daemon=True).start()
+    return server
@@ -0,0 +1,145 @@
+import itertools
+import logging
+import queue
+import re
+import threading
+import time
+from datetime import datetime
+from html import escape, unescape
+from typing import Callable
+
+import config
+from views import MAX_MESSAGE_LENGTH, split_message
+
+_CRITICAL, _REGULAR, _STOP = 0, 1, 2
+_HTML_TAG = re.compile(r'<[^>]+>')
+
+
+class _Notification:
+    def __init__(self, text: str):
+        self.text = text
+        self.created_at = datetime.now()
+        self.count = 1
+
+
+class AdminNotifier:
+    """
+    Delivers notifications to the admin from a background thread, so callers never wait for telegram.
+
+    Critical notifications jump the queue and are sent right away. Regular ones are collected and sent as a single
+    digest every digest_interval seconds. Identical notifications are merged within a digest, and a notification
+    identical to one already sent less than dedup_window seconds ago is only counted and reported along with its
+    next occurrence after the window.
+    """
+
+    def __init__(self, send: Callable[[str], None], digest_interval: float = config.ADMIN_NOTIFY_DIGEST_INTERVAL,
+                 dedup_window: float = config.ADMIN_NOTIFY_DEDUP_WINDOW):
+        """
+        :param send: A callable sending a text message to the admin.
+        :param digest_interval: Seconds between digests of regular notifications.
+        :param dedup_window: Seconds during which identical notifications are suppressed after being sent.
+        """
+        self._send = send
+        self._digest_interval = digest_interval
+        self._dedup_window = dedup_window
+        self._queue: queue.PriorityQueue = queue.PriorityQueue()
+        self._seq = itertools.count()  # keeps FIFO order among items of the same priority
+        self._pending: dict[str, _Notification] = {}
+        self._reported: dict[str, float] = {}
+        self._suppressed: dict[str, int] = {}
+        self._thread = threading.Thread(target=self._work, name='AdminNotifier', daemon=True)
+        self._thread.start()
+
+    def notify(self, text: str, critical: bool = False) -> None:
+        """
+        Queues a notification for the admin. Never blocks.
+        :param text: HTML-formatted notification text.
+        :param critical: If True, the notification is sent right away bypassing digests and deduplication.
+        """
+        self._queue.put((_CRITICAL if critical else _REGULAR, next(self._seq), _Notification(text)))
+
+    def stop(self, timeout: float = 10) -> None:
+        """Sends everything queued so far and stops the notifier thread."""
+        self._queue.put((_STOP, next(self._seq), None))
+        self._thread.join(timeout)
+
+    def _work(self) -> None:
+        """Notifier thread loop."""
+        next_digest = time.monotonic() + self._digest_interval
+        while True:
+            try:
+                priority, _, notification = self._queue.get(timeout=max(0., next_digest - time.monotonic()))
+            except queue.Empty:
+                priority, notification = None, None
+
+            if priority == _CRITICAL:
+                self._deliver(AdminNotifier._format(notification))
+            elif priority == _REGULAR:
+                self._collect(notification)
+            elif priority == _STOP:
+                self._send_digest()
+                return
+
+            if time.monotonic() >= next_digest:
+                self._send_digest()
+                next_digest = time.monotonic() + self._digest_interval
+
+    def _collect(self, notification: _Notification) -> None:
+        """Adds a regular notification to the next digest unless it duplicates a recent one."""
+        text = notification.text
+        if text in self._pending:
+            self._pending[text].count += 1
+        elif time.monotonic() - self._reported.get(text, float('-inf')) < self._dedup_window:
+            self._suppressed[text] = self._suppressed.get(text, 0) + 1
+        else:
+            notification.count += self._suppressed.pop(text, 0)
+            self._pending[text] = notification
+
+    def _send_digest(self) -> None:
+        """Sends all collected regular notifications as a single message."""
+        if not self._pending:
+            return
+
+        now = time.monotonic()
+        notifications = list(self._pending.values())
+        self._pending.clear()
+        for n in notifications:
+            self._reported[n.text] = now
+        self._reported = {t: ts for t, ts in self._reported.items() if now - ts < self._dedup_window}
+
+        if len(notifications) == 1:
+            self._deliver(AdminNotifier._format(notifications[0]))
+            return
+
+        header = f"<b>Сводка: {sum(n.count for n in notifications)} уведомлений</b>"
+        self._deliver(header, *(AdminNotifier._format(n) for n in notifications))
+
+    def _deliver(self, *blocks: str) -> None:
+        """
+        Sends the text blocks in as few messages as possible. A block is never split between messages, so its HTML
+        markup stays intact.
+        """
+        for text in split_message([AdminNotifier._fit(block) for block in blocks]):
+            try:
+                self._send(text)
+            except Exception as e:
+                logging.exception(f"Failed to notify admin: {repr(e)}")
+
+    @staticmethod
+    def _fit(block: str) -> str:
+        """Turns a block too long for a single message into truncated plain text, as cutting HTML breaks it."""
+        if len(block) <= MAX_MESSAGE_LENGTH:
+            return block
+        text = escape(unescape(_HTML_TAG.sub('', block)))
+        if len(text) <= MAX_MESSAGE_LENGTH:
+            return text
+        text = text[:MAX_MESSAGE_LENGTH - 3]
+        if text.rfind('&') > text.rfind(';'):  # an entity is cut in half
+            text = text[:text.rfind('&')]
+        return text + '...'
+
+    @staticmethod
+    def _format(notification: _Notification) -> str:
+        prefix = notification.created_at.strftime(config.PREFERRED_DATETIME_FORMAT) + "\n"
+        suffix = f"\n<i>(повторов: {notification.count})</i>" if notification.count > 1 else ""
+        return prefix + notification.text + suffix
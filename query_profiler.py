@@ -0,0 +1,70 @@
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from functools import lru_cache
+
+import metrics
+from settings import get_settings
+
+ENABLED: bool = get_settings().db_query_profiling
+SLOW_QUERY_MS: float = get_settings().db_slow_query_ms
+N_PLUS_ONE_THRESHOLD: int = get_settings().db_n_plus_one_threshold
+
+
+SLOW_QUERIES = metrics.REGISTRY.counter('betbot_db_slow_queries_total', 'Queries slower than DB_SLOW_QUERY_MS.')
+N_PLUS_ONE = metrics.REGISTRY.counter('betbot_db_n_plus_one_total',
+                                      'Statements repeated at least DB_N_PLUS_ONE_THRESHOLD times in one update.')
+
+_LITERALS = re.compile(r"'(?:[^'\\]|\\.|'')*'|\b\d+(?:\.\d+)?\b")
+_WHITESPACE = re.compile(r'\s+')
+_local = threading.local()
+
+
+@lru_cache(maxsize=2048)
+def normalize(statement: str) -> str:
+    """
+    Replaces literals in a statement with '?' and collapses whitespace, so statements that differ only by the values
+    they were built with (e.g. with f-strings) look the same.
+    """
+    return _WHITESPACE.sub(' ', _LITERALS.sub('?', statement)).strip()
+
+
+@contextmanager
+def update_scope(name: str):
+    """
+    Counts statements executed within the with-block, e.g. while processing a single update, and logs the ones
+    repeated at least N_PLUS_ONE_THRESHOLD times as likely N+1 query patterns. Does nothing if profiling is disabled.
+    :param name: A name of the unit of work to put in the log, e.g. 'update 123'.
+    """
+    if not ENABLED or getattr(_local, 'counts', None) is not None:  # disabled or nested
+        yield
+        return
+
+    _local.counts = counts = Counter()
+    try:
+        yield
+    finally:
+        _local.counts = None
+        for statement, n in counts.items():
+            if n >= N_PLUS_ONE_THRESHOLD:
+                N_PLUS_ONE.inc()
+                logging.warning(f"Possible N+1 query pattern in {name}: executed {n} times: {statement}")
+
+
+def execute(cursor, statement: str, params=()):
+    """Executes a statement on a cursor timing it and recording it in the current update scope."""
+    start = time.perf_counter()
+    try:
+        return cursor.execute(statement, params)
+    finally:
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        normalized = normalize(statement)
+        if elapsed_ms >= SLOW_QUERY_MS:
+            SLOW_QUERIES.inc()
+            logging.warning(f"Slow query ({elapsed_ms:.0f} ms): {normalized}")
+        counts = getattr(_local, 'counts', None)
+        if counts is not None:
+            counts[normalized] += 1
@@ -0,0 +1,39 @@
+from users import User
+from bet_input_sessions import BetInputSession
+from contest_membership import ContestMembershipIndex
+
+
+class RequestContext:
+    """
+    Data about the sender of a single update, shared by all filters and handlers processing that update.
+
+    The sender is looked up in the db lazily, on the first access to self.user, and at most once per update. Bet
+    contests the sender participates in come from the in-memory membership index and cost no query.
+    """
+
+    def __init__(self, telegram_id: int, db, session: BetInputSession | None, membership: ContestMembershipIndex):
+        """
+        :param telegram_id: Telegram ID of the update's sender.
+        :param db: Database instance used to look up the sender.
+        :param session: Sender's BetInputSession active at the moment the update is received, if any.
+        :param membership: Index of bet contests' participants.
+        """
+        self.telegram_id = telegram_id
+        self.session = session
+        self._db = db
+        self._membership = membership
+        self._user: User | None = None
+        self._resolved = False
+
+    @property
+    def user(self) -> User | None:
+        """The sender stored in the db or None if the sender is unknown."""
+        if not self._resolved:
+            self._user = self._db.get_user(self.telegram_id)
+            self._resolved = True
+        return self._user
+
+    @property
+    def contest_ids(self) -> frozenset[int]:
+        """IDs of bet contests the sender participates in."""
+        return self._membership.contest_ids(self.telegram_id)
@@ -0,0 +1,76 @@
+import logging
+from datetime import datetime, timedelta
+
+import config
+import views
+
+
+class RoundDeadlineService:
+    """
+    Reminds users to place bets before a round starts and locks betting on the round at its deadline. Once betting is
+    locked, everyone who placed bets on the round gets a summary of all the bets.
+
+    A round's deadline is the kickoff of its first match. Every round gets a single reminder job and a single lock
+    job regardless of the number of users: users to remind are selected with one query when the reminder job fires.
+    """
+
+    def __init__(self, bot, db, scheduler):
+        """
+        :param bot: BetBot instance used to send reminders and lock betting.
+        :param db: Database instance the deadlines are derived from.
+        :param scheduler: BotScheduler instance running the jobs.
+        """
+        self.bot = bot
+        self.db = db
+        self.scheduler = scheduler
+        self._reminder_lead = timedelta(hours=config.BET_REMINDER_LEAD_HOURS)
+        self.scheduler.register_job_target('bet_reminder', self.remind)
+        self.scheduler.register_job_target('bet_lock', self.lock)
+
+    def sync(self) -> None:
+        """
+        (Re)schedules reminder and lock jobs for all upcoming rounds. Jobs have stable IDs, so calling this again after
+        fixtures have changed reschedules existing jobs instead of duplicating them.
+        """
+        now = datetime.now()
+        deadlines = self.db.get_round_deadlines(after=now)
+        for d in deadlines:
+            season_id, league_api_id, round, deadline = d['season_id'], d['league_api_id'], d['round'], d['deadline']
+            job_key = f'{league_api_id}:{round}'
+
+            reminder_dt = deadline - self._reminder_lead
+            if reminder_dt > now:
+                self.scheduler.schedule_persistent(target='bet_reminder', job_dt=reminder_dt,
+                                                   job_id=f'bet_reminder:{job_key}',
+                                                   args=(season_id, league_api_id, round, deadline))
+            self.scheduler.schedule_persistent(target='bet_lock', job_dt=deadline, job_id=f'bet_lock:{job_key}',
+                                               args=(season_id, league_api_id, round))
+        logging.info(f"Round deadlines synced: {len(deadlines)} upcoming rounds.")
+
+    def remind(self, season_id: int, league_api_id: int, round: int, deadline: datetime) -> None:
+        """Sends a reminder to every user who hasn't placed bets on the round yet."""
+        users = self.db.get_users_without_bets(season_id, round)
+        text = f"⏰ <b>Напоминание</b>\n\n" \
+               f"Тур {round} начнётся {deadline.strftime(config.PREFERRED_DATETIME_FORMAT)}, " \
+               f"а Ваших ставок на него пока нет!"
+        # a user who blocked the bot or a failed send doesn't stop reminders to the others
+        self.bot.broadcast([user.telegram_id for user in users], [text])
+        logging.info(f"Bet reminders for league {league_api_id}, round {round} sent to {len(users)} users.")
+
+    def lock(self, season_id: int, league_api_id: int, round: int) -> None:
+        """Locks betting on the round and sends the round's bets summary to its participants."""
+        self.bot.lock_round(league_api_id, round)
+        self.send_round_snapshot(season_id, round)
+
+    def send_round_snapshot(self, season_id: int, round: int) -> None:
+        """
+        Sends everyone's bets on the round to every user who placed bets on it. The bets are fetched with one query and
+        the summary is rendered once for all recipients.
+        """
+        rows = self.db.get_round_bets(season_id, round)
+        if not rows:
+            return
+        texts = views.render_round_bets(round, rows)
+        recipients = list(dict.fromkeys(r['telegram_id'] for r in rows))
+        self.bot.broadcast(recipients, texts)
+        logging.info(f"Bets summary for season {season_id}, round {round} sent to {len(recipients)} users.")
@@ -0,0 +1,81 @@
+"""
+Converters between db rows and entity dataclasses, compiled once per class.
+
+Building an entity through dataclasses.fields() and a dict comprehension per row is slow on user lists. Instead, the
+first request for a class and a column order generates a plain function that takes a row tuple, coerces its values by
+the types of the class fields and calls the class constructor with them. Later rows of the same shape are converted by
+that function only.
+"""
+import functools
+from dataclasses import fields
+from datetime import datetime
+from typing import Callable
+
+
+def _to_bool(value) -> bool:
+    # MySQL stores bool values as 0s and 1s
+    return bool(value)
+
+
+def _to_datetime(value) -> datetime | None:
+    # the embedded SQLite db returns timestamps as strings
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+_LOADERS = {bool: '_to_bool', datetime: '_to_datetime'}  # field type: name of the function coercing a db value
+_DUMPERS = {bool: 'int'}  # field type: name of the function making a db value
+_NAMESPACE = {'_to_bool': _to_bool, '_to_datetime': _to_datetime}
+
+
+def _compile(name: str, source: str, cls: type) -> Callable:
+    namespace = dict(_NAMESPACE, cls=cls)
+    exec(source, namespace)
+    return namespace[name]
+
+
+@functools.cache
+def row_loader(cls: type, columns: tuple[str, ...]) -> Callable[[tuple], object]:
+    """
+    Returns a function making an instance of a dataclass from a row tuple.
+    :param cls: Dataclass whose fields are named after the columns.
+    :param columns: Column names in the order of row values.
+    """
+    types = {f.name: f.type for f in fields(cls)}
+    args = []
+    for i, column in enumerate(columns):
+        if column not in types:
+            raise TypeError(f"{cls.__name__} has no field for column '{column}'")
+        loader = _LOADERS.get(types[column])
+        args.append(f'{column}={loader}(row[{i}])' if loader else f'{column}=row[{i}]')
+    return _compile('load', f'def load(row):\n    return cls({", ".join(args)})', cls)
+
+
+@functools.cache
+def dict_dumper(cls: type) -> Callable[[object], dict]:
+    """Returns a function making a dict of field: db value pairs from a dataclass instance."""
+    items = []
+    for f in fields(cls):
+        dumper = _DUMPERS.get(f.type)
+        items.append(f"'{f.name}': {dumper}(obj.{f.name})" if dumper else f"'{f.name}': obj.{f.name}")
+    return _compile('dump', f'def dump(obj):\n    return {{{", ".join(items)}}}', cls)
+
+
+def load_row(cls: type, columns: tuple[str, ...], row: tuple):
+    """Makes an instance of a dataclass from a single row tuple."""
+    return row_loader(cls, columns)(row)
+
+
+def load_rows(cls: type, columns: tuple[str, ...], rows: list[tuple]) -> list:
+    """Makes instances of a dataclass from row tuples of the same shape."""
+    load = row_loader(cls, columns)
+    return [load(row) for row in rows]
+
+
+def load_dict(cls: type, d: dict):
+    """Makes an instance of a dataclass from a dict row."""
+    return row_loader(cls, tuple(d))(tuple(d.values()))
+
+
+def column_names(cls: type) -> tuple[str, ...]:
+    """Returns names of the dataclass fields, i.e. of the table columns, in declaration order."""
+    return tuple(f.name for f in fields(cls))
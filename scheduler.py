@@ -7,28 +7,98 @@ from apscheduler.triggers.interval import IntervalTrigger
 from apscheduler.triggers.date import DateTrigger
 from apscheduler.executors.pool import ThreadPoolExecutor
 from apscheduler.jobstores.memory import MemoryJobStore
+from apscheduler.util import obj_to_ref
 import config
-from utils import init_logging
+from jobstores import DatabaseJobStore
+import query_profiler
 
-init_logging()
+
+# Jobs stored in the db have to refer to a module-level function, so they call bound methods through this registry
+_job_targets: dict[str, callable] = {}
+
+
+def run_registered_job(target: str, *args) -> None:
+    """Runs a callable registered with BotScheduler.register_job_target(). Used by persistent jobs."""
+    with query_profiler.update_scope(f"job '{target}'"):
+        _job_targets[target](*args)
 
 
 class BotScheduler(BackgroundScheduler):
-    def __init__(self):
+    """
+    Jobs scheduled with self.schedule_persistent() or self.schedule(persistent=True) are stored in the db and survive
+    restarts, all the others are kept in memory and have to be scheduled again on every start.
+    """
+
+    def __init__(self, db=None):
+        """:param db: Database instance to store persistent jobs in. Without it persistent jobs are kept in memory."""
         super().__init__(
-            jobstores={'default': MemoryJobStore()},
+            jobstores={
+                'default': DatabaseJobStore(db) if db else MemoryJobStore(),
+                'memory': MemoryJobStore()
+            },
             executors={'default': ThreadPoolExecutor()},
+            job_defaults={
+                'coalesce': True,  # a job missed several times in a row is run once
+                'misfire_grace_time': config.SCHEDULER_MISFIRE_GRACE_TIME,
+                'max_instances': 1
+            },
             timezone=config.PREFERRED_TIMEZONE
         )
 
-    def schedule(self, job: callable, job_dt: datetime) -> None:
-        self.add_job(func=job, trigger=DateTrigger(job_dt))
+    @staticmethod
+    def register_job_target(target: str, job: callable) -> None:
+        """
+        Registers a callable persistent jobs can refer to by name. Has to be done on every start before the scheduler
+        is started.
+        """
+        _job_targets[target] = job
+
+    def schedule_persistent(self, target: str, job_dt: datetime, job_id: str, args: tuple = ()) -> None:
+        """
+        Schedules a job stored in the db to be run once. A job previously scheduled with the same ID is replaced.
+        :param target: Name of a callable registered with self.register_job_target().
+        :param job_dt: A datetime to run the job at.
+        :param job_id: Unique job ID.
+        :param args: Picklable positional arguments to call the target with.
+        """
+        self.schedule(run_registered_job, job_dt, job_id=job_id, args=(target, *args), persistent=True)
+
+    def schedule(self, job: callable, job_dt: datetime, job_id: str = None, args: tuple = None,
+                 persistent: bool = False) -> None:
+        """
+        Schedules a job to be run once.
+        :param job: A callable to run. A persistent job must be a module-level function, use self.schedule_persistent()
+        for bound methods.
+        :param job_dt: A datetime to run the job at.
+        :param job_id: If given, a job previously scheduled with the same ID is replaced. Required for persistent jobs.
+        :param args: Positional arguments to call the job with. Have to be picklable for persistent jobs.
+        :param persistent: If True, the job is stored in the db and survives restarts.
+        """
+        if persistent:
+            if job_id is None:
+                raise ValueError("Persistent jobs must have an ID, otherwise they are duplicated on every start.")
+            obj_to_ref(job)  # fails now rather than when the scheduler stores the job
+        self.add_job(func=job, trigger=DateTrigger(job_dt), id=job_id, args=args, replace_existing=job_id is not None,
+                     jobstore='default' if persistent else 'memory')
 
     def schedule_bon_appetit(self, job: callable) -> None:
-        self.add_job(func=job, trigger=CronTrigger(day_of_week='1-5', hour=12))
+        self.add_job(func=job, trigger=CronTrigger(day_of_week='1-5', hour=12), jobstore='memory')
 
     def schedule_work_over(self, job: callable) -> None:
-        self.add_job(func=job, trigger=CronTrigger(day_of_week='1-5', hour=16, minute=30))
+        self.add_job(func=job, trigger=CronTrigger(day_of_week='1-5', hour=16, minute=30),
+                     jobstore='memory')
+
+    def schedule_deadlines_sync(self, job: callable) -> None:
+        self.add_job(func=job, trigger=CronTrigger(hour=6), jobstore='memory')
+
+    def schedule_season_archival(self, job: callable) -> None:
+        self.add_job(func=job, trigger=CronTrigger(hour=5), jobstore='memory')
+
+    def schedule_results_sync(self, job: callable) -> None:
+        self.add_job(func=job, trigger=IntervalTrigger(minutes=config.RESULTS_SYNC_INTERVAL_MINUTES), jobstore='memory')
+
+    def schedule_metrics_dump(self, job: callable) -> None:
+        self.add_job(func=job, trigger=IntervalTrigger(seconds=15), jobstore='memory')
 
 
 if __name__ == '__main__':
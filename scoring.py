@@ -0,0 +1,69 @@
+EXACT_SCORE_POINTS = 3
+OUTCOME_POINTS = 1
+
+
+def parse_score(text: str | None) -> tuple[int, int] | None:
+    """
+    Parses a score or a bet like '2-1' or '2:1'.
+    :return: A tuple of home and away goals or None if the text is not a valid score.
+    """
+    if not text:
+        return None
+    text = text.replace(' ', '').replace(':', '-')
+    parts = text.split('-')
+    if len(parts) != 2 or not all(p.isdigit() for p in parts):
+        return None
+    return int(parts[0]), int(parts[1])
+
+
+def bet_points(bet: str, score: str) -> int:
+    """
+    Calculates points for a bet on a finished match: EXACT_SCORE_POINTS for an exact score, OUTCOME_POINTS for a right
+    outcome (home win, draw or away win) and 0 otherwise.
+    :param bet: User's bet, e.g. '2-1'.
+    :param score: Final score of the match, e.g. '1-0'.
+    """
+    bet, score = parse_score(bet), parse_score(score)
+    if not bet or not score:
+        return 0
+    if bet == score:
+        return EXACT_SCORE_POINTS
+    if _outcome(bet) == _outcome(score):
+        return OUTCOME_POINTS
+    return 0
+
+
+def diff_scores(stored: dict[int, str | None], fetched: dict[int, str]) -> dict[int, str]:
+    """
+    Finds matches whose fetched score differs from the stored one.
+    :param stored: A dict of match_api_id: score pairs stored in the db, None for matches without a score.
+    :param fetched: A dict of match_api_id: score pairs fetched from the stats API.
+    :return: A dict of match_api_id: score pairs that have to be stored.
+    """
+    return {match_id: score for match_id, score in fetched.items()
+            if match_id in stored and parse_score(score) and parse_score(score) != parse_score(stored[match_id])}
+
+
+def _outcome(score: tuple[int, int]) -> int:
+    home, away = score
+    return (home > away) - (home < away)
+
+
+def build_standings(rows: list[dict]) -> list[dict]:
+    """
+    Sums up points of every user.
+    :param rows: Scored bets as returned by Database.get_contest_scored_bets().
+    :return: A list of dicts with 'telegram_id', 'first_name', 'last_name', 'points', 'exact' and 'bets' keys sorted
+    by points, then by the number of exact scores.
+    """
+    standings = {}
+    for row in rows:
+        s = standings.get(row['telegram_id'])
+        if s is None:
+            s = standings[row['telegram_id']] = {'telegram_id': row['telegram_id'], 'first_name': row['first_name'],
+                                                 'last_name': row['last_name'], 'points': 0, 'exact': 0, 'bets': 0}
+        points = bet_points(row['bet'], row['score'])
+        s['points'] += points
+        s['exact'] += points == EXACT_SCORE_POINTS
+        s['bets'] += 1
+    return sorted(standings.values(), key=lambda s: (-s['points'], -s['exact']))
@@ -0,0 +1,72 @@
+import logging
+
+import scoring
+from workers import WorkerPool
+
+
+def build_contest_standings(contest_rows: dict[int, list[dict]]) -> list[tuple]:
+    """
+    Builds final standings of bet contests. Runs in a worker process, so takes and returns plain data only.
+    :param contest_rows: A dict of bet contest ID: scored bets as returned by Database.get_contest_scored_bets().
+    :return: (bet_contest_id, telegram_id, position, points, exact, bets) tuples.
+    """
+    return [(contest_id, s['telegram_id'], position, s['points'], s['exact'], s['bets'])
+            for contest_id, rows in contest_rows.items()
+            for position, s in enumerate(scoring.build_standings(rows), start=1)]
+
+
+class SeasonArchiver:
+    """
+    Keeps only current seasons' matches and bets in the hot tables.
+
+    A finished season's matches and bets are moved to the 'archived_matches' and 'archived_bets' tables, and final
+    standings of its bet contests are stored in 'season_standings', so they stay queryable without the season's bets.
+    An archived season can be restored to the hot tables on demand. A restored season is not archived automatically
+    again, only by an explicit self.archive().
+    """
+
+    def __init__(self, db, pool: WorkerPool | None = None):
+        """
+        :param db: Database instance.
+        :param pool: Worker pool building the standings. They are built in the calling thread if not given.
+        """
+        self.db = db
+        self.pool = pool or WorkerPool()
+
+    def archive_finished(self) -> list[int]:
+        """
+        Archives every finished season that is neither archived yet nor restored from the archive.
+        :return: IDs of archived seasons.
+        """
+        archived = []
+        for season_id in self.db.get_archivable_season_ids():
+            try:
+                self.archive(season_id)
+                archived.append(season_id)
+            except Exception as e:
+                logging.exception(f"Failed to archive season {season_id}: {repr(e)}")
+        return archived
+
+    def archive(self, season_id: int) -> None:
+        """Moves the season's matches and bets to the archive tables along with final standings of its contests."""
+        contest_rows = {contest_id: self.db.get_contest_scored_bets(contest_id)
+                        for contest_id in self.db.get_bet_contest_ids_by_season(season_id)}
+        standings = self.pool.run(build_contest_standings, contest_rows)
+        n_matches, n_bets = self.db.archive_season(season_id, standings)
+        logging.info(f"Season {season_id} archived: {n_matches} matches, {n_bets} bets.")
+
+    def restore(self, season_id: int) -> bool:
+        """
+        Moves the archived season's matches and bets back to the hot tables.
+        :return: True if the season was restored, False if it isn't archived.
+        """
+        archive = self.db.get_season_archive(season_id)
+        if not archive or archive['restored_at']:
+            return False
+        self.db.restore_season(season_id)
+        logging.info(f"Season {season_id} restored from the archive.")
+        return True
+
+    def standings(self, season_id: int) -> list[dict]:
+        """Returns final standings of the archived season's bet contests ordered by contest and position."""
+        return self.db.get_season_standings(season_id)
@@ -0,0 +1,98 @@
+import functools
+import os
+from dataclasses import dataclass
+from typing import Mapping
+
+
+def _to_int(value: str | None) -> int | None:
+    return int(value) if value else None
+
+
+def _to_bool(value: str | None) -> bool:
+    return (value or '').lower() in ('1', 'true', 'yes')
+
+
+@dataclass(frozen=True)
+class Settings:
+    """All the settings the bot takes from environment variables and the .env file."""
+    telegram_token: str | None = None
+    admin_id: int | None = None
+    test_account_id: int | None = None
+    env_type: str | None = None
+
+    mysql_host: str | None = None
+    mysql_username: str | None = None
+    mysql_password: str | None = None
+    mysql_db_name: str | None = None
+    mysql_port: str | None = None
+
+    stats_api_key: str | None = None
+
+    bot_update_mode: str = 'polling'  # 'polling' or 'webhook'
+    webhook_url: str | None = None
+    webhook_listen_host: str = '0.0.0.0'
+    webhook_listen_port: int = 8443
+    webhook_secret: str | None = None
+
+    worker_processes: int = 0  # processes for scoring and rendering, 0 to do it in the bot process
+
+    metrics_port: int | None = None
+    metrics_file: str | None = None
+
+    db_query_profiling: bool = False
+    db_slow_query_ms: float = 100
+    db_n_plus_one_threshold: int = 5
+
+    log_file: str | None = None
+    log_format: str = 'text'  # 'text' or 'json'
+    log_level: str = 'INFO'
+    log_rotate_when: str | None = None  # e.g. 'midnight' to rotate by time instead of size
+
+    @classmethod
+    def from_env(cls, env: Mapping[str, str]) -> 'Settings':
+        """
+        Parses settings from environment variables. Missing variables get the default values.
+        :param env: Environment variables, e.g. os.environ.
+        """
+        default = cls()
+        return cls(
+            telegram_token=env.get('TELEGRAM_TOKEN'),
+            admin_id=_to_int(env.get('ADMIN_ID')),
+            test_account_id=_to_int(env.get('TEST_ACCOUNT_ID')),
+            env_type=env.get('ENV_TYPE'),
+            mysql_host=env.get('MYSQL_DB_HOST'),
+            mysql_username=env.get('MYSQL_DB_USERNAME'),
+            mysql_password=env.get('MYSQL_DB_PASSWORD'),
+            mysql_db_name=env.get('MYSQL_DB_NAME'),
+            mysql_port=env.get('MYSQL_DB_PORT'),
+            stats_api_key=env.get('STATS_API_KEY'),
+            bot_update_mode=env.get('BOT_UPDATE_MODE') or default.bot_update_mode,
+            webhook_url=env.get('WEBHOOK_URL'),
+            webhook_listen_host=env.get('WEBHOOK_LISTEN_HOST') or default.webhook_listen_host,
+            webhook_listen_port=_to_int(env.get('WEBHOOK_LISTEN_PORT')) or default.webhook_listen_port,
+            webhook_secret=env.get('WEBHOOK_SECRET'),
+            worker_processes=_to_int(env.get('WORKER_PROCESSES')) or default.worker_processes,
+            metrics_port=_to_int(env.get('METRICS_PORT')),
+            metrics_file=env.get('METRICS_FILE'),
+            db_query_profiling=_to_bool(env.get('DB_QUERY_PROFILING')),
+            db_slow_query_ms=float(env.get('DB_SLOW_QUERY_MS') or default.db_slow_query_ms),
+            db_n_plus_one_threshold=int(env.get('DB_N_PLUS_ONE_THRESHOLD') or default.db_n_plus_one_threshold),
+            log_file=env.get('LOG_FILE'),
+            log_format=(env.get('LOG_FORMAT') or default.log_format).lower(),
+            log_level=(env.get('LOG_LEVEL') or default.log_level).upper(),
+            log_rotate_when=env.get('LOG_ROTATE_WHEN'),
+        )
+
+
+@functools.cache
+def load_env() -> None:
+    """Loads variables from the .env file into the environment. Only the first call reads the file."""
+    from dotenv import load_dotenv
+    load_dotenv()
+
+
+@functools.cache
+def get_settings() -> Settings:
+    """Returns the settings parsed from the environment and the .env file on the first call."""
+    load_env()
+    return Settings.from_env(os.environ)
@@ -1,25 +1,27 @@
 import datetime
 import logging
-import requests
 from pytz import timezone
 from urllib.parse import urljoin
 
-from utils import get_from_env, init_logging
-from config import PREFERRED_TIMEZONE
+from settings import get_settings
+from utils import init_logging, lazy_import
+from config import PREFERRED_TIMEZONE, FINISHED_MATCH_STATUSES
 from db import Database
 from leagues import League
+import metrics
+
+requests = lazy_import('requests')
 
 STATS_API_BASE_URL = 'https://api-football-beta.p.rapidapi.com'
 STATS_API_HOST = 'api-football-beta.p.rapidapi.com'
-HEADERS = {"X-RapidAPI-Host": STATS_API_HOST, "X-RapidAPI-Key": get_from_env("STATS_API_KEY")}
-
-init_logging()
+HEADERS = {"X-RapidAPI-Host": STATS_API_HOST, "X-RapidAPI-Key": get_settings().stats_api_key}
 
 
 class StatsAPIHandler:
     def __init__(self, db):
         self.db = db
         self.timezone = timezone(PREFERRED_TIMEZONE)
+        self.quota_remaining: int | None = None  # requests left for today as reported by the last response
 
     def _make_request(self, endpoint: str, params: dict[str, str | int] = None) -> dict | None:
         """
@@ -54,6 +56,11 @@ class StatsAPIHandler:
 
         # logging.info(f"Requesting {request_url} with params: {params}...")
         response = requests.get(request_url, headers=HEADERS, params=params)
+        metrics.STATS_API_REQUESTS.inc(endpoint=endpoint, status=response.status_code)
+        quota_remaining = response.headers.get('x-ratelimit-requests-remaining')
+        if quota_remaining is not None:
+            self.quota_remaining = int(quota_remaining)
+            metrics.STATS_API_QUOTA_REMAINING.set(self.quota_remaining)
 
         if not response.ok:
             logging.error('BAD RESPONSE.')
@@ -89,6 +96,22 @@ class StatsAPIHandler:
         valuable_data = response['response'][0]
         return valuable_data
 
+    def get_finished_match_scores(self, league_api_id: int, year: int) -> dict[int, str]:
+        """
+        Returns final scores of the season's finished matches fetched from Stats API, including the ones decided in
+        extra time or on penalties.
+        :param league_api_id: API ID of the league.
+        :param year: The year the season starts in.
+        :return: A dict of match_api_id: score pairs, e.g. {1052: '2-1'}. Empty if the request failed.
+        """
+        response = self._make_request(
+            endpoint='fixtures',
+            params={'league': league_api_id, 'season': year, 'status': '-'.join(FINISHED_MATCH_STATUSES)}
+        )
+        if not response:
+            return {}
+        return {f['fixture']['id']: f"{f['goals']['home']}-{f['goals']['away']}" for f in response['response']}
+
     def _get_league_teams(self, league_api_id: int, year: int) -> list:
         response = self._make_request(
             endpoint='teams',
@@ -107,6 +130,7 @@ class StatsAPIHandler:
 
 
 if __name__ == '__main__':
+    init_logging()
     db = Database()
     s = StatsAPIHandler(db)
     season_data = s.get_this_season_data('Russia', 'Premier League')
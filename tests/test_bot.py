@@ -0,0 +1,151 @@
+import json
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+import telebot
+
+import loadgen  # sets the environment a bot can be created in
+import metrics
+from callback_router import encode_callback_data
+from embedded_db import EmbeddedDatabase, seed_demo_data
+from flood_control import FloodLimiter
+
+
+class _BlockingTelegramAPI(loadgen.FakeTelegramAPI):
+    """Answers messages to one chat as if its user has blocked the bot."""
+
+    def __init__(self, blocking_chat_id: int):
+        super().__init__()
+        self.blocking_chat_id = blocking_chat_id
+
+    def __call__(self, method: str, url: str, params: dict = None, **kwargs):
+        if url.endswith('sendMessage') and int(params['chat_id']) == self.blocking_chat_id:
+            result = {'ok': False, 'error_code': 403, 'description': 'Forbidden: bot was blocked by the user'}
+            return mock.Mock(status_code=403, reason='Forbidden', text=json.dumps(result), json=lambda: result)
+        return super().__call__(method, url, params, **kwargs)
+
+
+class _RecordingTelegramAPI(loadgen.FakeTelegramAPI):
+    """Records telegram API calls."""
+
+    def __init__(self):
+        super().__init__()
+        self.calls: list[tuple[str, dict]] = []  # (API method, params)
+
+    def __call__(self, method: str, url: str, params: dict = None, **kwargs):
+        self.calls.append((url.rsplit('/', 1)[-1], params or {}))
+        return super().__call__(method, url, params, **kwargs)
+
+    def params(self, api_method: str) -> list[dict]:
+        return [params for called, params in self.calls if called == api_method]
+
+    @property
+    def texts(self) -> list[str]:
+        return [params['text'] for params in self.params('sendMessage')]
+
+
+class BetBotTest(unittest.TestCase):
+
+    def setUp(self):
+        telebot.apihelper.CUSTOM_REQUEST_SENDER = loadgen.FakeTelegramAPI()
+        self.addCleanup(setattr, telebot.apihelper, 'CUSTOM_REQUEST_SENDER', None)
+        self.db = EmbeddedDatabase()
+        self.addCleanup(self.db.drop)
+        seed_demo_data(self.db, n_users=3, n_rounds=1, matches_per_round=2)
+        self.bot = loadgen.create_bot(self.db).bot
+        self.factory = loadgen.UpdateFactory()
+
+    def _updates(self, *updates: dict) -> list[telebot.types.Update]:
+        return [telebot.types.Update.de_json(u) for u in updates]
+
+    def test_watermark_advances_past_updates_dropped_by_flood_limiter(self):
+        self.bot._flood_limiter = FloodLimiter(burst=1, refill_rate=.001)
+        updates = self._updates(*(self.factory.message(loadgen.FIRST_USER_ID, '/help') for _ in range(5)))
+        self.bot.process_new_updates(updates)
+        self.bot._dispatcher.stop(wait=True)
+        self.bot._flood_warnings.shutdown()
+        self.assertEqual(self.bot._dedup.watermark, updates[-1].update_id)
+        self.assertFalse(self.bot._dedup._processed)
+
+    def test_broadcast_marks_recipients_unblocked_with_one_query(self):
+        recipients = [loadgen.FIRST_USER_ID + i for i in range(3)]
+        updates_before = metrics.DB_QUERIES.value(kind='UPDATE')
+        self.bot.broadcast(recipients, ['a', 'b'])
+        self.assertEqual(metrics.DB_QUERIES.value(kind='UPDATE') - updates_before, 1)
+
+    def test_broadcast_keeps_blocked_flag_of_users_who_blocked_the_bot(self):
+        recipients = [loadgen.FIRST_USER_ID + i for i in range(3)]
+        blocking_id = recipients[1]
+        telebot.apihelper.CUSTOM_REQUEST_SENDER = _BlockingTelegramAPI(blocking_id)
+        self.bot.broadcast(recipients, ['a', 'b'])
+        self.assertTrue(self.db.get_user(blocking_id).blocked_bot)
+        self.assertFalse(self.db.get_user(recipients[0]).blocked_bot)
+        self.assertFalse(self.db.get_user(recipients[2]).blocked_bot)
+
+
+class BetInputTest(unittest.TestCase):
+
+    def setUp(self):
+        self.api = _RecordingTelegramAPI()
+        telebot.apihelper.CUSTOM_REQUEST_SENDER = self.api
+        self.addCleanup(setattr, telebot.apihelper, 'CUSTOM_REQUEST_SENDER', None)
+        self.db = EmbeddedDatabase()
+        self.addCleanup(self.db.drop)
+        seed_demo_data(self.db, n_users=3, n_rounds=3, matches_per_round=2)  # round 3 starts in a week
+        self.bot = loadgen.create_bot(self.db).bot
+        self.factory = loadgen.UpdateFactory()
+
+    def _send(self, update: dict) -> None:
+        self.bot._process_update(telebot.types.Update.de_json(update))
+
+    def _start_bets(self, bot=None) -> None:
+        (bot or self.bot)._process_update(telebot.types.Update.de_json(
+            self.factory.callback(loadgen.FIRST_USER_ID, encode_callback_data('start_bets'))))
+
+    def _kick_off_round(self, round: int) -> None:
+        with self.db:
+            self.db.cur.execute('UPDATE matches SET start_datetime = %s WHERE round = %s',
+                                (datetime.now() - timedelta(minutes=1), round))
+
+    def test_session_offers_next_open_round(self):
+        self._start_bets()
+        session = self.bot._active_sessions[loadgen.FIRST_USER_ID]
+        self.assertEqual((session.league_api_id, session.round), (235, 3))
+        self.assertEqual(session.matches, ('Team 1 - Team 2', 'Team 3 - Team 4'))
+
+    def test_bets_are_refused_once_round_kicks_off_without_lock_job(self):
+        self._start_bets()
+        deadline = self.bot._active_sessions[loadgen.FIRST_USER_ID].deadline
+        with mock.patch('bot.datetime', wraps=datetime) as clock:
+            clock.now.return_value = deadline + timedelta(minutes=1)
+            self._send(self.factory.message(loadgen.FIRST_USER_ID, '2-1'))
+        self.assertNotIn(loadgen.FIRST_USER_ID, self.bot._active_sessions)
+        self.assertIn('Приём ставок закрыт', self.api.texts[-1])
+
+    def test_started_round_stays_closed_after_restart(self):
+        self._kick_off_round(3)
+        restarted = loadgen.create_bot(self.db).bot
+        self._start_bets(restarted)
+        self.assertNotIn(loadgen.FIRST_USER_ID, restarted._active_sessions)
+        self.assertEqual(self.api.texts[-1], 'Сейчас нет тура, открытого для ставок.')
+
+    def _press_score_button(self, match_id: int) -> None:
+        self._send(self.factory.callback(loadgen.FIRST_USER_ID, encode_callback_data('bet', match_id, 2, 1)))
+
+    def test_button_for_another_match_is_refused(self):
+        self._start_bets()
+        session = self.bot._active_sessions[loadgen.FIRST_USER_ID]
+        self.assertEqual(session.match_id, 300)
+        self._press_score_button(301)  # e.g. left on a message of an earlier session
+        self.assertEqual(session.match_id, 300)
+        self.assertEqual(self.api.params('answerCallbackQuery')[-1]['text'], 'Эта ставка уже неактуальна.')
+        self._press_score_button(300)
+        self.assertEqual(session.match_id, 301)
+
+    def test_score_buttons_are_removed_once_bet_is_accepted(self):
+        self._start_bets()
+        request_message_id = self.bot._active_sessions[loadgen.FIRST_USER_ID].request_message_id
+        self._send(self.factory.message(loadgen.FIRST_USER_ID, '2-1'))
+        edited = [int(p['message_id']) for p in self.api.params('editMessageReplyMarkup')]
+        self.assertIn(request_message_id, edited)
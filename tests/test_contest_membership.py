@@ -0,0 +1,38 @@
+import unittest
+
+import loadgen  # sets the environment the bot module can be imported in
+from bot import BetBot
+from contest_membership import ContestMembershipIndex
+from embedded_db import EmbeddedDatabase, seed_demo_data
+from request_context import RequestContext
+
+
+class ContestMembershipTest(unittest.TestCase):
+
+    def setUp(self):
+        self.db = EmbeddedDatabase()
+        self.addCleanup(self.db.drop)
+
+    def _allowed(self, membership: ContestMembershipIndex, telegram_id: int) -> bool:
+        context = RequestContext(telegram_id=telegram_id, db=self.db, session=None, membership=membership)
+        return BetBot._user_allowed(context)
+
+    def test_stored_users_are_backfilled_into_latest_contest_on_upgrade(self):
+        seed_demo_data(self.db, n_users=3, n_rounds=1, matches_per_round=1)
+        with self.db:
+            self.db.cur.execute('DROP TABLE bet_contest_users')  # the state before contests had participants
+        upgraded = EmbeddedDatabase(self.db._filepath)  # creates the table on start
+        membership = ContestMembershipIndex(upgraded)
+        self.assertEqual(membership.contest_ids(loadgen.FIRST_USER_ID), frozenset({1}))
+        self.assertTrue(self._allowed(membership, loadgen.FIRST_USER_ID))
+        self.assertFalse(self._allowed(membership, loadgen.STRANGER_ID_OFFSET))
+
+    def test_removed_participants_are_not_readmitted_on_reload(self):
+        seed_demo_data(self.db, n_users=3, n_rounds=1, matches_per_round=1)
+        membership = ContestMembershipIndex(self.db)
+        for telegram_id in membership.members(1):
+            membership.leave(1, telegram_id)
+        membership.reload()
+        self.assertFalse(self._allowed(membership, loadgen.FIRST_USER_ID))
+        restarted = ContestMembershipIndex(EmbeddedDatabase(self.db._filepath))
+        self.assertFalse(self._allowed(restarted, loadgen.FIRST_USER_ID))
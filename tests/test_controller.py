@@ -0,0 +1,81 @@
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+import telebot
+
+import config
+import loadgen  # sets the environment a bot can be created in
+import scoring
+from embedded_db import EmbeddedDatabase, seed_demo_data
+
+
+class MatchResultsSyncTest(unittest.TestCase):
+
+    def setUp(self):
+        telebot.apihelper.CUSTOM_REQUEST_SENDER = loadgen.FakeTelegramAPI()
+        self.addCleanup(setattr, telebot.apihelper, 'CUSTOM_REQUEST_SENDER', None)
+        self.db = EmbeddedDatabase()
+        self.addCleanup(self.db.drop)
+        seed_demo_data(self.db, n_users=3, n_rounds=2, matches_per_round=2)
+        self._set_match(100, score=None, start_datetime=datetime.now() - timedelta(hours=2))
+        self.controller = loadgen.create_bot(self.db).controller
+        self.controller.sah = mock.Mock(quota_remaining=None)
+        self.controller.sah.get_finished_match_scores.return_value = {100: '5-0', 101: '1-2'}
+
+    def _set_match(self, api_id: int, **columns) -> None:
+        with self.db:
+            self.db.cur.execute(f"UPDATE matches SET {', '.join(f'{c} = %s' for c in columns)} WHERE api_id = %s",
+                                (*columns.values(), api_id))
+
+    def test_synced_scores_are_stored_and_contest_views_refreshed(self):
+        table = self.controller.views.table(1)
+        self.controller.sync_match_results()
+        self.controller.sah.get_finished_match_scores.assert_called_once()
+        self.assertEqual(self.db.get_match_scores(235)[100], '5-0')
+        self.assertNotEqual(self.controller.views.table(1), table)
+
+    def test_nothing_is_fetched_when_every_kicked_off_match_has_a_score(self):
+        self._set_match(100, score='0-0')
+        self._set_match(200, score='0-0')
+        self.controller.sync_match_results()
+        self.controller.sah.get_finished_match_scores.assert_not_called()
+
+    def test_long_unscored_and_postponed_matches_are_not_waited_for(self):
+        self._set_match(100, start_datetime=datetime.now() - timedelta(hours=config.RESULTS_SYNC_LOOKBACK_HOURS + 1))
+        self._set_match(200, status_short='PST')
+        self.controller.sync_match_results()
+        self.controller.sah.get_finished_match_scores.assert_not_called()
+
+    def test_sync_stops_when_stats_api_quota_runs_low(self):
+        self.controller.sah.quota_remaining = config.RESULTS_SYNC_MIN_QUOTA
+        self.controller.sync_match_results()
+        self.controller.sah.get_finished_match_scores.assert_not_called()
+
+    def test_synced_scores_are_diffed_inline(self):
+        pool = self.controller.worker_pool
+        with mock.patch.object(pool, 'run', wraps=pool.run) as run:
+            self.controller.sync_match_results()
+        self.assertNotIn(scoring.diff_scores, [c.args[0] for c in run.call_args_list])
+        self.assertEqual(self.db.get_match_scores(235)[100], '5-0')
+
+
+class ContestCreationTest(unittest.TestCase):
+
+    def setUp(self):
+        telebot.apihelper.CUSTOM_REQUEST_SENDER = loadgen.FakeTelegramAPI()
+        self.addCleanup(setattr, telebot.apihelper, 'CUSTOM_REQUEST_SENDER', None)
+        self.db = EmbeddedDatabase()
+        self.addCleanup(self.db.drop)
+        self.controller = loadgen.create_bot(self.db).controller
+        self.controller.bot.notify_admin = mock.Mock()
+
+    def test_admin_is_notified_when_contest_creation_is_rolled_back(self):
+        admin = mock.Mock(telegram_id=loadgen.FIRST_USER_ID)
+        failing_insert = lambda bc: self.db.insert_bet_contest({'no_such_column': 1})  # the error is caught inside
+        with mock.patch('controller.BetContest'), \
+                mock.patch.object(self.controller, '_insert_bet_contest', side_effect=failing_insert):
+            self.assertIsNone(self.controller._create_bet_contest(mock.Mock(), admin))
+        last_notification = self.controller.bot.notify_admin.call_args.args[0]
+        self.assertIn('Соревнование не создано', last_notification)
+        self.assertFalse(self.controller.bot.membership.contest_ids(loadgen.FIRST_USER_ID))
@@ -0,0 +1,91 @@
+import unittest
+from datetime import datetime, timedelta
+
+import metrics
+from db import TransactionRolledBack
+from embedded_db import EmbeddedDatabase, seed_demo_data
+
+
+class DatabaseTest(unittest.TestCase):
+
+    def setUp(self):
+        self.db = EmbeddedDatabase()
+        seed_demo_data(self.db, n_users=5, n_rounds=1, matches_per_round=2)
+
+    def tearDown(self):
+        self.db.drop()
+
+    def test_method_latency_is_recorded(self):
+        before = metrics.DB_METHOD_LATENCY.stats().get((('method', 'get_users'),))
+        count_before = before.count if before else 0
+        self.db.get_users()
+        after = metrics.DB_METHOD_LATENCY.stats()[(('method', 'get_users'),)]
+        self.assertEqual(after.count, count_before + 1)
+
+    def _add_next_season(self) -> int:
+        """Adds the league's next season with a single round 1 match and a bet on it. Returns the season's ID."""
+        with self.db:
+            self.db.cur.execute('SELECT end_date FROM seasons WHERE id = 1')
+            start = datetime.fromisoformat(str(self.db.cur.fetchone()['end_date'])) + timedelta(days=1)
+            self.db.cur.execute('INSERT INTO seasons (league_api_id, year, end_year, start_date, end_date, active) '
+                                'VALUES (%s, %s, %s, %s, %s, 0)',
+                                (235, start.year, start.year + 1, start.date(), (start + timedelta(weeks=4)).date()))
+            season_id = self.db.cur.lastrowid
+            self.db.cur.execute('INSERT INTO matches (api_id, league_api_id, start_datetime, round, home_team_id, '
+                                'away_team_id) VALUES (%s, %s, %s, %s, %s, %s)',
+                                (900, 235, start + timedelta(hours=12), 1, 1, 2))
+            self.db.cur.execute('INSERT INTO bets (match_id, user_id, bet) VALUES (%s, %s, %s)', (900, 1, '1-0'))
+        return season_id
+
+    def test_rounds_of_different_seasons_are_not_merged(self):
+        season_id = self._add_next_season()
+        deadlines = self.db.get_round_deadlines(after=datetime.now())
+        self.assertEqual([(d['season_id'], d['round']) for d in deadlines], [(season_id, 1)])
+        self.assertEqual({r['match_id'] for r in self.db.get_round_bets(season_id, 1)}, {900})
+        self.assertNotIn(900, {r['match_id'] for r in self.db.get_round_bets(1, 1)})
+
+
+class TransactionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.db = EmbeddedDatabase()
+        self.addCleanup(self.db.drop)
+
+    def _insert_team(self, api_id: int) -> None:
+        with self.db:
+            self.db.cur.execute('INSERT INTO teams (api_id, name) VALUES (%s, %s)', (api_id, f'Team {api_id}'))
+
+    def _stored_teams(self) -> set[int]:
+        """Reads teams through a connection of its own, so uncommitted changes aren't seen."""
+        other = EmbeddedDatabase(self.db._filepath)
+        with other:
+            other.cur.execute('SELECT api_id FROM teams')
+            return {d['api_id'] for d in other.cur.fetchall()}
+
+    def test_nested_blocks_share_one_connection_and_commit_together(self):
+        with self.db.transaction():
+            conn = self.db.conn
+            self._insert_team(1)
+            with self.db:
+                self.assertIs(self.db.conn, conn)
+            self._insert_team(2)
+            self.assertEqual(self._stored_teams(), set())
+        self.assertEqual(self._stored_teams(), {1, 2})
+        self.assertIsNone(self.db.conn)
+
+    def test_failed_inner_block_rolls_back_the_transaction(self):
+        with self.assertRaises(ValueError):
+            with self.db.transaction():
+                self._insert_team(1)
+                with self.db:
+                    raise ValueError('inner block failed')
+        self.assertEqual(self._stored_teams(), set())
+
+    def test_error_caught_inside_a_method_rolls_back_the_transaction(self):
+        with self.assertRaises(TransactionRolledBack):
+            with self.db.transaction():
+                self._insert_team(1)
+                self.assertIsNone(self.db.insert_bet_contest({'no_such_column': 1}))  # logs its error and returns
+        self.assertEqual(self._stored_teams(), set())
+        self._insert_team(2)  # the next transaction starts clean
+        self.assertEqual(self._stored_teams(), {2})
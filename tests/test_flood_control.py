@@ -0,0 +1,32 @@
+import unittest
+from unittest import mock
+
+from flood_control import FloodLimiter
+
+
+class FloodLimiterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 0.
+        patcher = mock.patch('flood_control.time.monotonic', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.limiter = FloodLimiter(burst=2, refill_rate=1., warning_cooldown=60)
+
+    def test_burst_then_drop(self):
+        self.assertEqual(self.limiter.allow(1), (True, False))
+        self.assertEqual(self.limiter.allow(1), (True, False))
+        self.assertEqual(self.limiter.allow(1), (False, True))
+        self.assertEqual(self.limiter.allow(1), (False, False))
+        self.assertEqual(self.limiter.allow(2), (True, False))  # buckets are per user
+
+    def test_warns_once_per_cooldown_while_flooding(self):
+        warnings = 0
+        for _ in range(120):  # 2 updates per second for a minute, every refilled token is used right away
+            self.now += .5
+            allowed, warn = self.limiter.allow(1)
+            warnings += warn
+        self.assertEqual(warnings, 1)
+        self.now += 60
+        self.limiter.allow(1), self.limiter.allow(1)
+        self.assertEqual(self.limiter.allow(1), (False, True))
@@ -0,0 +1,32 @@
+import unittest
+
+from notifications import AdminNotifier
+from views import MAX_MESSAGE_LENGTH
+
+
+class AdminNotifierTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sent = []
+        self.notifier = AdminNotifier(send=self.sent.append, digest_interval=3600)
+
+    def test_long_digest_is_split_between_notifications(self):
+        texts = [f"<b>Ошибка {i}</b>: {'x' * 200} &amp; {'y' * 50}" for i in range(40)]
+        for text in texts:
+            self.notifier.notify(text)
+        self.notifier.stop()
+
+        self.assertGreater(len(self.sent), 1)
+        for message in self.sent:
+            self.assertLessEqual(len(message), MAX_MESSAGE_LENGTH)
+            self.assertEqual(message.count('<b>'), message.count('</b>'))
+        self.assertTrue(all(any(text in message for message in self.sent) for text in texts))
+
+    def test_too_long_notification_is_sent_as_plain_text(self):
+        self.notifier.notify('<b>Ошибка</b> ' + '&lt;' * MAX_MESSAGE_LENGTH, critical=True)
+        self.notifier.stop()
+
+        message, = self.sent
+        self.assertLessEqual(len(message), MAX_MESSAGE_LENGTH)
+        self.assertNotIn('<b>', message)
+        self.assertTrue(message.endswith('&lt;...'))
@@ -0,0 +1,50 @@
+import json
+import unittest
+from datetime import datetime
+from unittest import mock
+
+import telebot
+
+import loadgen  # sets the environment a bot can be created in
+from embedded_db import EmbeddedDatabase, seed_demo_data
+from round_deadlines import RoundDeadlineService
+from users import User
+
+
+class _FailingTelegramAPI(loadgen.FakeTelegramAPI):
+    """Fails to deliver messages to one chat with a telegram error, records delivered ones."""
+
+    def __init__(self, failing_chat_id: int):
+        super().__init__()
+        self.failing_chat_id = failing_chat_id
+        self.delivered = []
+
+    def __call__(self, method: str, url: str, params: dict = None, **kwargs):
+        if url.endswith('sendMessage'):
+            chat_id = int(params['chat_id'])
+            if chat_id == self.failing_chat_id:
+                return mock.Mock(status_code=400, reason='Bad Request',
+                                 text=json.dumps({'ok': False, 'error_code': 400, 'description': 'Bad Request'}))
+            self.delivered.append(chat_id)
+        return super().__call__(method, url, params, **kwargs)
+
+
+class RoundDeadlineServiceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.db = EmbeddedDatabase()
+        self.addCleanup(self.db.drop)
+        seed_demo_data(self.db, n_users=3, n_rounds=1, matches_per_round=1)
+        self.api = _FailingTelegramAPI(failing_chat_id=loadgen.FIRST_USER_ID)
+        telebot.apihelper.CUSTOM_REQUEST_SENDER = self.api
+        self.addCleanup(setattr, telebot.apihelper, 'CUSTOM_REQUEST_SENDER', None)
+        self.bot = loadgen.create_bot(self.db).bot
+
+    def test_failed_reminder_doesnt_stop_the_others(self):
+        recipients = [loadgen.FIRST_USER_ID + i for i in range(3)]
+        users = [User(telegram_id=telegram_id, created_at=datetime.now()) for telegram_id in recipients]
+        service = RoundDeadlineService(bot=self.bot, db=self.db, scheduler=mock.Mock())
+        self.api.delivered.clear()
+        with mock.patch.object(self.db, 'get_users_without_bets', return_value=users):
+            service.remind(season_id=1, league_api_id=235, round=1, deadline=datetime.now())
+        self.assertEqual(self.api.delivered, recipients[1:])
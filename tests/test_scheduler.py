@@ -0,0 +1,37 @@
+import unittest
+from datetime import datetime, timedelta
+
+from embedded_db import EmbeddedDatabase
+from scheduler import BotScheduler
+
+
+def _job(*args):
+    pass
+
+
+class BotSchedulerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.db = EmbeddedDatabase()
+        self.addCleanup(self.db.drop)
+
+    def _start(self) -> BotScheduler:
+        scheduler = BotScheduler(self.db)
+        scheduler.start(paused=True)
+        self.addCleanup(lambda: scheduler.running and scheduler.shutdown(wait=False))
+        return scheduler
+
+    def test_persistent_job_survives_restart(self):
+        job_dt = datetime.now() + timedelta(days=1)
+        scheduler = self._start()
+        scheduler.schedule(_job, job_dt, job_id='persistent', args=(1,), persistent=True)
+        scheduler.schedule(_job, job_dt, job_id='in_memory', args=(2,))
+        scheduler.shutdown(wait=False)
+
+        restarted = self._start()
+        self.assertEqual(restarted.get_job('persistent').args, (1,))
+        self.assertIsNone(restarted.get_job('in_memory'))
+
+    def test_persistent_job_requires_an_id(self):
+        with self.assertRaises(ValueError):
+            self._start().schedule(_job, datetime.now() + timedelta(days=1), persistent=True)
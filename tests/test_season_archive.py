@@ -0,0 +1,38 @@
+import unittest
+
+from embedded_db import EmbeddedDatabase, seed_demo_data
+from season_archive import SeasonArchiver
+
+
+class SeasonArchiverTest(unittest.TestCase):
+
+    def setUp(self):
+        self.db = EmbeddedDatabase()
+        self.addCleanup(self.db.drop)
+        seed_demo_data(self.db, n_users=3, n_rounds=2, matches_per_round=2)
+        with self.db:
+            self.db.cur.execute('UPDATE seasons SET finished = 1')
+        self.archiver = SeasonArchiver(self.db)
+
+    def _hot_bets(self) -> int:
+        return sum(1 for _ in self.db.iter_bets(as_tuples=True))
+
+    def test_restored_season_is_not_archived_again_by_scheduled_run(self):
+        n_bets = self._hot_bets()
+        self.assertEqual(self.archiver.archive_finished(), [1])
+        self.assertEqual(self._hot_bets(), 0)
+
+        self.assertTrue(self.archiver.restore(1))
+        self.assertEqual(self._hot_bets(), n_bets)
+
+        self.assertEqual(self.archiver.archive_finished(), [])  # the daily job
+        self.assertEqual(self._hot_bets(), n_bets)
+        self.assertFalse(self.archiver.restore(1))
+
+    def test_restored_season_can_be_archived_by_hand(self):
+        self.archiver.archive_finished()
+        self.archiver.restore(1)
+        self.archiver.archive(1)
+        self.assertEqual(self._hot_bets(), 0)
+        self.assertIsNone(self.db.get_season_archive(1)['restored_at'])
+        self.assertTrue(self.archiver.restore(1))
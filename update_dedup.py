@@ -0,0 +1,104 @@
+import heapq
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+import config
+
+
+class UpdateDeduplicator:
+    """
+    Detects updates telegram delivers more than once, e.g. after the bot restarts or a webhook response times out.
+
+    The watermark is the id up to which all accepted updates have been processed. It is saved to the db at most every
+    config.UPDATE_WATERMARK_SAVE_INTERVAL seconds and on stop. On start it is loaded back: polling resumes right after
+    it and updates with ids up to it are replays. Replays within a run are caught by a bounded set of recently accepted
+    update and callback query ids. Both checks are in-memory lookups done before any filter or db work.
+    """
+
+    def __init__(self, db, max_recent: int = config.UPDATE_DEDUP_SIZE):
+        """
+        :param db: Database instance.
+        :param max_recent: Number of recently accepted update and callback query ids remembered.
+        """
+        self.db = db
+        self._max_recent = max_recent
+        self._recent: dict[tuple[str, int | str], None] = {}  # an insertion ordered set, the oldest ids go first
+        self._floor = 0  # updates up to this id were processed before the restart
+        self._watermark = 0
+        self._max_accepted = 0
+        self._in_progress: list[int] = []  # a heap of ids of accepted updates
+        self._processed: set[int] = set()  # ids of processed updates that are still in self._in_progress
+        self._saved_watermark = 0
+        self._saved_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def watermark(self) -> int:
+        return self._watermark
+
+    def load(self) -> int:
+        """
+        Loads the watermark saved by the previous run. It is ignored if it's too old, as telegram may have restarted
+        update ids since then.
+        :return: The watermark, 0 if there is none.
+        """
+        stored = self.db.get_update_watermark()
+        if not stored:
+            return 0
+        if datetime.now() - stored['saved_at'] > timedelta(days=config.UPDATE_WATERMARK_TTL_DAYS):
+            logging.info(f"Update id watermark {stored['last_update_id']} saved at {stored['saved_at']} has expired.")
+            return 0
+        with self._lock:
+            self._floor = self._watermark = self._max_accepted = self._saved_watermark = stored['last_update_id']
+        logging.info(f"Update id watermark loaded: {self._watermark}.")
+        return self._watermark
+
+    def accept(self, update) -> bool:
+        """
+        Registers the update as being processed unless it is a replay.
+        :param update: An update received from telegram.
+        :return: False if the update has already been accepted and must be skipped.
+        """
+        keys = [('update', update.update_id)]
+        if update.callback_query:
+            keys.append(('callback_query', update.callback_query.id))
+        with self._lock:
+            if update.update_id <= self._floor or any(key in self._recent for key in keys):
+                return False
+            for key in keys:
+                self._recent[key] = None
+            while len(self._recent) > self._max_recent:
+                del self._recent[next(iter(self._recent))]
+            heapq.heappush(self._in_progress, update.update_id)
+            self._max_accepted = max(self._max_accepted, update.update_id)
+        return True
+
+    def done(self, update_id: int) -> None:
+        """Marks the accepted update as processed and saves the advanced watermark if it's time to."""
+        with self._lock:
+            self._processed.add(update_id)
+            while self._in_progress and self._in_progress[0] in self._processed:
+                self._processed.discard(heapq.heappop(self._in_progress))
+            self._watermark = self._in_progress[0] - 1 if self._in_progress else self._max_accepted
+            save_due = (self._watermark > self._saved_watermark
+                        and time.monotonic() - self._saved_at >= config.UPDATE_WATERMARK_SAVE_INTERVAL)
+            if save_due:
+                self._saved_at = time.monotonic()  # other threads won't save it at the same time
+        if save_due:
+            self.save()
+
+    def save(self) -> None:
+        """Saves the watermark to the db if it has advanced since the last save."""
+        watermark = self._watermark
+        if watermark <= self._saved_watermark:
+            return
+        try:
+            self.db.set_update_watermark(watermark)
+        except Exception as e:
+            logging.exception(f"Failed to save update id watermark {watermark}: {repr(e)}")
+            return
+        with self._lock:
+            self._saved_watermark = max(self._saved_watermark, watermark)
+            self._saved_at = time.monotonic()
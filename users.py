@@ -1,8 +1,10 @@
-from dataclasses import dataclass, asdict, fields
+from dataclasses import dataclass
 from datetime import datetime
 
+import row_mappers
 
-@dataclass
+
+@dataclass(slots=True)
 class User:
     telegram_id: int
     created_at: datetime  # default value is set in a create table query
@@ -15,19 +17,16 @@ class User:
     last_updated: datetime = None
 
     def to_dict(self) -> dict:
-        # a dict of class_field: field_value pairs
-        fields_dict = {f.name: self.__getattribute__(f.name) for f in fields(self)}
-        # as MySQL stores bool values as 0s and 1s we manually transform bool fields
-        bool_fields = self._get_bool_fields()
-        return {k: (v if k not in bool_fields else int(v)) for k, v in fields_dict.items()}
+        # a dict of class_field: field_value pairs with bool fields as 0s and 1s, as MySQL stores them
+        return row_mappers.dict_dumper(User)(self)
 
     @classmethod
     def from_dict(cls, d: dict) -> 'User':
-        bool_fields = cls._get_bool_fields()
-        # as MySQL stores bool values as 0s and 1s we manually transform bool fields
-        bool_dict = {k: (v if k not in bool_fields else bool(v)) for k, v in d.items()}
-        return User(**bool_dict)
+        return row_mappers.load_dict(cls, d)
 
     @classmethod
-    def _get_bool_fields(cls) -> tuple[str]:
-        return tuple(f.name for f in fields(cls) if f.type == bool)
+    def from_row(cls, columns: tuple[str, ...], row: tuple) -> 'User':
+        return row_mappers.load_row(cls, columns, row)
+
+
+USER_COLUMNS = row_mappers.column_names(User)
@@ -1,17 +1,124 @@
-import os
-from dotenv import load_dotenv
+import atexit
+import copy
+import gzip
+import importlib.util
+import json
 import logging
+import logging.handlers
+import os
+import queue
+import shutil
+import sys
+import types
+
+import config
+from settings import get_settings, load_env
+
+LOG_FORMAT = "%(asctime)s [%(filename)s:%(lineno)d] %(levelname)s - %(message)s"
+LOG_DATE_FORMAT = "%d.%m.%Y %H:%M:%S"
+
+_log_listener: logging.handlers.QueueListener | None = None
 
 
 def get_from_env(var_to_load: str) -> str:
-    load_dotenv()
+    load_env()
     return os.getenv(var_to_load)
 
 
-def init_logging():
-    logging.basicConfig(level=logging.INFO,
-                        filename="MyRPLBetBot.log",
-                        format="%(asctime)s [%(filename)s:%(lineno)d] %(levelname)s - %(message)s",
-                        datefmt="%d.%m.%Y %H:%M:%S",
-                        encoding='UTF-8'
-                        )
+def lazy_import(name: str) -> types.ModuleType:
+    """
+    Returns a module that is actually imported on the first access to its attributes. Keeps heavy dependencies out of
+    the startup of tools that never use them.
+    :param name: Full module name, e.g. 'mysql.connector'.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats log records as single-line JSON objects."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {'time': self.formatTime(record, LOG_DATE_FORMAT), 'level': record.levelname,
+                'file': record.filename, 'line': record.lineno, 'thread': record.threadName,
+                'message': record.getMessage()}
+        if record.exc_text:
+            data['exception'] = record.exc_text
+        return json.dumps(data, ensure_ascii=False)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Keeps a record's message and traceback apart so the file handler's formatter can lay them out."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = self.formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _gzip_rotator(source: str, dest: str) -> None:
+    with open(source, 'rb') as f_in, gzip.open(dest, 'wb') as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+
+def _create_file_handler(filepath: str) -> logging.Handler:
+    """
+    Creates a handler rotating the log file by size or, if LOG_ROTATE_WHEN is set (e.g. 'midnight'), by time.
+    Rotated files are gzipped.
+    """
+    rotate_when = get_settings().log_rotate_when
+    if rotate_when:
+        handler = logging.handlers.TimedRotatingFileHandler(filepath, when=rotate_when,
+                                                            backupCount=config.LOG_BACKUP_COUNT, encoding='UTF-8')
+    else:
+        handler = logging.handlers.RotatingFileHandler(filepath, maxBytes=config.LOG_MAX_BYTES,
+                                                       backupCount=config.LOG_BACKUP_COUNT, encoding='UTF-8')
+    handler.namer = lambda name: f'{name}.gz'
+    handler.rotator = _gzip_rotator
+    return handler
+
+
+def init_logging(log_dir: str = None):
+    """
+    Configures logging of the whole process. Has to be called once by an entry point; repeated calls do nothing.
+
+    Records are put to an in-memory queue and written to the log file by a background thread, so threads handling
+    updates never wait for the disk. Set LOG_FORMAT=json for structured output, LOG_LEVEL to change the level.
+    :param log_dir: Directory config.LOG_FILE is written to instead of the working directory, e.g. a temp directory
+    for tools that aren't the bot. Ignored if LOG_FILE is set.
+    """
+    global _log_listener
+    if _log_listener:
+        return
+
+    settings = get_settings()
+    file_handler = _create_file_handler(settings.log_file or os.path.join(log_dir or '', config.LOG_FILE))
+    if settings.log_format == 'json':
+        file_handler.setFormatter(JsonFormatter())
+    else:
+        file_handler.setFormatter(logging.Formatter(LOG_FORMAT, datefmt=LOG_DATE_FORMAT))
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.setLevel(settings.log_level)
+    queue_handler = _QueueHandler(log_queue)
+    queue_handler.setFormatter(logging.Formatter())
+    root.addHandler(queue_handler)
+
+    _log_listener = logging.handlers.QueueListener(log_queue, file_handler, respect_handler_level=True)
+    _log_listener.start()
+    atexit.register(_log_listener.stop)  # writes out records left in the queue
@@ -0,0 +1,133 @@
+from html import escape
+
+from scoring import bet_points
+
+MAX_MESSAGE_LENGTH = 4096  # telegram's limit for a text message
+
+
+def split_message(blocks: list[str], separator: str = '\n\n') -> list[str]:
+    """
+    Joins text blocks into as few messages as possible without splitting a block between messages.
+    :param blocks: Text blocks, each shorter than MAX_MESSAGE_LENGTH.
+    :param separator: A string to put between blocks.
+    :return: A list of message texts.
+    """
+    messages, current = [], ''
+    for block in blocks:
+        candidate = f'{current}{separator}{block}' if current else block
+        if len(candidate) > MAX_MESSAGE_LENGTH and current:
+            messages.append(current)
+            candidate = block
+        current = candidate
+    if current:
+        messages.append(current)
+    return messages
+
+
+def user_display_name(first_name: str | None, last_name: str | None) -> str:
+    name = ' '.join(n for n in (first_name, last_name) if n)
+    return escape(name or 'Без имени')
+
+
+def match_title(row: dict) -> str:
+    """Returns a match title like 'Зенит - Спартак' from a row with home/away team name columns."""
+    home = row['home_team_ru'] or row['home_team']
+    away = row['away_team_ru'] or row['away_team']
+    return escape(f'{home} - {away}')
+
+
+def render_round_bets(round: int, rows: list[dict]) -> list[str]:
+    """
+    Renders everyone's bets on the round's matches.
+    :param round: Round number.
+    :param rows: Rows returned by Database.get_round_bets() ordered by match.
+    :return: A list of message texts.
+    """
+    blocks = [f'<b>Ставки на тур {round}</b>']
+    match_id, lines = None, []
+    for row in rows:
+        if row['match_id'] != match_id:
+            if lines:
+                blocks.append('\n'.join(lines))
+            match_id, lines = row['match_id'], [f"<b>{match_title(row)}</b>"]
+        lines.append(f"{user_display_name(row['first_name'], row['last_name'])}: {escape(row['bet'])}")
+    if lines:
+        blocks.append('\n'.join(lines))
+    return split_message(blocks)
+
+
+def render_table(standings: list[dict]) -> list[str]:
+    """
+    Renders a contest leaderboard.
+    :param standings: Standings as returned by scoring.build_standings().
+    :return: A list of message texts.
+    """
+    if not standings:
+        return ['<b>Турнирная таблица</b>\n\nРезультатов пока нет.']
+    lines = [f"{i}. {user_display_name(s['first_name'], s['last_name'])} — <b>{s['points']}</b> "
+             f"(точных счетов: {s['exact']})"
+             for i, s in enumerate(standings, start=1)]
+    return split_message(['<b>Турнирная таблица</b>', *lines], separator='\n')
+
+
+def render_round_results(round: int, rows: list[dict]) -> list[str]:
+    """
+    Renders final scores of the round's matches along with everyone's bets and points.
+    :param round: Round number.
+    :param rows: The round's scored bets as returned by Database.get_contest_scored_bets() ordered by match.
+    :return: A list of message texts.
+    """
+    blocks = [f'<b>Результаты тура {round}</b>']
+    match_id, lines = None, []
+    for row in rows:
+        if row['match_id'] != match_id:
+            if lines:
+                blocks.append('\n'.join(lines))
+            match_id, lines = row['match_id'], [f"<b>{match_title(row)} {escape(row['score'])}</b>"]
+        lines.append(f"{user_display_name(row['first_name'], row['last_name'])}: {escape(row['bet'])} "
+                     f"(+{bet_points(row['bet'], row['score'])})")
+    if lines:
+        blocks.append('\n'.join(lines))
+    return split_message(blocks)
+
+
+def render_user_stats(stats: dict | None) -> str:
+    """
+    Renders a user's betting statistics.
+    :param stats: Stats as returned by analytics.ContestAnalytics.user_stats().
+    """
+    if not stats:
+        return '<b>Ваша статистика</b>\n\nРезультатов пока нет.'
+    return (f"<b>Ваша статистика</b>\n\n"
+            f"Ставок: {stats['bets']}\n"
+            f"Угаданных исходов: {stats['hits']} ({stats['hit_rate']:.0%})\n"
+            f"Точных счетов: {stats['exact']}\n"
+            f"Текущая серия угаданных исходов: {stats['current_streak']}\n"
+            f"Лучшая серия: {stats['longest_streak']}\n"
+            f"Любимый счёт: {escape(stats['favourite_score'] or '-')}")
+
+
+def render_analytics(hit_leaders: list[dict], streak_leaders: list[dict], consensus: list[dict],
+                     consensus_accuracy: float | None) -> list[str]:
+    """
+    Renders betting analytics of a contest.
+    :param hit_leaders: Stats of users with the best hit rates.
+    :param streak_leaders: Stats of users with the longest streaks of right outcomes.
+    :param consensus: The crowd's consensus on every match as returned by ContestAnalytics.match_consensus().
+    :param consensus_accuracy: Share of matches whose most frequent bet was the exact final score.
+    :return: A list of message texts.
+    """
+    if not consensus:
+        return ['<b>Аналитика</b>\n\nРезультатов пока нет.']
+    blocks = ['<b>Аналитика</b>',
+              '<b>Лучший процент угаданных исходов</b>\n' + '\n'.join(
+                  f"{user_display_name(s['first_name'], s['last_name'])}: {s['hit_rate']:.0%} "
+                  f"({s['hits']} из {s['bets']})" for s in hit_leaders),
+              '<b>Самые длинные серии</b>\n' + '\n'.join(
+                  f"{user_display_name(s['first_name'], s['last_name'])}: {s['longest_streak']}"
+                  for s in streak_leaders),
+              f"<b>Мнение большинства</b>\nСовпало с точным счётом в {consensus_accuracy:.0%} матчей"]
+    lines = [f"{match_title(c['row'])}: {escape(c['row']['score'])}, большинство — {c['consensus']} "
+             f"({c['share']:.0%}) {'✅' if c['hit'] else '❌'}"
+             for c in consensus]
+    return split_message([*blocks, *split_message(lines, separator='\n')])
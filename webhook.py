@@ -0,0 +1,135 @@
+import json
+import logging
+import queue
+import sys
+import threading
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import telebot
+
+import config
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+class WebhookServer:
+    """
+    An embedded HTTP server receiving telegram updates via webhook.
+
+    Every POSTed update is acknowledged right away and put into a bounded queue served by a pool of worker threads
+    that feed updates to the bot. When the queue is full the server answers 503, so telegram redelivers the update
+    later instead of the server piling up unprocessed updates in memory.
+    """
+
+    def __init__(self, bot: telebot.TeleBot, host: str, port: int, secret_token: str | None = None,
+                 workers: int = config.WEBHOOK_WORKERS, queue_size: int = config.WEBHOOK_QUEUE_SIZE):
+        self.bot = bot
+        self.secret_token = secret_token
+        self._updates: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._workers = [threading.Thread(target=self._work, name=f'WebhookWorker-{i}', daemon=True)
+                         for i in range(workers)]
+        self._httpd = ThreadingHTTPServer((host, port), self._make_request_handler())
+        self._httpd.daemon_threads = True
+
+    def serve_forever(self) -> None:
+        """Starts worker threads and serves incoming requests until self.shutdown() is called."""
+        for w in self._workers:
+            w.start()
+        host, port = self._httpd.server_address[:2]
+        logging.info(f"Webhook server listening on {host}:{port}.")
+        try:
+            self._httpd.serve_forever()
+        finally:
+            self._httpd.server_close()
+            for _ in self._workers:
+                self._updates.put(None)  # a stop signal for every worker
+
+    def shutdown(self) -> None:
+        self._httpd.shutdown()
+
+    def enqueue(self, update_json: dict) -> bool:
+        """
+        Puts a raw update into the processing queue.
+        :param update_json: A telegram update as it was received from telegram.
+        :return: True if the update was accepted, False if the queue is full.
+        """
+        try:
+            self._updates.put(update_json, timeout=config.WEBHOOK_ENQUEUE_TIMEOUT)
+            return True
+        except queue.Full:
+            logging.warning(f"Webhook queue is full. Update {update_json.get('update_id')} rejected.")
+            return False
+
+    def _work(self) -> None:
+        """A worker thread loop that processes queued updates."""
+        while True:
+            update_json = self._updates.get()
+            if update_json is None:
+                return
+            try:
+                update = telebot.types.Update.de_json(update_json)
+                self.bot.process_new_updates([update])
+            except Exception as e:
+                logging.exception(f"An unexpected error occurred while processing update "
+                                  f"{update_json.get('update_id')}: {repr(e)}")
+            finally:
+                self._updates.task_done()
+
+    def _make_request_handler(self) -> type[BaseHTTPRequestHandler]:
+        server = self
+
+        class WebhookRequestHandler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                if server.secret_token and self.headers.get(SECRET_HEADER) != server.secret_token:
+                    self._respond(403)
+                    return
+                try:
+                    length = int(self.headers.get('Content-Length', 0))
+                    update_json = json.loads(self.rfile.read(length))
+                except (ValueError, TypeError):
+                    self._respond(400)
+                    return
+                self._respond(200 if server.enqueue(update_json) else 503)
+
+            def _respond(self, code: int) -> None:
+                self.send_response(code)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass  # requests are not logged one by one
+
+        return WebhookRequestHandler
+
+
+def post_recorded_updates(filepath: str, url: str, secret_token: str | None = None) -> None:
+    """
+    POSTs recorded telegram updates to a webhook server. Useful for testing webhook mode locally.
+    :param filepath: A path to a .json file with either a single update or a list of updates.
+    :param url: Webhook server url, e.g. 'http://127.0.0.1:8443/'.
+    :param secret_token: Secret token the server expects, if any.
+    """
+    with open(filepath, encoding='UTF-8') as f:
+        updates = json.load(f)
+    if isinstance(updates, dict):
+        updates = [updates]
+
+    headers = {'Content-Type': 'application/json'}
+    if secret_token:
+        headers[SECRET_HEADER] = secret_token
+
+    for u in updates:
+        request = urllib.request.Request(url, data=json.dumps(u).encode('UTF-8'), headers=headers, method='POST')
+        try:
+            with urllib.request.urlopen(request) as response:
+                status = response.status
+        except urllib.error.HTTPError as e:
+            status = e.code
+        print(f"Update {u.get('update_id')}: {status}")
+
+
+if __name__ == '__main__':
+    # python webhook.py <recorded_updates.json> [url]
+    post_recorded_updates(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else 'http://127.0.0.1:8443/')
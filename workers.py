@@ -0,0 +1,47 @@
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable
+
+import metrics
+
+
+class WorkerPool:
+    """
+    Runs CPU-heavy functions (scoring, rendering) in worker processes, so they don't compete with
+    update handling for the GIL of the bot process.
+
+    Functions and their arguments are pickled, so they have to be module-level functions taking and returning plain
+    data: db rows in, scores or rendered texts out. With no worker processes functions run in the calling thread.
+    """
+
+    def __init__(self, processes: int = 0):
+        """:param processes: Number of worker processes. 0 runs functions in the calling thread."""
+        self.processes = processes
+        self._executor = None
+        if processes > 0:
+            # a forked copy of the bot process would inherit its threads' locks, workers start from scratch instead
+            self._executor = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn'))
+            logging.info(f"Worker pool of {processes} processes started.")
+
+    def run(self, func: Callable, *args):
+        """
+        Runs the function in a worker process and waits for its result. Only the calling thread waits, the bot process
+        keeps handling updates meanwhile.
+        """
+        with metrics.WORKER_TASK_LATENCY.time(task=func.__name__):
+            if not self._executor:
+                return func(*args)
+            try:
+                return self._executor.submit(func, *args).result()
+            except BrokenProcessPool as e:
+                logging.exception(f"Worker pool is broken, running '{func.__name__}' in the bot process: {repr(e)}")
+                self._executor = None
+                return func(*args)
+
+    def shutdown(self) -> None:
+        if self._executor:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+            logging.info("Worker pool stopped.")